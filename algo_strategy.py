@@ -4,7 +4,6 @@ import random
 import math
 import warnings
 from sys import maxsize
-import json
 
 
 """
@@ -16,8 +15,8 @@ Advanced strategy tips:
   - You can analyze action frames by modifying on_action_frame function
 
   - The GameState.map object can be manually manipulated to create hypothetical 
-  board states. Though, we recommended making a copy of the map to preserve 
-  the actual current map state.
+  board states. Though, we recommended trying them on game_state.fork(), a cheap
+  copy-on-write view, to preserve the actual current map state.
 """
 
 class AlgoStrategy(gamelib.AlgoCore):
@@ -27,7 +26,10 @@ class AlgoStrategy(gamelib.AlgoCore):
         random.seed(seed)
         gamelib.debug_write('Random seed: {}'.format(seed))
         self.scored_on_regions = [False, False, False, False, False, False]
+        self._breach_frame = None
         self.Structs = Structures()
+        # Prepare paths and threat maps for the next turn while the action phase plays out
+        self.speculate = True
         
 
     def on_game_start(self, config):
@@ -35,7 +37,7 @@ class AlgoStrategy(gamelib.AlgoCore):
         Read in config and perform any initial setup here 
         """
         gamelib.debug_write('Configuring your custom algo strategy...')
-        self.config = config
+        super().on_game_start(config)
         global WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, MP, SP, UPDATE
         WALL = config["unitInformation"][0]["shorthand"]
         SUPPORT = config["unitInformation"][1]["shorthand"]
@@ -58,6 +60,7 @@ class AlgoStrategy(gamelib.AlgoCore):
         self.numWallsBuild = 0
         self.first_wall = True
         self.prevWallCount = 0
+        self.register_frame_handler("breach", self.on_breach)
 
     def on_turn(self, turn_state):
         """
@@ -70,6 +73,7 @@ class AlgoStrategy(gamelib.AlgoCore):
         self.numWallsBuild = 0
         self.wall_remove = False
         game_state = gamelib.GameState(self.config, turn_state)
+        self.reuse_speculation(game_state)
         gamelib.debug_write('Performing turn {} of your custom algo strategy'.format(game_state.turn_number))
         game_state.suppress_warnings(True)  #Comment or remove this line to enable warnings.
         self.canReachEdge = False
@@ -366,26 +370,19 @@ class AlgoStrategy(gamelib.AlgoCore):
         """
         damages = []
         # Get the damage estimate each path will take
-        for location in location_options:
-            path = game_state.find_path_to_edge(location)
-            damage = 0
-            for path_location in path:
-                # Get number of enemy turrets that can attack each location and multiply by turret damage
-                damage += len(game_state.get_attackers(path_location, 0)) * gamelib.GameUnit(TURRET, game_state.config).damage_i
+        paths = game_state.find_paths_to_edge_batch(location_options)
+        threat_map = game_state.get_threat_map(0)
+        turret_damage = gamelib.GameUnit(TURRET, game_state.config).damage_i
+        for path in paths:
+            # Get number of enemy turrets that can attack each location and multiply by turret damage
+            damage = threat_map.path_attackers(path) * turret_damage
             damages.append(damage)
         
         # Now just return the location that takes the least damage
         return location_options[damages.index(min(damages))]
 
     def detect_enemy_unit(self, game_state, unit_type=None, valid_x = None, valid_y = None):
-        total_units = 0
-        holes = []
-        for location in game_state.game_map:
-            if game_state.contains_stationary_unit(location):
-                for unit in game_state.game_map[location]:
-                    if unit.player_index == 1 and (unit_type is None or unit.unit_type == unit_type) and (valid_x is None or location[0] in valid_x) and (valid_y is None or location[1] in valid_y):
-                        total_units += 1
-        return total_units
+        return game_state.game_map.count_structures(1, unit_type, rows=valid_y, columns=valid_x)
 
     def get_holes(self, game_state):
         valid_y = [14,15,16]
@@ -398,7 +395,7 @@ class AlgoStrategy(gamelib.AlgoCore):
                     x = x[0]
                 else:
                     orig = x
-                if (game_state.game_map.in_arena_bounds((x,valid_y[0])) and not game_state.contains_stationary_unit([x, valid_y[0]]) and not game_state.contains_stationary_unit([x, valid_y[0]+1]) ):
+                if (game_state.game_map.in_arena_bounds((x,valid_y[0])) and not game_state.game_map.is_blocked(x, valid_y[0]) and not game_state.game_map.is_blocked(x, valid_y[0]+1) ):
                     valid_x_new.add((x,orig))
                     valid_x_new.add((x-1,orig))
                     valid_x_new.add((x+1,orig))
@@ -416,16 +413,21 @@ class AlgoStrategy(gamelib.AlgoCore):
 
     def on_action_frame(self, turn_string):
         """
-        This is the action frame of the game. This function could be called 
-        hundreds of times per turn and could slow the algo down so avoid putting slow code here.
-        Processing the action frames is complicated so we only suggest it if you have time and experience.
+        Called for every action frame, after the frame handlers. The regions only describe the last frame,
+        so they are cleared here unless on_breach has just filled them for this frame.
+        """
+        if turn_string is not self._breach_frame:
+            self.scored_on_regions = [False, False, False, False, False, False]
+
+    def on_breach(self, breaches, frame):
+        """
+        Called for every action frame in which a unit scored, registered with register_frame_handler in on_game_start.
+        Only the events of these frames are decoded, so the hundreds of other frames per turn cost almost nothing.
         Full doc on format of a game frame at in json-docs.html in the root of the Starterkit.
         """
-        # Let's record at what position we get scored on
-        state = json.loads(turn_string)
-        events = state["events"]
-        breaches = events["breach"]
+        self._breach_frame = frame
         self.scored_on_regions = [False, False, False, False, False, False]
+        # Let's record at what position we get scored on
         for breach in breaches:
             location = breach[0]
             unit_owner_self = True if breach[4] == 1 else False
@@ -457,14 +459,7 @@ class Structures():
         self.wallLimit = -1
 
     def CountWalls(self, game_state):
-        wallCount = 0
-        for y in range(14):
-            for x in range(28):
-                if game_state.game_map.in_arena_bounds([x,y]):
-                    for unit in game_state.game_map[x,y]:
-                        if(unit.unit_type == WALL):
-                            wallCount+=1
-        return wallCount
+        return game_state.game_map.count_structures(None, WALL, rows=range(14))
     
     def ResetTurn(self):
         self.wallQueue=[]
@@ -13,9 +13,39 @@ Investigating it is useful for any player that wants to access information about
 The AlgoCore class in algocore.py handles communication with the game engine, and forms the bones of an algo. AlgoStrategy inherits from it. 
 Investigating it is useful for advanced players interested in getting data from the action phase or communicating directly with the game engine. \n
 
+instrumentation.py times gamelib's hot paths, such as path-finding and can_spawn, and writes a json line per turn once enabled. 
+Investigating it is useful for finding where your turns spend their time. \n
+
+local_engine.py is a stand-in for the game engine that plays algos against each other offline, python -m gamelib.local_engine runs a tournament. 
+Investigating it is useful for players who want to test strategy changes on many matches quickly. \n
+
 The Navigation class in navigation.py contains functions related to path-finding, which are used by GameState in pathing related functions. 
 Investigating it is useful for advanced player who want to optimize the slow default pathing algorithm we provide. \n 
 
+benchmark.py times state parsing, path-finding, get_attackers, get_target and your on_turn over recorded and generated boards, python -m gamelib.benchmark runs it. 
+Investigating it is useful for checking that a change made your algo faster, not slower. \n
+
+config.py compiles the game config once into unit type ids, costs, ranges and shared unit stats, which GameState, GameMap and GameUnit read instead of the json. 
+Investigating it is useful for players who want the same fast lookups in their own code. \n
+
+geometry.py holds tables describing the board, such as which locations are in bounds and which are on each edge, built once at import. 
+Investigating it is useful for players who want fast lookups in their own helpers. \n
+
+The ThreatMap class in threat_map.py holds the damage enemy structures deal at every location, kept up to date as the map changes. 
+Investigating it is useful for players who want to score many paths quickly. \n
+
+The Simulator class in simulator.py plays out a planned action phase frame by frame without touching the GameState. 
+Investigating it is useful for players who want to score candidate attacks before committing to one. \n
+
+The PlanEvaluator class in parallel.py runs the simulator on a pool of worker processes, started once per game by AlgoCore when plan_workers is set. 
+Investigating it is useful for players who want to try many attacks within the turn time limit. \n
+
+The EngineMessage class in messages.py wraps each line from the game engine so its json is parsed only once, by whichever code reads it first. 
+Investigating it is useful for players handling action frames, which arrive hundreds of times per turn. \n
+
+replay.py records the messages your algo exchanges with the engine when record_path is set, and replays them offline with python -m gamelib.replay. 
+Investigating it is useful for profiling your algo on real matches and checking that changes did not alter its moves. \n
+
 util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write().
 """
 
@@ -24,6 +54,8 @@ from .util import debug_write
 from .game_state import GameState
 from .unit import GameUnit
 from .game_map import GameMap
+from .messages import EngineMessage, parse_message
+from .config import CompiledConfig, compile_config
 
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
+__all__ = ["algocore", "benchmark", "config", "game_state", "game_map", "geometry", "instrumentation", "local_engine", "messages", "navigation", "parallel", "replay", "simulator", "threat_map", "unit", "util"]
  
\ No newline at end of file
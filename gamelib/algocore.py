@@ -1,7 +1,13 @@
-import json
+import re
+import threading
 
+from . import instrumentation
 from .game_state import GameState
-from .util import get_command, debug_write, BANNER_TEXT, send_command
+from .config import compile_config
+from .messages import EngineMessage, message_type, mobile_units_remaining
+from .parallel import PlanEvaluator
+from .util import get_command, debug_write, BANNER_TEXT, send_command, set_command_buffering, flush_commands, CommandReader, add_command_listener, remove_command_listener
+from .replay import MessageRecorder
 
 class AlgoCore(object):
     """
@@ -9,24 +15,43 @@ class AlgoCore(object):
     algo_strategy.py subclasses it. 
 
     Attributes :
-        * config (JSON): json object containing information about the game
+        * config (CompiledConfig): json object containing information about the game, compiled once when it is received
+        * plan_workers (int): The number of worker processes to start for plan_evaluator, 0 to not start any
+        * plan_evaluator (:obj: PlanEvaluator): Scores candidate attacks in parallel, None unless plan_workers is set
+        * threaded_io (bool): Read engine messages on a background thread and buffer commands until each turn is done
+        * command_reader (:obj: CommandReader): The background reader and its queue metrics, None unless threaded_io is set
+        * speculate (bool): Start preparing the next turn on a background thread once the action phase is over, see on_speculate
+        * record_path (str): If set, start appends every engine message and reply to this file for gamelib.replay
 
     """
     def __init__(self):
         self.config = None
+        self.plan_workers = 0
+        self.plan_evaluator = None
+        self.threaded_io = False
+        self.command_reader = None
+        self.speculate = False
+        self.record_path = None
+        self._frame_handlers = {}
+        self._speculation = None
+        self._speculated_key = None
+        self._speculated_threat_maps = None
 
     def on_game_start(self, config):
         """
         This function is called once at the start of the game. 
-        By default, it just initializes the config. \n
+        By default, it initializes the config and, if plan_workers is set, starts the plan_evaluator worker pool. \n
         You can override it it in algo_strategy.py to perform start of game setup
         """
         self.config = config
+        if self.plan_workers and self.plan_evaluator is None:
+            self.plan_evaluator = PlanEvaluator(config, self.plan_workers)
 
     def on_turn(self, game_state):
         """
         This step function is called at the start of each turn.
-        It is passed the current game state, which can be used to initiate a new GameState object. 
+        It is passed the current game state as an EngineMessage, a json string that also carries its parsed data,
+        which can be used to initiate a new GameState object. 
         By default, it sends empty commands to the game engine. \n
         algo_strategy.py inherits from AlgoCore and overrides this on turn function. 
         Adjusting the on_turn function in algo_strategy is the main way to adjust your algo's logic. 
@@ -38,11 +63,96 @@ class AlgoCore(object):
         """
         After each deploy phase, the game engine will run the action phase of the round.
         The action phase is made up of a sequence of distinct frames. 
-        Each of these frames is sent to the algo in order. 
-        They can be handled in this function. 
+        Each of these frames is sent to the algo in order, as an EngineMessage. 
+        They can be handled in this function, use its data attribute rather than parsing it again. 
         """
         pass
 
+    def register_frame_handler(self, event, handler):
+        """
+        Calls handler for every action frame with at least one event of the given type, such as "breach", "death" or "damage".
+        handler is called as handler(entries, frame), with the list of events of that type and the EngineMessage of the frame,
+        before on_action_frame. Frames are checked with a substring search first, and only the events of frames that
+        some handler is interested in are decoded, so frames without any are almost free.
+        """
+        if event not in self._frame_handlers:
+            self._frame_handlers[event] = (re.compile(r'"{}"\s*:\s*(\[\s*\])?'.format(re.escape(event))), [])
+        self._frame_handlers[event][1].append(handler)
+
+    def _dispatch_frame(self, frame):
+        """
+        Runs the handlers registered with register_frame_handler on one action frame
+        """
+        events = None
+        for event, (pattern, handlers) in self._frame_handlers.items():
+            match = pattern.search(frame)
+            if match is None or match.group(1) is not None:
+                # No events of this type in the frame
+                continue
+            if events is None:
+                events = frame.section("events") or {}
+            entries = events.get(event)
+            if entries:
+                for handler in handlers:
+                    handler(entries, frame)
+
+    def on_speculate(self, game_state):
+        """
+        Called on a background thread with a provisional GameState built from the last frame of an action phase,
+        when speculate is set. The next turn starts from the same structures, so anything computed here that is
+        keyed on the structures can be reused by on_turn. By default it fills GameState.path_cache with the paths from
+        every spawn location of both players and builds both threat maps, which reuse_speculation hands to the real turn. \n
+        on_turn waits for this to finish, so it is safe to share caches with it. on_action_frame and frame handlers
+        can run at the same time, GameState.path_cache is locked so they can still use it, but other caches shared
+        with them need a lock of their own.
+        """
+        game_map = game_state.game_map
+        for edges in ((game_map.BOTTOM_LEFT, game_map.BOTTOM_RIGHT), (game_map.TOP_LEFT, game_map.TOP_RIGHT)):
+            starts = [location for edge in edges for location in game_map.get_edge_locations(edge) if not game_map.is_blocked(*location)]
+            game_state.find_paths_to_edge_batch(starts)
+        self._speculated_threat_maps = [game_map.get_threat_map(0), game_map.get_threat_map(1)]
+        self._speculated_key = game_map.structure_key()
+
+    def reuse_speculation(self, game_state):
+        """
+        Gives game_state the threat maps built by on_speculate if its structures match the ones they were built from.
+        Call it in on_turn right after creating the GameState. Paths need no call, they are shared through GameState.path_cache.
+
+        Returns:
+            True if the threat maps were reused
+        """
+        game_map = game_state.game_map
+        if self._speculated_key is None or self._speculated_key != game_map.structure_key():
+            return False
+        game_map.adopt_threat_maps(self._speculated_threat_maps)
+        self._speculated_key = None
+        self._speculated_threat_maps = None
+        return True
+
+    def _start_speculation(self, frame):
+        """
+        Runs on_speculate for the board of an action frame on a background thread
+        """
+        def run():
+            try:
+                game_state = GameState(self.config, frame)
+                game_state.suppress_warnings(True)
+                self.on_speculate(game_state)
+            except Exception as error:
+                debug_write("Speculation failed: {}".format(error))
+
+        self._speculated_key = None
+        self._speculated_threat_maps = None
+        self._speculation = threading.Thread(target=run, name="Speculation", daemon=True)
+        self._speculation.start()
+
+    def _finish_speculation(self):
+        """
+        Waits for a running on_speculate, so the next turn never shares caches with it while it runs
+        """
+        if self._speculation is not None:
+            self._speculation.join()
+            self._speculation = None
 
     def start(self):
         """ 
@@ -50,46 +160,95 @@ class AlgoCore(object):
         After starting the algo, it will wait until it receives information from the game 
         engine, process this information, and respond if needed to take it's turn. 
         The algo continues this loop until it receives the "End" turn message from the game.
+        If record_path is set, every message and reply is also appended to that file, see gamelib.replay.
         """
         debug_write(BANNER_TEXT)
+        if self.threaded_io:
+            self.command_reader = CommandReader().start()
+            set_command_buffering(True)
+        recorder = None
+        if self.record_path is not None:
+            recorder = MessageRecorder(self.record_path)
+            add_command_listener(recorder.record_output)
+
+        try:
+            while True:
+                # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
+                # manually kill this Python program.
+                # Each line is parsed at most once, the parsed json is kept on the message and reused by GameState
+                if self.command_reader is not None:
+                    game_state_string = self.command_reader.get()
+                else:
+                    game_state_string = EngineMessage(get_command())
+                if recorder is not None:
+                    recorder.record_input(game_state_string)
+                if not self.handle_message(game_state_string):
+                    break
+        finally:
+            if recorder is not None:
+                remove_command_listener(recorder.record_output)
+                recorder.close()
+
+    def handle_message(self, game_state_string):
+        """
+        Processes one message from the game engine, calling on_game_start, on_turn or on_action_frame as needed.
+        start calls it for every line read, gamelib.replay calls it for every recorded line.
+        The message can be an EngineMessage or the line as a plain string.
 
-        while True:
-            # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
-            # manually kill this Python program.
-            game_state_string = get_command()
-            if "replaySave" in game_state_string:
+        Returns:
+            False once the game is over, True otherwise
+        """
+        if not isinstance(game_state_string, EngineMessage):
+            game_state_string = EngineMessage(game_state_string)
+        if "replaySave" in game_state_string:
+            """
+            This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
+            """
+            parsed_config = compile_config(game_state_string.data)
+            self.on_game_start(parsed_config)
+        elif "turnInfo" in game_state_string:
+            stateType = message_type(game_state_string)
+            if stateType == 0:
                 """
-                This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
+                This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
+                deploy phase. Printing is handled by the provided functions.
                 """
-                parsed_config = json.loads(game_state_string)
-                self.on_game_start(parsed_config)
-            elif "turnInfo" in game_state_string:
-                state = json.loads(game_state_string)
-                stateType = int(state.get("turnInfo")[0])
-                if stateType == 0:
-                    """
-                    This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
-                    deploy phase. Printing is handled by the provided functions.
-                    """
-                    self.on_turn(game_state_string)
-                elif stateType == 1:
-                    """
-                    If stateType == 1, this game_state_string string represents a single frame of an action phase
-                    """
-                    self.on_action_frame(game_state_string)
-                elif stateType == 2:
-                    """
-                    This is the end game message. This means the game is over so break and finish the program.
-                    """
-                    debug_write("Got end state, game over. Stopping algo.")
-                    break
-                else:
-                    """
-                    Something is wrong? Received an incorrect or improperly formatted string.
-                    """
-                    debug_write("Got unexpected string with turnInfo: {}".format(game_state_string))
+                self._finish_speculation()
+                if instrumentation.enabled:
+                    instrumentation.begin_turn()
+                self.on_turn(game_state_string)
+                flush_commands()
+                if instrumentation.enabled:
+                    instrumentation.end_turn(game_state_string.section("turnInfo")[1])
+            elif stateType == 1:
+                """
+                If stateType == 1, this game_state_string string represents a single frame of an action phase
+                """
+                if self._frame_handlers:
+                    self._dispatch_frame(game_state_string)
+                self.on_action_frame(game_state_string)
+                if self.speculate and self._speculation is None and not mobile_units_remaining(game_state_string):
+                    self._start_speculation(game_state_string)
+            elif stateType == 2:
+                """
+                This is the end game message. This means the game is over so break and finish the program.
+                """
+                debug_write("Got end state, game over. Stopping algo.")
+                self._finish_speculation()
+                if self.command_reader is not None:
+                    debug_write(self.command_reader.summary())
+                set_command_buffering(False)
+                if self.plan_evaluator is not None:
+                    self.plan_evaluator.shutdown()
+                return False
             else:
                 """
                 Something is wrong? Received an incorrect or improperly formatted string.
                 """
-                debug_write("Got unexpected string : {}".format(game_state_string))
+                debug_write("Got unexpected string with turnInfo: {}".format(game_state_string))
+        else:
+            """
+            Something is wrong? Received an incorrect or improperly formatted string.
+            """
+            debug_write("Got unexpected string : {}".format(game_state_string))
+        return True
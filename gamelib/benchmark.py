@@ -0,0 +1,293 @@
+"""
+Throughput benchmarks for gamelib, run over a corpus of board states.
+
+The corpus mixes turns taken from recordings (see gamelib.replay) with boards from a seeded random
+generator at early, mid and late game densities. Each benchmark is timed on every state, with the
+GameState it queries built beforehand so only parse times the parsing, and the percentiles can be saved
+as a baseline and compared against later runs:
+
+    python -m gamelib.benchmark --config game-configs.json --save baseline.json
+    python -m gamelib.benchmark --config game-configs.json --baseline baseline.json
+
+Run it from the folder containing algo_strategy.py with a recording to also time a full AlgoStrategy.on_turn
+on the recorded turns.
+"""
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import importlib
+
+from .game_state import GameState
+from .geometry import VALID_LOCATIONS, EDGES
+from .replay import read_log, INPUT
+from .util import set_command_output
+
+#: Structures per player for each phase of the generated corpus
+PHASES = {"early": (8, 4), "mid": (30, 12), "late": (60, 30)}
+
+
+def generate_state(config, seed, phase="mid"):
+    """Builds a random but plausible turn message
+
+    Args:
+        config: The game config
+        seed: The same seed always gives the same board
+        phase: "early", "mid" or "late", which sets how many structures each player has and how far into the game it is
+
+    Returns:
+        A turn message json string, like one sent by the engine
+
+    """
+    rng = random.Random(seed)
+    structures, turn = PHASES[phase]
+    unit_information = config["unitInformation"]
+    structure_types = [index for index, unit_info in enumerate(unit_information) if unit_info.get("unitCategory") == 0]
+    upgrade_index = len(unit_information) - 1
+    resources = config["resources"]
+    units = []
+    for player_index in (0, 1):
+        player_units = [[] for _ in unit_information]
+        # Keep the three back rows, where mobile units are deployed, free of structures
+        half = [(x, y) for x, y in VALID_LOCATIONS if (3 <= y < 14 if player_index == 0 else 14 <= y < 25)]
+        for x, y in rng.sample(half, structures):
+            index = rng.choice(structure_types)
+            health = unit_information[index].get("startHealth", 1) * rng.choice((1.0, 1.0, 0.5))
+            player_units[index].append([x, y, health, str(len(player_units[index]))])
+            if rng.random() < 0.3:
+                player_units[upgrade_index].append([x, y, 0, ""])
+        units.append(player_units)
+    health = resources["startingHP"] - rng.randrange(turn // 3 + 1)
+    state = {
+        "turnInfo": [0, turn, -1],
+        "p1Stats": [health, rng.randrange(30), rng.randrange(20), 0],
+        "p2Stats": [health, rng.randrange(30), rng.randrange(20), 0],
+        "p1Units": units[0],
+        "p2Units": units[1],
+        "events": {"selfDestruct": [], "breach": [], "damage": [], "shield": [], "move": [], "spawn": [], "death": [], "attack": [], "melee": []},
+    }
+    return json.dumps(state)
+
+
+def load_recorded(path):
+    """Reads the config and turn messages of a recording made with AlgoCore.record_path
+
+    Returns:
+        (config, turns) where config is None if the recording does not start with one
+
+    """
+    config = None
+    turns = []
+    for direction, _, line in read_log(path):
+        if direction != INPUT:
+            continue
+        if "replaySave" in line and config is None:
+            config = json.loads(line)
+        elif '"turnInfo"' in line and json.loads(line)["turnInfo"][0] == 0:
+            turns.append(line)
+    return config, turns
+
+
+def build_corpus(config, seed=0, per_phase=4, recorded=()):
+    """Gets the board states to benchmark
+
+    Args:
+        config: The game config
+        seed: Seeds the generated boards
+        per_phase: The number of generated boards for each phase in PHASES
+        recorded: Turn messages to include as they are
+
+    Returns:
+        A list of (name, turn message) pairs
+
+    """
+    corpus = [("recorded-{}".format(index), turn) for index, turn in enumerate(recorded)]
+    for phase in PHASES:
+        for index in range(per_phase):
+            corpus.append(("{}-{}".format(phase, index), generate_state(config, seed * 1000 + index, phase)))
+    return corpus
+
+
+def prepare_message(config, turn):
+    return config, turn
+
+
+def prepare_state(config, turn):
+    game_state = GameState(config, turn)
+    game_state.suppress_warnings(True)
+    return game_state
+
+
+def bench_parse(message, algo=None):
+    GameState(*message)
+
+
+def bench_paths(game_state, algo=None):
+    game_state.path_cache.clear()
+    for edge in EDGES:
+        for location in edge:
+            if not game_state.game_map.is_blocked(*location):
+                game_state.find_path_to_edge(list(location))
+
+
+def bench_attackers(game_state, algo=None):
+    for edge in EDGES:
+        for location in edge[::4]:
+            if game_state.game_map.is_blocked(*location):
+                continue
+            path = game_state.find_path_to_edge(list(location)) or []
+            player_index = 0 if location[1] < 14 else 1
+            for path_location in path:
+                game_state.get_attackers(path_location, player_index)
+
+
+def bench_targets(game_state, algo=None):
+    game_map = game_state.game_map
+    for x, y in VALID_LOCATIONS:
+        if game_map.is_blocked(x, y):
+            unit = game_map[x, y][0]
+            if unit.damage_i + unit.damage_f > 0:
+                game_state.get_target(unit)
+
+
+def bench_on_turn(message, algo):
+    algo.on_turn(message[1])
+
+
+#: Every benchmark, by name, as (prepare, benchmark). prepare is called with the config and a turn message before
+#: every run and is not timed, then benchmark is timed when called with what prepare returned and an algo
+BENCHMARKS = {
+    "parse": (prepare_message, bench_parse),
+    "paths": (prepare_state, bench_paths),
+    "attackers": (prepare_state, bench_attackers),
+    "targets": (prepare_state, bench_targets),
+    "on_turn": (prepare_message, bench_on_turn),
+}
+
+
+def percentile(samples, fraction):
+    """The nearest rank percentile of a list of samples
+    """
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+
+def run_benchmarks(config, corpus, repeat=3, algo=None, names=None):
+    """Times every benchmark on every state of the corpus
+
+    Args:
+        config: The game config
+        corpus: From build_corpus
+        repeat: The number of times each benchmark runs on each state
+        algo: An AlgoStrategy that has seen on_game_start, needed for the on_turn benchmark, which is skipped without it.
+            Strategies often assume boards they could have played into, so on_turn only runs on recorded states
+        names: The benchmarks to run, all of them if None
+
+    Returns:
+        A dict with, for every benchmark, the mean, p50, p90, p99 and max time in milliseconds and the number of samples
+
+    """
+    recorded = [(state_name, turn) for state_name, turn in corpus if state_name.startswith("recorded")]
+    if names is None:
+        names = [name for name in BENCHMARKS if name != "on_turn" or (algo is not None and recorded)]
+    results = {}
+    set_command_output(io.StringIO())
+    try:
+        for name in names:
+            prepare, benchmark = BENCHMARKS[name]
+            samples = []
+            for _, turn in (recorded if name == "on_turn" else corpus):
+                for _ in range(repeat):
+                    subject = prepare(config, turn)
+                    start = time.perf_counter()
+                    benchmark(subject, algo)
+                    samples.append(1000 * (time.perf_counter() - start))
+            results[name] = {
+                "mean": sum(samples) / len(samples),
+                "p50": percentile(samples, 0.5),
+                "p90": percentile(samples, 0.9),
+                "p99": percentile(samples, 0.99),
+                "max": max(samples),
+                "samples": len(samples),
+            }
+    finally:
+        set_command_output(None)
+    return results
+
+
+def compare(results, baseline, tolerance=0.1):
+    """Compares results with a baseline from an earlier run
+
+    Args:
+        results: From run_benchmarks
+        baseline: Results saved from an earlier run
+        tolerance: How much slower a p50 can be before it counts as a regression, 0.1 is 10%
+
+    Returns:
+        A list of (name, baseline p50, p50, ratio, regressed) for every benchmark in both
+
+    """
+    rows = []
+    for name, stats in results.items():
+        if name in baseline:
+            before = baseline[name]["p50"]
+            ratio = stats["p50"] / before if before > 0 else float("inf")
+            rows.append((name, before, stats["p50"], ratio, ratio > 1 + tolerance))
+    return rows
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark gamelib on a corpus of board states")
+    parser.add_argument("--config", help="The game config json file, taken from the first recording if not given")
+    parser.add_argument("--recorded", action="append", default=[], help="A recording made with AlgoCore.record_path, can be repeated")
+    parser.add_argument("--per-phase", type=int, default=4, help="Generated boards per game phase")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each benchmark on each board")
+    parser.add_argument("--strategy", default="algo_strategy", help="The module containing AlgoStrategy, for the on_turn benchmark")
+    parser.add_argument("--no-strategy", action="store_true", help="Skip the on_turn benchmark")
+    parser.add_argument("--baseline", help="Compare with results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--save", help="Save the results as json")
+    options = parser.parse_args(args)
+
+    config = None
+    recorded = []
+    for path in options.recorded:
+        recorded_config, turns = load_recorded(path)
+        config = config or recorded_config
+        recorded += turns
+    if options.config:
+        with open(options.config) as config_file:
+            config = json.load(config_file)
+    if config is None:
+        parser.error("A config is needed, pass --config or a recording that starts with one")
+
+    algo = None
+    if not options.no_strategy:
+        sys.path.insert(0, ".")
+        algo = importlib.import_module(options.strategy).AlgoStrategy()
+        random.seed(options.seed)
+        algo.on_game_start(config)
+
+    corpus = build_corpus(config, options.seed, options.per_phase, recorded)
+    results = run_benchmarks(config, corpus, options.repeat, algo)
+    for name, stats in results.items():
+        print("{:10} mean {mean:8.3f}ms  p50 {p50:8.3f}ms  p90 {p90:8.3f}ms  p99 {p99:8.3f}ms  max {max:8.3f}ms  ({samples} runs)".format(name, **stats))
+
+    regressed = False
+    if options.baseline:
+        with open(options.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        for name, before, after, ratio, slower in compare(results, baseline, options.tolerance):
+            regressed = regressed or slower
+            print("{:10} p50 {:8.3f}ms -> {:8.3f}ms  x{:.2f}{}".format(name, before, after, ratio, "  REGRESSION" if slower else ""))
+    if options.save:
+        with open(options.save, "w") as save_file:
+            json.dump(results, save_file, indent=2, sort_keys=True)
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
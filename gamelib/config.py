@@ -0,0 +1,161 @@
+"""
+The game config, compiled once into the lookups gamelib needs every turn.
+
+AlgoCore compiles the config it receives before calling on_game_start, and GameState, GameMap and
+GameUnit accept either a CompiledConfig or the raw json dict, which is compiled the first time it is seen.
+"""
+from .geometry import range_stencil
+
+
+class UnitStats:
+    """The stats of one unit type, shared by every unit of that type and upgrade level.
+
+    Records are built once per config by CompiledConfig and should not be changed.
+
+    """
+    __slots__ = ("unit_type", "upgraded", "stationary", "speed", "damage_f", "damage_i", "attackRange", "shieldRange",
+                 "max_health", "shieldPerUnit", "shieldBonusPerY", "cost")
+
+    def __init__(self, unit_type, type_config, base=None):
+        self.unit_type = unit_type
+        self.upgraded = base is not None
+        if base is None:
+            self.stationary = type_config.get("unitCategory") == 0
+            self.speed = type_config.get("speed", 0)
+            self.damage_f = type_config.get("attackDamageTower", 0)
+            self.damage_i = type_config.get("attackDamageWalker", 0)
+            self.attackRange = type_config.get("attackRange", 0)
+            self.shieldRange = type_config.get("shieldRange", 0)
+            self.max_health = type_config.get("startHealth", 0)
+            self.shieldPerUnit = type_config.get("shieldPerUnit", 0)
+            self.shieldBonusPerY = type_config.get("shieldBonusPerY", 0)
+            self.cost = (type_config.get("cost1", 0), type_config.get("cost2", 0))
+        else:
+            upgrade = type_config.get("upgrade", {})
+            self.stationary = base.stationary
+            self.speed = upgrade.get("speed", base.speed)
+            self.damage_f = upgrade.get("attackDamageTower", base.damage_f)
+            self.damage_i = upgrade.get("attackDamageWalker", base.damage_i)
+            self.attackRange = upgrade.get("attackRange", base.attackRange)
+            self.shieldRange = upgrade.get("shieldRange", base.shieldRange)
+            self.max_health = upgrade.get("startHealth", base.max_health)
+            self.shieldPerUnit = upgrade.get("shieldPerUnit", base.shieldPerUnit)
+            self.shieldBonusPerY = upgrade.get("shieldBonusPerY", base.shieldBonusPerY)
+            self.cost = (upgrade.get("cost1", 0) + base.cost[0], upgrade.get("cost2", 0) + base.cost[1])
+
+    def __repr__(self):
+        return "UnitStats({}{})".format(self.unit_type, ", upgraded" if self.upgraded else "")
+
+
+class CompiledConfig(dict):
+    """The game config with everything gamelib derives from it computed once.
+
+    It is still the config dict, so code reading config["unitInformation"] keeps working.
+
+    Attributes :
+        * shorthands (tuple): The shorthand of every unit type, by index in unitInformation
+        * type_index (dict): Maps a shorthand to its index in unitInformation
+        * WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE, UPGRADE (str): The unit type shorthands
+        * structure_types (tuple): The structure shorthands, in unitInformation order
+        * structure_set (frozenset): The same, for membership tests
+        * all_units (frozenset): Every unit type that can be spawned
+        * costs (dict): [SP, MP] cost tuple of every unit type
+        * upgrade_costs (dict): [SP, MP] cost tuple of upgrading every unit type
+        * upgrades (dict): The stats an upgrade changes, for every unit type that can be upgraded
+        * stats (dict): The shared UnitStats of every (unit type, upgraded) pair
+        * hit_radius (float): How far past its range a unit reaches a location's center
+        * max_attack_range (float): The longest attack range of any unit, upgraded or not
+        * ranges (tuple): Every attack and shield range in the config, upgraded or not
+        * stencils (dict): The offsets of the locations in range, by range, for every one of ranges
+        * bits_per_round, bit_decay_per_round, bit_growth_rate, turn_interval_for_bit_schedule, cores_per_round,
+          cores_for_player_damage (float): The resource schedule
+
+    """
+    def __init__(self, config):
+        super().__init__(config)
+        unit_information = self["unitInformation"]
+        self.shorthands = tuple(unit_info.get("shorthand") for unit_info in unit_information)
+        self.type_index = {shorthand: index for index, shorthand in enumerate(self.shorthands) if shorthand is not None}
+        (self.WALL, self.SUPPORT, self.TURRET, self.SCOUT, self.DEMOLISHER, self.INTERCEPTOR,
+         self.REMOVE, self.UPGRADE) = self.shorthands[:8]
+        self.structure_types = tuple(unit_info.get("shorthand") for unit_info in unit_information if unit_info.get("unitCategory") == 0)
+        self.structure_set = frozenset(self.structure_types)
+        self.all_units = frozenset(self.shorthands[:6])
+
+        self.costs = {}
+        self.upgrade_costs = {}
+        self.upgrades = {}
+        self.stats = {}
+        ranges = set()
+        for shorthand, unit_info in zip(self.shorthands, unit_information):
+            if shorthand is None:
+                continue
+            upgrade = unit_info.get("upgrade")
+            cost = (unit_info.get("cost1", 0), unit_info.get("cost2", 0))
+            self.costs[shorthand] = cost
+            self.upgrade_costs[shorthand] = (cost[0], cost[1]) if upgrade is None else (upgrade.get("cost1", cost[0]), upgrade.get("cost2", cost[1]))
+            if upgrade is not None:
+                self.upgrades[shorthand] = upgrade
+            base = self.stats[shorthand, False] = UnitStats(shorthand, unit_info)
+            self.stats[shorthand, True] = UnitStats(shorthand, unit_info, base)
+            for info in (unit_info, upgrade or {}):
+                for key in ("attackRange", "shieldRange"):
+                    if info.get(key):
+                        ranges.add(info[key])
+        self.ranges = tuple(sorted(ranges))
+        self.max_attack_range = max([0] + [info.get("attackRange", 0) for unit_info in unit_information
+                                           for info in (unit_info, unit_info.get("upgrade") or {})])
+        self.hit_radius = unit_information[0].get("getHitRadius", 0)
+        self.stencils = {radius: range_stencil(radius, self.hit_radius) for radius in self.ranges}
+
+        resources = self.get("resources", {})
+        self.bits_per_round = resources.get("bitsPerRound", 0)
+        self.bit_decay_per_round = resources.get("bitDecayPerRound", 0)
+        self.bit_growth_rate = resources.get("bitGrowthRate", 0)
+        self.turn_interval_for_bit_schedule = resources.get("turnIntervalForBitSchedule", 1)
+        self.cores_per_round = resources.get("coresPerRound", 0)
+        self.cores_for_player_damage = resources.get("coresForPlayerDamage", 0)
+
+
+# id of a raw config -> (raw config, its CompiledConfig), for the last few configs compiled. A game usually
+# uses one config, the others are there so alternating between a few raw dicts does not compile every time
+_compiled = {}
+_COMPILED_SLOTS = 8
+
+
+def compile_config(config):
+    """Gets the CompiledConfig of a config
+
+    Args:
+        config: A CompiledConfig, which is returned as it is, or the raw config dict
+
+    Returns:
+        A CompiledConfig. Compiling the same raw dict again returns the same object
+
+    """
+    if isinstance(config, CompiledConfig):
+        return config
+    entry = _compiled.get(id(config))
+    if entry is not None and entry[0] is config:
+        return entry[1]
+    compiled = CompiledConfig(config)
+    if len(_compiled) >= _COMPILED_SLOTS:
+        del _compiled[next(iter(_compiled))]
+    # The raw dict is kept so its id cannot be reused by another dict while it is cached
+    _compiled[id(config)] = (config, compiled)
+    return compiled
+
+
+def unit_stats(config, unit_type, upgraded=False):
+    """Gets the shared stats record of a unit type
+
+    Args:
+        config: The game config, compiled or not
+        unit_type: A unit type shorthand, such as the ones in algo_strategy
+        upgraded: True for the stats after an upgrade
+
+    Returns:
+        The UnitStats for that type in that config
+
+    """
+    return compile_config(config).stats[unit_type, upgraded]
@@ -1,6 +1,59 @@
 import math
+import copy
+from array import array
 from .unit import GameUnit
+from .config import compile_config
 from .util import debug_write
+from .threat_map import ThreatMap
+from .geometry import range_stencil, IN_BOUNDS, VALID_LOCATIONS, EDGES, ROW_MASKS, COLUMN_MASKS, ZOBRIST_TYPES, STRUCTURE_KEYS, UPGRADED_KEYS, REMOVAL_KEYS
+
+
+def _popcount(value):
+    return bin(value).count("1")
+
+popcount = getattr(int, "bit_count", _popcount)
+
+
+class UnitColumns:
+    """Every unit on a map as parallel arrays, one entry per unit, made by GameMap.unit_columns.
+
+    Reading the arrays creates no GameUnits, and being arrays they can be wrapped without copying,
+    for example with numpy.frombuffer, to run queries over every unit at once.
+
+    Attributes :
+        * type_ids (array): The index of each unit's type in config["unitInformation"]
+        * owners (array): The player controlling each unit, 0 for you 1 for the enemy
+        * xs (array): The x coordinate of each unit
+        * ys (array): The y coordinate of each unit
+        * health (array): The current health of each unit
+        * flags (array): UPGRADED and PENDING_REMOVAL bits of each unit
+
+    """
+    UPGRADED = 1
+    PENDING_REMOVAL = 2
+
+    def __init__(self):
+        self.type_ids = array('b')
+        self.owners = array('b')
+        self.xs = array('b')
+        self.ys = array('b')
+        self.health = array('d')
+        self.flags = array('b')
+
+    def __len__(self):
+        return len(self.type_ids)
+
+    def append(self, type_id, owner, x, y, health, flags=0):
+        """Adds a unit and returns its row
+        """
+        self.type_ids.append(type_id)
+        self.owners.append(owner)
+        self.xs.append(x)
+        self.ys.append(y)
+        self.health.append(health)
+        self.flags.append(flags)
+        return len(self.type_ids) - 1
+
 
 class GameMap:
     """Holds data about the current game map and provides functions
@@ -10,7 +63,7 @@ class GameMap:
     or an empty list if there are no units at the location
 
     Attributes :
-        * config (JSON): Contains information about the current game rules
+        * config (CompiledConfig): Contains information about the current game rules
         * enable_warnings (bool): If true, debug messages for game_map functions will print out
         * ARENA_SIZE (int): The size of the arena.
         * HALF_ARENA (int): Half of the size of the arena.
@@ -19,15 +72,23 @@ class GameMap:
         * BOTTOM_LEFT (int): Hidden challenge! Can you guess what this constant represents???
         * BOTTOM_RIGHT (int): A constant that represents the bottom right edge
 
+    Units parsed from the engine's message are stored as UnitColumns, and the GameUnits of a location are
+    only created the first time that location is indexed. Use unit_columns to query every unit without
+    creating any.
+
+    Structure locations are also kept as bitboards, integers with bit x * ARENA_SIZE + y set for every
+    occupied location, one per player and structure type. They are updated by add_unit, remove_unit and
+    state parsing, and make queries like is_blocked and count_structures cheap bit operations.
+
     """
     def __init__(self, config):
         """Initializes constants and game map
 
         Args:
-            config (JSON): Contains information about the game
+            config (JSON): Contains information about the game, or the CompiledConfig made from it
 
         """
-        self.config = config
+        self.config = config = compile_config(config)
         self.enable_warnings = True
         self.ARENA_SIZE = 28
         self.HALF_ARENA = int(self.ARENA_SIZE / 2)
@@ -36,36 +97,49 @@ class GameMap:
         self.BOTTOM_LEFT = 2
         self.BOTTOM_RIGHT = 3
         self.__map = self.__empty_grid()
-        self.__start = [13,0]
+        self.__position = 0
+        self._structure_mask = 0
+        self._upgraded_mask = 0
+        self._removal_mask = 0
+        self._board_hashes = [0, 0]
+        self._structure_types = list(config.structure_types)
+        self._structure_boards = [[0] * len(self._structure_types), [0] * len(self._structure_types)]
+        self._threat_maps = [None, None]
+        self._hit_radius = config.hit_radius
+        self._stencils = config.stencils
+        # Units loaded by _load_units, and the rows of the locations whose GameUnits were not created yet
+        self._columns = UnitColumns()
+        self._tile_rows = {}
+        self._structure_rows = {}
+        # False while every unit on the map is a row of _columns
+        self._touched = False
     
     def __getitem__(self, location):
         if len(location) == 2 and self.in_arena_bounds(location):
             x,y = location
-            return self.__map[x][y]
+            units = self.__map[x][y]
+            if units or not self._tile_rows:
+                return units
+            return self._peek_tile(x, y)
         self._invalid_coordinates(location)
 
     def __setitem__(self, location, val):
         if type(location) == tuple and len(location) == 2 and self.in_arena_bounds(location):
-            self.__map[location[0]][location[1]] = val
+            self._set_tile(location[0], location[1], val)
+            self._refresh_tile(location[0], location[1])
             return
         self._invalid_coordinates(location)
 
     def __iter__(self):
-        self.__start = [13,0]
+        self.__position = 0
         return self
     
     def __next__(self):
-        location = self.__start
-        if location == [15,27]:
+        if self.__position == len(VALID_LOCATIONS):
             raise StopIteration
-        new_location = [location[0]+1, location[1]]
-        while not self.in_arena_bounds(new_location) and not location == [14,27]:
-            if new_location[0] == self.ARENA_SIZE:
-                new_location = [0, new_location[1]+1]
-            else:
-                new_location = [new_location[0]+1, new_location[1]]
-        self.__start = new_location
-        return location 
+        x, y = VALID_LOCATIONS[self.__position]
+        self.__position += 1
+        return [x, y]
 
     def __empty_grid(self):
         grid = []
@@ -75,6 +149,356 @@ class GameMap:
                 grid[x].append([])
         return grid
 
+    def _peek_tile(self, x, y):
+        """The list of units at a location, which must be in bounds, for reading only
+        """
+        units = self.__map[x][y]
+        if not units and self._tile_rows:
+            rows = self._tile_rows.pop(x * self.ARENA_SIZE + y, None)
+            if rows is not None:
+                units = self.__map[x][y] = self.__materialize(rows)
+                self._touched = True
+        return units
+
+    def _own_tile(self, x, y):
+        """The list of units at a location, to be changed in place. Call _refresh_tile afterwards
+        """
+        self._touched = True
+        return self._peek_tile(x, y)
+
+    def _set_tile(self, x, y, units):
+        """Replaces the list of units at a location. Call _refresh_tile afterwards
+        """
+        if self._tile_rows:
+            self._tile_rows.pop(x * self.ARENA_SIZE + y, None)
+        self._touched = True
+        self.__map[x][y] = units
+
+    def _occupied_indices(self):
+        """The flat index of every location with at least one unit, without creating any GameUnits
+        """
+        indices = set(self._tile_rows)
+        if self._touched:
+            size = self.ARENA_SIZE
+            for x, column in enumerate(self.__map):
+                for y, units in enumerate(column):
+                    if units:
+                        indices.add(x * size + y)
+        return indices
+
+    def __materialize(self, rows):
+        """Creates the GameUnits for rows of _columns
+        """
+        columns = self._columns
+        shorthands = self.config.shorthands
+        units = []
+        for row in rows:
+            unit = GameUnit(shorthands[columns.type_ids[row]], self.config, columns.owners[row], columns.health[row], columns.xs[row], columns.ys[row])
+            flags = columns.flags[row]
+            if flags & UnitColumns.UPGRADED:
+                unit.upgrade()
+            if flags & UnitColumns.PENDING_REMOVAL:
+                unit.pending_removal = True
+            units.append(unit)
+        return units
+
+    def _load_units(self, units, player_index):
+        """Adds the units of one player from a turn message as rows, without creating GameUnits.
+        Only for a map that has not been changed any other way, such as while GameState parses its message.
+
+        Args:
+            units: The player's unit lists from the message, one list per unit type
+            player_index: The player the units belong to
+        """
+        config = self.config
+        stats = config.stats
+        columns = self._columns
+        tile_rows = self._tile_rows
+        structure_rows = self._structure_rows
+        structure_index = {unit_type: type_index for type_index, unit_type in enumerate(self._structure_types)}
+        size = self.ARENA_SIZE
+        append_type, append_owner, append_x, append_y, append_health, append_flags = (
+            columns.type_ids.append, columns.owners.append, columns.xs.append, columns.ys.append, columns.health.append, columns.flags.append)
+        for type_id, unit_list in enumerate(units):
+            unit_type = config.shorthands[type_id]
+            flag = UnitColumns.PENDING_REMOVAL if unit_type == config.REMOVE else UnitColumns.UPGRADED if unit_type == config.UPGRADE else 0
+            for uinfo in unit_list:
+                x, y = int(uinfo[0]), int(uinfo[1])
+                index = x * size + y
+                if flag:
+                    # Flags the structure already at the location, like the upgrade and removal entries always come last
+                    row = structure_rows.get(index)
+                    if row is not None and not columns.flags[row] & flag:
+                        columns.flags[row] |= flag
+                        if flag == UnitColumns.UPGRADED:
+                            self._upgraded_mask |= 1 << index
+                            key = UPGRADED_KEYS[index]
+                        else:
+                            self._removal_mask |= 1 << index
+                            key = REMOVAL_KEYS[index]
+                        owner = columns.owners[row]
+                        if owner in (0, 1):
+                            self._board_hashes[owner] ^= key
+                    continue
+                unit_stats = stats[unit_type, False]
+                row = len(columns.type_ids)
+                append_type(type_id)
+                append_owner(player_index)
+                append_x(x)
+                append_y(y)
+                append_health(float(uinfo[2]) or unit_stats.max_health)
+                append_flags(0)
+                rows = tile_rows.get(index)
+                if rows is None:
+                    tile_rows[index] = [row]
+                else:
+                    rows.append(row)
+                if unit_stats.stationary:
+                    structure_rows.setdefault(index, row)
+                    self._structure_mask |= 1 << index
+                    type_index = structure_index[unit_type]
+                    self._structure_boards[player_index][type_index] |= 1 << index
+                    self._board_hashes[player_index] ^= STRUCTURE_KEYS[(2 * index + player_index) * ZOBRIST_TYPES + type_index]
+
+    def unit_columns(self):
+        """Gets every unit on the map as parallel arrays, without creating GameUnits
+
+        Returns:
+            A UnitColumns. While the map is as it was parsed this is the map's own storage, which should not be
+            changed, otherwise a new one is built from the stored rows and the GameUnits that were created
+
+        """
+        if not self._touched:
+            return self._columns
+        columns = UnitColumns()
+        stored = self._columns
+        type_index = self.config.type_index
+        size = self.ARENA_SIZE
+        tile_rows = self._tile_rows
+        for x, y in VALID_LOCATIONS:
+            rows = tile_rows.get(x * size + y) if tile_rows else None
+            if rows is not None:
+                for row in rows:
+                    columns.append(stored.type_ids[row], stored.owners[row], x, y, stored.health[row], stored.flags[row])
+                continue
+            for unit in self._peek_tile(x, y):
+                flags = (UnitColumns.UPGRADED if unit.upgraded else 0) | (UnitColumns.PENDING_REMOVAL if unit.pending_removal else 0)
+                columns.append(type_index[unit.unit_type], unit.player_index, x, y, unit.health, flags)
+        return columns
+
+    def _refresh_tile(self, x, y):
+        """Updates the structure fingerprint, bitboards, board hash and threat maps after the units at a location changed.
+        Anything that modifies the unit list of a location, or a unit's upgraded or pending_removal flag, should call this afterwards.
+        """
+        if not (0 <= x < self.ARENA_SIZE and 0 <= y < self.ARENA_SIZE):
+            return
+        units = self._peek_tile(x, y)
+        index = x * self.ARENA_SIZE + y
+        bit = 1 << index
+        if self._structure_mask & bit:
+            for player_index, boards in enumerate(self._structure_boards):
+                for type_index, board in enumerate(boards):
+                    if board & bit:
+                        boards[type_index] = board & ~bit
+                        key = STRUCTURE_KEYS[(2 * index + player_index) * ZOBRIST_TYPES + type_index]
+                        if self._upgraded_mask & bit:
+                            key ^= UPGRADED_KEYS[index]
+                        if self._removal_mask & bit:
+                            key ^= REMOVAL_KEYS[index]
+                        self._board_hashes[player_index] ^= key
+            self._structure_mask &= ~bit
+            self._upgraded_mask &= ~bit
+            self._removal_mask &= ~bit
+        for unit in units:
+            if unit.stationary:
+                self._structure_mask |= bit
+                if unit.upgraded:
+                    self._upgraded_mask |= bit
+                if unit.pending_removal:
+                    self._removal_mask |= bit
+                if unit.player_index in (0, 1):
+                    type_index = self._structure_types.index(unit.unit_type)
+                    self._structure_boards[unit.player_index][type_index] |= bit
+                    key = STRUCTURE_KEYS[(2 * index + unit.player_index) * ZOBRIST_TYPES + type_index]
+                    if unit.upgraded:
+                        key ^= UPGRADED_KEYS[index]
+                    if unit.pending_removal:
+                        key ^= REMOVAL_KEYS[index]
+                    self._board_hashes[unit.player_index] ^= key
+        for threat_map in self._threat_maps:
+            if threat_map is not None:
+                threat_map.refresh(x, y, units)
+
+    def structure_fingerprint(self):
+        """Gets a value identifying which locations are blocked by structures.
+
+        Two maps with the same structure locations have the same fingerprint, so it can be used
+        to cache anything that only depends on where structures are, such as paths.
+
+        Returns:
+            An integer with bit x * ARENA_SIZE + y set for every location holding a structure
+
+        """
+        return self._structure_mask
+
+    def structure_key(self):
+        """Gets a value identifying every structure on the map by location, owner, type and upgrade.
+
+        Unlike structure_fingerprint, which only says where structures are, two maps with the same key
+        have structures that behave the same, so it can be used to cache threat maps and similar.
+
+        Returns:
+            A hashable tuple of bitboards
+
+        """
+        return (tuple(self._structure_boards[0]), tuple(self._structure_boards[1]), self._upgraded_mask)
+
+    def board_hash(self, player_index=None):
+        """Gets a 64-bit Zobrist hash of the structures on the map.
+
+        It covers the location, owner, type, upgrade and pending removal of every structure, and is
+        updated as the map changes instead of being recomputed. Equal boards always have equal hashes and
+        different boards almost never do, so it can key caches of anything computed from the structures,
+        and comparing one player's hash across turns tells if their layout changed.
+
+        Args:
+            player_index: Only hash the structures of this player, both players if None
+
+        Returns:
+            An integer below 2 ** 64
+
+        """
+        if player_index is None:
+            return self._board_hashes[0] ^ self._board_hashes[1]
+        return self._board_hashes[player_index]
+
+    def is_blocked(self, x, y):
+        """Checks if a location holds a structure
+
+        Args:
+            x, y: The location to check, which must be in arena bounds
+
+        Returns:
+            True if a structure is at the location
+
+        """
+        return bool(self._structure_mask >> (x * self.ARENA_SIZE + y) & 1)
+
+    def get_structure_board(self, player_index=None, unit_type=None):
+        """Gets a bitboard of structure locations
+
+        Args:
+            player_index: Only include structures controlled by this player, both players if None
+            unit_type: Only include structures of this type, all structure types if None
+
+        Returns:
+            An integer with bit x * ARENA_SIZE + y set for every matching structure
+
+        """
+        if player_index is None and unit_type is None:
+            return self._structure_mask
+        players = (0, 1) if player_index is None else (player_index,)
+        if unit_type is None:
+            types = range(len(self._structure_types))
+        elif unit_type in self._structure_types:
+            types = (self._structure_types.index(unit_type),)
+        else:
+            return 0
+        board = 0
+        for player in players:
+            for type_index in types:
+                board |= self._structure_boards[player][type_index]
+        return board
+
+    def row_mask(self, rows):
+        """Gets a bitboard covering every location in the given rows
+
+        Args:
+            rows: A list of y coordinates
+
+        """
+        mask = 0
+        for y in rows:
+            mask |= ROW_MASKS[y]
+        return mask
+
+    def column_mask(self, columns):
+        """Gets a bitboard covering every location in the given columns
+
+        Args:
+            columns: A list of x coordinates
+
+        """
+        mask = 0
+        for x in columns:
+            mask |= COLUMN_MASKS[x]
+        return mask
+
+    def count_structures(self, player_index=None, unit_type=None, rows=None, columns=None):
+        """Counts structures without looking at any GameUnits
+
+        Args:
+            player_index: Only count structures controlled by this player, both players if None
+            unit_type: Only count structures of this type, all structure types if None
+            rows: Only count structures with one of these y coordinates, all rows if None
+            columns: Only count structures with one of these x coordinates, all columns if None
+
+        Returns:
+            The number of matching structures
+
+        """
+        board = self.get_structure_board(player_index, unit_type)
+        if rows is not None:
+            board &= self.row_mask(rows)
+        if columns is not None:
+            board &= self.column_mask(columns)
+        return popcount(board)
+
+    def get_threat_map(self, player_index):
+        """Gets the ThreatMap for one player's mobile units.
+        It is built on first use and kept up to date by add_unit, remove_unit and upgrades afterwards.
+
+        Args:
+            player_index: The player whose mobile units are threatened, 0 for you 1 for the enemy
+
+        Returns:
+            A ThreatMap of the damage the other player's structures deal at every location
+
+        """
+        if self._threat_maps[player_index] is None:
+            self._threat_maps[player_index] = ThreatMap(self, player_index)
+        return self._threat_maps[player_index]
+
+    def adopt_threat_maps(self, threat_maps):
+        """Uses threat maps built elsewhere for the players whose threat map was not built yet,
+        such as the ones AlgoCore.on_speculate builds. They must have been built from the same structures as this map
+
+        Args:
+            threat_maps: The ThreatMap of each player, or None to leave that player's as it is
+
+        """
+        for player_index, threat_map in enumerate(threat_maps):
+            if threat_map is not None and self._threat_maps[player_index] is None:
+                self._threat_maps[player_index] = threat_map
+
+    def overlay(self):
+        """Gets a copy-on-write view of this map for trying out hypothetical changes.
+
+        The view starts out identical to this map, and add_unit, remove_unit and upgrades made through
+        GameState.fork only change the view. It stores only the locations that changed, so making one is
+        cheap no matter how full the board is. This map should not be changed while a view of it is in use.
+
+        Example:
+            with game_state.game_map.overlay() as what_if:
+                what_if.add_unit(TURRET, [13, 10])
+                threat = what_if.get_threat_map(1)
+
+        Returns:
+            A MapOverlay of this map
+
+        """
+        return MapOverlay(self)
+
     def _invalid_coordinates(self, location):
         self.warn("{} is out of bounds.".format(str(location)))
 
@@ -89,6 +513,9 @@ class GameMap:
         
         """
         x, y = location
+        if type(x) == int and type(y) == int:
+            return 0 <= x < self.ARENA_SIZE and 0 <= y < self.ARENA_SIZE and IN_BOUNDS[x * self.ARENA_SIZE + y] == 1
+
         half_board = self.HALF_ARENA
 
         row_size = y + 1
@@ -117,8 +544,7 @@ class GameMap:
             self.warn("Passed invalid quadrant_description '{}'. See the documentation for valid inputs for get_edge_locations.".format(quadrant_description))
             return
 
-        edges = self.get_edges()
-        return edges[quadrant_description]
+        return [list(location) for location in EDGES[quadrant_description]]
 
     def get_edges(self):
         """Gets all of the edges and their edge locations
@@ -127,27 +553,7 @@ class GameMap:
             A list with four lists inside of it of locations corresponding to the four edges.
             [0] = top_right, [1] = top_left, [2] = bottom_left, [3] = bottom_right.
         """
-        top_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = self.ARENA_SIZE - 1 - num
-            top_right.append([int(x), int(y)])
-        top_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = self.ARENA_SIZE - 1 - num
-            top_left.append([int(x), int(y)])
-        bottom_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = num
-            bottom_left.append([int(x), int(y)])
-        bottom_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = num
-            bottom_right.append([int(x), int(y)])
-        return [top_right, top_left, bottom_left, bottom_right]
+        return [[list(location) for location in edge] for edge in EDGES]
     
     def add_unit(self, unit_type, location, player_index=0):
         """Add a single GameUnit to the map at the given location.
@@ -169,9 +575,10 @@ class GameMap:
         x, y = location
         new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
         if not new_unit.stationary:
-            self.__map[x][y].append(new_unit)
+            self._own_tile(x, y).append(new_unit)
         else:
-            self.__map[x][y] = [new_unit]
+            self._set_tile(x, y, [new_unit])
+        self._refresh_tile(x, y)
 
     def remove_unit(self, location):
         """Remove all units on the map in the given location.
@@ -186,7 +593,8 @@ class GameMap:
             self._invalid_coordinates(location)
         
         x, y = location
-        self.__map[x][y] = []
+        self._set_tile(x, y, [])
+        self._refresh_tile(x, y)
 
     def get_locations_in_range(self, location, radius):
         """Gets locations in a circular area around a location
@@ -205,6 +613,14 @@ class GameMap:
             self._invalid_coordinates(location)
 
         x, y = location
+        if type(x) == int and type(y) == int:
+            locations = []
+            for dx, dy in self._range_stencil(radius):
+                i, j = x + dx, y + dy
+                if 0 <= i < self.ARENA_SIZE and 0 <= j < self.ARENA_SIZE and IN_BOUNDS[i * self.ARENA_SIZE + j]:
+                    locations.append([i, j])
+            return locations
+
         locations = []
         search_radius = math.ceil(radius)
         getHitRadius = self.config["unitInformation"][0]['getHitRadius']
@@ -216,6 +632,39 @@ class GameMap:
                     locations.append(new_location)
         return locations
 
+    def get_locations_in_range_many(self, centers, radius):
+        """Gets the locations covered by circular areas around many locations at once
+
+        Args:
+            centers: A list of locations, such as every turret of one player
+            radius: The radius of each search area
+
+        Returns:
+            A dict mapping each (x, y) location in range of at least one center to the number of centers it is in range of
+
+        """
+        if radius < 0 or radius > self.ARENA_SIZE:
+            self.warn("Radius {} was passed to get_locations_in_range_many. Expected integer between 0 and {}".format(radius, self.ARENA_SIZE))
+        stencil = self._range_stencil(radius)
+        size = self.ARENA_SIZE
+        coverage = {}
+        for x, y in centers:
+            if not self.in_arena_bounds([x, y]):
+                self._invalid_coordinates([x, y])
+            for dx, dy in stencil:
+                i, j = x + dx, y + dy
+                if 0 <= i < size and 0 <= j < size and IN_BOUNDS[i * size + j]:
+                    coverage[i, j] = coverage.get((i, j), 0) + 1
+        return coverage
+
+    def _range_stencil(self, radius):
+        """Offsets of the locations in range of a location. The config's ranges are built when it is compiled
+        """
+        stencil = self._stencils.get(radius)
+        if stencil is None:
+            stencil = range_stencil(radius, self._hit_radius)
+        return stencil
+
     def distance_between_locations(self, location_1, location_2):
         """Euclidean distance
 
@@ -238,3 +687,103 @@ class GameMap:
         """
         if(self.enable_warnings):
             debug_write(message)
+
+
+class MapOverlay(GameMap):
+    """A copy-on-write view of a GameMap, made by GameMap.overlay.
+
+    Reads fall through to the parent map except at locations the view changed. The bitboards are
+    copied, which is cheap since they are integers, and threat maps are copied from the parent's the
+    first time they are asked for. GameUnits at unchanged locations are the parent's own, so change
+    them through the view's methods or GameState.fork, not directly.
+
+    Leaving a with block discards every change, so the view can be reused for the next try.
+
+    Attributes :
+        * parent (:obj: GameMap): The map this view was made from
+
+    """
+    def __init__(self, parent):
+        self.parent = parent
+        self.config = parent.config
+        self.enable_warnings = parent.enable_warnings
+        self.ARENA_SIZE = parent.ARENA_SIZE
+        self.HALF_ARENA = parent.HALF_ARENA
+        self.TOP_RIGHT = parent.TOP_RIGHT
+        self.TOP_LEFT = parent.TOP_LEFT
+        self.BOTTOM_LEFT = parent.BOTTOM_LEFT
+        self.BOTTOM_RIGHT = parent.BOTTOM_RIGHT
+        self._structure_types = parent._structure_types
+        self._hit_radius = parent._hit_radius
+        self._stencils = parent._stencils
+        self._columns = None
+        self._tile_rows = {}
+        self._touched = True
+        self.discard()
+
+    def __getitem__(self, location):
+        if len(location) == 2 and self.in_arena_bounds(location):
+            return self._peek_tile(location[0], location[1])
+        self._invalid_coordinates(location)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.discard()
+        return False
+
+    def _peek_tile(self, x, y):
+        units = self._tiles.get((x, y))
+        if units is None:
+            return self.parent._peek_tile(x, y)
+        return units
+
+    def _own_tile(self, x, y):
+        units = self._tiles.get((x, y))
+        if units is None:
+            units = self._tiles[x, y] = [copy.copy(unit) for unit in self.parent._peek_tile(x, y)]
+        return units
+
+    def _set_tile(self, x, y, units):
+        self._tiles[x, y] = units
+
+    def _refresh_tile(self, x, y):
+        GameMap._refresh_tile(self, x, y)
+        # A location changed back, such as by GameState.rollback, reads from the parent again
+        units = self._tiles.get((x, y))
+        if units is not None:
+            parent_units = self.parent._peek_tile(x, y)
+            if len(units) == len(parent_units) and all(
+                    unit is parent_unit or (unit.unit_type, unit.player_index, unit.health, unit.upgraded, unit.pending_removal) ==
+                    (parent_unit.unit_type, parent_unit.player_index, parent_unit.health, parent_unit.upgraded, parent_unit.pending_removal)
+                    for unit, parent_unit in zip(units, parent_units)):
+                del self._tiles[x, y]
+
+    def get_threat_map(self, player_index):
+        if self._threat_maps[player_index] is None:
+            threat_map = self.parent.get_threat_map(player_index).copy()
+            for (x, y), units in self._tiles.items():
+                threat_map.refresh(x, y, units)
+            self._threat_maps[player_index] = threat_map
+        return self._threat_maps[player_index]
+
+    def changed_locations(self):
+        """Gets the locations this view changed
+
+        Returns:
+            A list of [x, y] locations whose units differ from the parent map
+        """
+        return [[x, y] for x, y in self._tiles]
+
+    def discard(self):
+        """Throws away every change, so the view matches its parent map again
+        """
+        parent = self.parent
+        self._tiles = {}
+        self._structure_mask = parent._structure_mask
+        self._upgraded_mask = parent._upgraded_mask
+        self._removal_mask = parent._removal_mask
+        self._board_hashes = list(parent._board_hashes)
+        self._structure_boards = [list(boards) for boards in parent._structure_boards]
+        self._threat_maps = [None, None]
@@ -2,10 +2,13 @@ import math
 import json
 import sys
 
-from .navigation import ShortestPathFinder
+from .navigation import FastShortestPathFinder, PathCache, DynamicPathField
 from .util import send_command, debug_write
 from .unit import GameUnit
-from .game_map import GameMap
+from .game_map import GameMap, MapOverlay, UnitColumns
+from .messages import parse_message
+from .geometry import FRIENDLY_EDGE_SETS, TARGET_EDGE
+from .config import compile_config
 
 def is_stationary(unit_type):
     """
@@ -15,7 +18,39 @@ def is_stationary(unit_type):
         Returns: 
             Boolean, True if the unit is stationary, False otherwise.
     """
-    return unit_type in STRUCTURE_TYPES
+    return unit_type in _STRUCTURE_SET
+
+# The CompiledConfig the module level unit type constants were last set from
+_active_config = None
+_STRUCTURE_SET = frozenset()
+
+# Kinds of undo log entries, see GameState.savepoint
+_UNDO_RESOURCE = 0
+_UNDO_STACK = 1
+_UNDO_TILE = 2
+_UNDO_UPGRADE = 3
+
+class StateChanges:
+    """What GameState.from_previous changed on the previous turn's board
+
+    Attributes :
+        * changed_locations (list): Every [x, y] location whose units were replaced
+        * changed_players (list): The players whose structures changed, by their board hashes
+        * reused_units (int): Units kept from the previous board, with only their health updated
+        * created_units (int): New units made for the changed locations
+        * removed_units (int): Units of the previous board that were thrown away
+
+    """
+    def __init__(self):
+        self.changed_locations = []
+        self.changed_players = []
+        self.reused_units = 0
+        self.created_units = 0
+        self.removed_units = 0
+
+    def __repr__(self):
+        return "StateChanges(locations={}, players={}, reused={}, created={}, removed={})".format(
+            len(self.changed_locations), self.changed_players, self.reused_units, self.created_units, self.removed_units)
 
 class GameState:
     """Represents the entire gamestate for a given turn
@@ -38,48 +73,45 @@ class GameState:
         * MP (int): A constant representing the Mobile Points resource, used in the get_resource function
         * SP (int): A constant representing the SP resource, used in the get_resource function
          
+        * config (:obj: CompiledConfig): The game config, with the unit types, costs and ranges derived from it
         * game_map (:obj: GameMap): The current GameMap. To retrieve a list of GameUnits at a location, use game_map[x, y]
         * turn_number (int): The current turn number. Starts at 0.
         * my_health (int): Your current remaining health
         * my_time (int): The time you took to submit your previous turn
         * enemy_health (int): Your opponents current remaining health
         * enemy_time (int): Your opponents current remaining time
+        * path_cache (:obj: PathCache): Paths found by find_path_to_edge. Shared by every GameState so paths are reused across turns
+        * board_hash (int): A Zobrist hash of the structures on the map, kept up to date as it changes
+        * changes (:obj: StateChanges): What changed since the previous turn, for states made with from_previous, None otherwise
 
     """
 
+    path_cache = PathCache()
+
     def __init__(self, config, serialized_string):
         """ Setup a turns variables using arguments passed
 
         Args:
-            * config (JSON): A json object containing information about the game
-            * serialized_string (string): A string containing information about the game state at the start of this turn
+            * config (JSON): A json object containing information about the game, or the CompiledConfig made from it
+            * serialized_string (string): A string containing information about the game state at the start of this turn.
+              An EngineMessage or an already parsed dict is used without parsing it again
 
         """
         self.serialized_string = serialized_string
-        self.config = config
+        self.config = config = compile_config(config)
         self.enable_warnings = True
 
         global WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE, UPGRADE, STRUCTURE_TYPES, ALL_UNITS, UNIT_TYPE_TO_INDEX
-        UNIT_TYPE_TO_INDEX = {}
-        WALL = config["unitInformation"][0]["shorthand"]
-        UNIT_TYPE_TO_INDEX[WALL] = 0
-        SUPPORT = config["unitInformation"][1]["shorthand"]
-        UNIT_TYPE_TO_INDEX[SUPPORT] = 1
-        TURRET = config["unitInformation"][2]["shorthand"]
-        UNIT_TYPE_TO_INDEX[TURRET] = 2
-        SCOUT = config["unitInformation"][3]["shorthand"]
-        UNIT_TYPE_TO_INDEX[SCOUT] = 3
-        DEMOLISHER = config["unitInformation"][4]["shorthand"]
-        UNIT_TYPE_TO_INDEX[DEMOLISHER] = 4
-        INTERCEPTOR = config["unitInformation"][5]["shorthand"]
-        UNIT_TYPE_TO_INDEX[INTERCEPTOR] = 5
-        REMOVE = config["unitInformation"][6]["shorthand"]
-        UNIT_TYPE_TO_INDEX[REMOVE] = 6
-        UPGRADE = config["unitInformation"][7]["shorthand"]
-        UNIT_TYPE_TO_INDEX[UPGRADE] = 7
-
-        ALL_UNITS = [SCOUT, DEMOLISHER, INTERCEPTOR, WALL, SUPPORT, TURRET]
-        STRUCTURE_TYPES = [WALL, SUPPORT, TURRET]
+        global _active_config, _STRUCTURE_SET
+        if _active_config is not config:
+            _active_config = config
+            WALL, SUPPORT, TURRET = config.WALL, config.SUPPORT, config.TURRET
+            SCOUT, DEMOLISHER, INTERCEPTOR = config.SCOUT, config.DEMOLISHER, config.INTERCEPTOR
+            REMOVE, UPGRADE = config.REMOVE, config.UPGRADE
+            UNIT_TYPE_TO_INDEX = {unit_type: index for index, unit_type in enumerate(config.shorthands[:8])}
+            ALL_UNITS = [SCOUT, DEMOLISHER, INTERCEPTOR, WALL, SUPPORT, TURRET]
+            STRUCTURE_TYPES = [WALL, SUPPORT, TURRET]
+            _STRUCTURE_SET = frozenset(STRUCTURE_TYPES)
 
         self.ARENA_SIZE = 28
         self.HALF_ARENA = int(self.ARENA_SIZE / 2)
@@ -90,9 +122,12 @@ class GameState:
         SP = self.SP
 
         self.game_map = GameMap(self.config)
-        self._shortest_path_finder = ShortestPathFinder()
+        self._shortest_path_finder = FastShortestPathFinder()
         self._build_stack = []
         self._deploy_stack = []
+        self._undo_log = None
+        self._fork_start = None
+        self.changes = None
         self._player_resources = [
                 {'SP': 0, 'MP': 0},  # player 0, which is you
                 {'SP': 0, 'MP': 0}]  # player 1, which is the opponent
@@ -101,9 +136,21 @@ class GameState:
     def __parse_state(self, state_line):
         """
         Fills in map based on the serialized game state so that self.game_map[x,y] is a list of GameUnits at that location.
-        state_line is the game state as a json string.
+        state_line is the game state as a json string, EngineMessage or parsed dict.
+        """
+        state = self.__parse_stats(state_line)
+
+        p1units = state["p1Units"]
+        p2units = state["p2Units"]
+
+        self.__create_parsed_units(p1units, 0)
+        self.__create_parsed_units(p2units, 1)
+
+    def __parse_stats(self, state_line):
         """
-        state = json.loads(state_line)
+        Helper function for __parse_state to read everything but the units. Returns the parsed state.
+        """
+        state = parse_message(state_line)
 
         turn_info = state["turnInfo"]
         self.turn_number = int(turn_info[1])
@@ -119,35 +166,136 @@ class GameState:
         self._player_resources = [
             {'SP': p1_SP, 'MP': p1_MP},
             {'SP': p2_SP, 'MP': p2_MP}]
+        return state
 
-        p1units = state["p1Units"]
-        p2units = state["p2Units"]
+    def __create_parsed_units(self, units, player_number):
+        """
+        Helper function for __parse_state to add units to the map. They are stored as columns and
+        their GameUnits are only created when their location is indexed.
+        """
+        self.game_map._load_units(units, player_number)
 
-        self.__create_parsed_units(p1units, 0)
-        self.__create_parsed_units(p2units, 1)
+    @classmethod
+    def from_previous(cls, previous_state, serialized_string):
+        """Builds the GameState for a turn by updating the previous turn's board instead of parsing every unit.
+
+        Locations whose units have the same types, owners, upgrades and removal flags as in the message keep
+        their GameUnits, with their health updated. Only the other locations get new units, and the bitboards,
+        board hash and threat maps of the previous map are updated for just those. Paths are shared through
+        path_cache either way. The result is the same as GameState(config, serialized_string), and
+        its changes attribute says what changed.
+
+        The new state takes over previous_state's map, including any units placed on it with attempt_spawn,
+        so previous_state should not be used afterwards.
+
+        Args:
+            previous_state: The GameState of the previous turn, made with the same config
+            serialized_string: The new turn's message, as for GameState
+
+        Returns:
+            A GameState for the new turn
 
-    def __create_parsed_units(self, units, player_number):
         """
-        Helper function for __parse_state to add units to the map.
-        """
-        typedef = self.config.get("unitInformation")
-        for i, unit_types in enumerate(units):
-            for uinfo in unit_types:
-                unit_type = typedef[i].get("shorthand")
-                sx, sy, shp = uinfo[:3]
-                x, y = map(int, [sx, sy])
-                hp = float(shp)
-                # This depends on RM and UP always being the last types to be processed
-                if unit_type == REMOVE:
-                    # Quick fix will deploy engine fix soon
-                    if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].pending_removal = True
-                elif unit_type == UPGRADE:
-                    if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].upgrade()
-                else:
-                    unit = GameUnit(unit_type, self.config, player_number, hp, x, y)
-                    self.game_map[x,y].append(unit)
+        if isinstance(previous_state.game_map, MapOverlay):
+            return cls(previous_state.config, serialized_string)
+        game_state = cls.__new__(cls)
+        game_state.__dict__.update(previous_state.__dict__)
+        game_state.serialized_string = serialized_string
+        game_state._build_stack = []
+        game_state._deploy_stack = []
+        game_state._undo_log = None
+        state = game_state.__parse_stats(serialized_string)
+        game_state.changes = game_state.__update_units(state)
+        return game_state
+
+    def __update_units(self, state):
+        """
+        Helper function for from_previous to bring the map in line with the units of a parsed state. Returns a StateChanges.
+        """
+        config = self.config
+        stats = config.stats
+        shorthands = config.shorthands
+        game_map = self.game_map
+        size = game_map.ARENA_SIZE
+        UPGRADED, PENDING_REMOVAL = UnitColumns.UPGRADED, UnitColumns.PENDING_REMOVAL
+        # x * ARENA_SIZE + y -> [type_id, player_index, health, flags] for every unit, in the order __create_parsed_units adds them,
+        # with the UnitColumns flags
+        wanted_tiles = {}
+        for player_number, units in ((0, state["p1Units"]), (1, state["p2Units"])):
+            for type_id, unit_types in enumerate(units):
+                if not unit_types:
+                    continue
+                unit_type = shorthands[type_id]
+                flag = PENDING_REMOVAL if unit_type == config.REMOVE else UPGRADED if unit_type == config.UPGRADE else 0
+                max_health = 0 if flag else stats[unit_type, False].max_health
+                for uinfo in unit_types:
+                    index = int(uinfo[0]) * size + int(uinfo[1])
+                    if flag:
+                        wanted = wanted_tiles.get(index)
+                        if wanted and any(stats[shorthands[entry[0]], False].stationary for entry in wanted):
+                            wanted[0][3] |= flag
+                        continue
+                    entry = [type_id, player_number, float(uinfo[2]) or max_health, 0]
+                    wanted = wanted_tiles.get(index)
+                    if wanted is None:
+                        wanted_tiles[index] = [entry]
+                    else:
+                        wanted.append(entry)
+
+        # Locations whose GameUnits were never created are compared with their rows, so they stay uncreated.
+        # Only locations with units before or after can change
+        tile_rows = game_map._tile_rows
+        type_ids, owners, flags, health = game_map._columns.type_ids, game_map._columns.owners, game_map._columns.flags, game_map._columns.health
+        changes = StateChanges()
+        changed = []
+        hashes = [game_map.board_hash(0), game_map.board_hash(1)]
+        for index in game_map._occupied_indices().union(wanted_tiles):
+            wanted = wanted_tiles.get(index)
+            rows = tile_rows.get(index) if tile_rows else None
+            if rows is not None:
+                unit_count = len(rows)
+                if wanted is not None and unit_count == len(wanted):
+                    for row, entry in zip(rows, wanted):
+                        if type_ids[row] != entry[0] or owners[row] != entry[1] or flags[row] != entry[3]:
+                            break
+                    else:
+                        for row, entry in zip(rows, wanted):
+                            health[row] = entry[2]
+                        changes.reused_units += unit_count
+                        continue
+            else:
+                units = game_map._peek_tile(*divmod(index, size))
+                unit_count = len(units)
+                if wanted is not None and unit_count == len(wanted):
+                    for unit, entry in zip(units, wanted):
+                        if (unit.unit_type != shorthands[entry[0]] or unit.player_index != entry[1] or
+                                unit.upgraded != bool(entry[3] & UPGRADED) or unit.pending_removal != bool(entry[3] & PENDING_REMOVAL)):
+                            break
+                    else:
+                        for unit, entry in zip(units, wanted):
+                            unit.health = entry[2]
+                        changes.reused_units += unit_count
+                        continue
+            if wanted is None and not unit_count:
+                continue
+            changed.append(index)
+            changes.removed_units += unit_count
+            x, y = divmod(index, size)
+            new_units = []
+            for type_id, player_index, unit_health, unit_flags in wanted or ():
+                unit = GameUnit(shorthands[type_id], config, player_index, unit_health, x, y)
+                if unit_flags & UPGRADED:
+                    unit.upgrade()
+                unit.pending_removal = bool(unit_flags & PENDING_REMOVAL)
+                new_units.append(unit)
+            changes.created_units += len(new_units)
+            game_map._set_tile(x, y, new_units)
+            game_map._refresh_tile(x, y)
+        # In the order of VALID_LOCATIONS
+        changed.sort(key=lambda index: (index % size, index))
+        changes.changed_locations = [list(divmod(index, size)) for index in changed]
+        changes.changed_players = [player_index for player_index in (0, 1) if game_map.board_hash(player_index) != hashes[player_index]]
+        return changes
 
     def __resource_required(self, unit_type):
         return self.SP if is_stationary(unit_type) else self.MP
@@ -163,8 +311,17 @@ class GameState:
         elif resource_type == self.SP:
             resource_key = 'SP'
         held_resource = self.get_resource(resource_type, player_index)
+        if self._undo_log is not None:
+            self._undo_log.append((_UNDO_RESOURCE, player_index, resource_key, held_resource))
         self._player_resources[player_index][resource_key] = held_resource + amount
 
+    def __push(self, stack, entry):
+        """Adds an entry to the build or deploy stack, logging it if a savepoint is open
+        """
+        stack.append(entry)
+        if self._undo_log is not None:
+            self._undo_log.append((_UNDO_STACK, stack))
+
     def _invalid_player_index(self, index):
         self.warn("Invalid player index {} passed, player index should always be 0 (yourself) or 1 (your opponent)".format(index))
     
@@ -234,11 +391,11 @@ class GameState:
             The number of units affordable of the given unit_type.
 
         """
-        if unit_type not in ALL_UNITS:
+        if unit_type not in self.config.all_units:
             self._invalid_unit(unit_type)
             return
 
-        costs = self.type_cost(unit_type)
+        costs = self.config.costs[unit_type]
         player_held = self.get_resources()
         if costs[MP] > 0 and costs[SP] > 0:
             return min(math.floor(player_held[SP] / costs[SP]), math.floor(player_held[MP] / costs[MP]))
@@ -270,13 +427,14 @@ class GameState:
         if type(current_MP) == int and current_MP < 0:
             self.warn("Invalid current MP ({}). Current MP cannot be negative.".format(current_MP))
 
+        config = self.config
         MP = self.get_resource(self.MP, player_index) if not current_MP else current_MP
         for increment in range(1, turns_in_future + 1):
             current_turn = self.turn_number + increment
-            MP *= (1 - self.config["resources"]["bitDecayPerRound"])
-            MP_per_round = self.config["resources"]["bitsPerRound"]
-            MP_ramp_ups = current_turn // self.config["resources"]["turnIntervalForBitSchedule"]
-            MP_per_round_growth = self.config["resources"]["bitGrowthRate"]
+            MP *= (1 - config.bit_decay_per_round)
+            MP_per_round = config.bits_per_round
+            MP_ramp_ups = current_turn // config.turn_interval_for_bit_schedule
+            MP_per_round_growth = config.bit_growth_rate
             MP_gained = MP_per_round + (MP_per_round_growth * MP_ramp_ups)
             MP += MP_gained
             MP = round(MP, 1)
@@ -296,12 +454,7 @@ class GameState:
             self._invalid_unit(unit_type)
             return
         
-        unit_def = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[unit_type]]
-        cost_base = [unit_def.get('cost1', 0), unit_def.get('cost2', 0)]
-        if upgrade:
-            return [unit_def.get('upgrade', {}).get('cost1', cost_base[SP]), unit_def.get('upgrade', {}).get('cost2', cost_base[MP])]
-
-        return cost_base
+        return list(self.config.upgrade_costs[unit_type] if upgrade else self.config.costs[unit_type])
 
 
     def can_spawn(self, unit_type, location, num=1):
@@ -320,7 +473,7 @@ class GameState:
             True if we can spawn the unit(s)
 
         """
-        if unit_type not in ALL_UNITS:
+        if unit_type not in self.config.all_units:
             self._invalid_unit(unit_type)
             return
         
@@ -330,10 +483,10 @@ class GameState:
             return False
 
         affordable = self.number_affordable(unit_type) >= num
-        stationary = is_stationary(unit_type)
+        stationary = unit_type in self.config.structure_set
         blocked = self.contains_stationary_unit(location) or (stationary and len(self.game_map[location[0],location[1]]) > 0)
         correct_territory = location[1] < self.HALF_ARENA
-        on_edge = location in (self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT))
+        on_edge = (location[0], location[1]) in FRIENDLY_EDGE_SETS[0]
 
         if self.enable_warnings:
             fail_reason = ""
@@ -364,7 +517,7 @@ class GameState:
             The number of units successfully spawned
 
         """
-        if unit_type not in ALL_UNITS:
+        if unit_type not in self.config.all_units:
             self._invalid_unit(unit_type)
             return
         if num < 1 or not locations:
@@ -378,14 +531,16 @@ class GameState:
             for i in range(num):
                 if self.can_spawn(unit_type, location, 1):
                     x, y = map(int, location)
-                    costs = self.type_cost(unit_type)
+                    costs = self.config.costs[unit_type]
                     self.__set_resource(SP, 0 - costs[SP])
                     self.__set_resource(MP, 0 - costs[MP])
+                    if self._undo_log is not None:
+                        self._undo_log.append((_UNDO_TILE, x, y, list(self.game_map._peek_tile(x, y))))
                     self.game_map.add_unit(unit_type, location, 0)
-                    if is_stationary(unit_type):
-                        self._build_stack.append((unit_type, x, y))
+                    if unit_type in self.config.structure_set:
+                        self.__push(self._build_stack, (unit_type, x, y))
                     else:
-                        self._deploy_stack.append((unit_type, x, y))
+                        self.__push(self._deploy_stack, (unit_type, x, y))
                     spawned_units += 1
                 else:
                     break
@@ -407,7 +562,7 @@ class GameState:
         for location in locations:
             if location[1] < self.HALF_ARENA and self.contains_stationary_unit(location):
                 x, y = map(int, location)
-                self._build_stack.append((REMOVE, x, y))
+                self.__push(self._build_stack, (REMOVE, x, y))
                 removed_units += 1
             else:
                 self.warn("Could not remove a unit from {}. Location has no structures or is enemy territory.".format(location))
@@ -435,23 +590,137 @@ class GameState:
             if location[1] < self.HALF_ARENA and self.contains_stationary_unit(location):
                 x, y = map(int, location)
                 existing_unit = None
-                for unit in self.game_map[x,y]:
+                for unit in self.game_map._own_tile(x, y):
                     if unit.stationary:
                         existing_unit = unit
 
-                if not existing_unit.upgraded and self.config["unitInformation"][UNIT_TYPE_TO_INDEX[existing_unit.unit_type]].get("upgrade", None) is not None:
-                    costs = self.type_cost(existing_unit.unit_type, True)
+                if not existing_unit.upgraded and existing_unit.unit_type in self.config.upgrades:
+                    costs = self.config.upgrade_costs[existing_unit.unit_type]
                     resources = self.get_resources()
                     if resources[SP] >= costs[SP] and resources[MP] >= costs[MP]:
                         self.__set_resource(SP, 0 - costs[SP])
                         self.__set_resource(MP, 0 - costs[MP])
+                        if self._undo_log is not None:
+                            self._undo_log.append((_UNDO_UPGRADE, existing_unit, existing_unit.stats))
                         existing_unit.upgrade()
-                        self._build_stack.append((UPGRADE, x, y))
+                        self.game_map._refresh_tile(x, y)
+                        self.__push(self._build_stack, (UPGRADE, x, y))
                         spawned_units += 1
             else:
                 self.warn("Could not upgrade a unit from {}. Location has no structures or is enemy territory.".format(location))
         return spawned_units
 
+    def savepoint(self):
+        """Marks the current plan so later spawns, upgrades and removals can be undone with rollback.
+
+        While a savepoint is open, attempt_spawn, attempt_upgrade and attempt_remove log what they change
+        instead of anything being copied, so rolling back costs as much as the changes it undoes.
+        Savepoints nest: rolling back to an earlier one also undoes everything after later ones.
+
+        Example:
+            start = game_state.savepoint()
+            for plan in plans:
+                apply(plan, game_state)
+                scores.append(score(game_state))
+                game_state.rollback(start)
+            game_state.commit()
+
+        Returns:
+            A savepoint to pass to rollback
+
+        """
+        if self._undo_log is None:
+            self._undo_log = []
+        return len(self._undo_log)
+
+    def rollback(self, savepoint):
+        """Undoes every spawn, upgrade and removal made since a savepoint, restoring resources,
+        the build and deploy stacks and the map. The savepoint can be rolled back to again.
+
+        Args:
+            savepoint: A savepoint from savepoint()
+
+        """
+        undo_log = self._undo_log
+        if undo_log is None or savepoint > len(undo_log):
+            self.warn("Cannot roll back to savepoint {}, it was committed or already rolled back past".format(savepoint))
+            return
+        game_map = self.game_map
+        while len(undo_log) > savepoint:
+            entry = undo_log.pop()
+            kind = entry[0]
+            if kind == _UNDO_RESOURCE:
+                _, player_index, resource_key, amount = entry
+                self._player_resources[player_index][resource_key] = amount
+            elif kind == _UNDO_STACK:
+                entry[1].pop()
+            elif kind == _UNDO_TILE:
+                _, x, y, units = entry
+                game_map._set_tile(x, y, units)
+                game_map._refresh_tile(x, y)
+            elif kind == _UNDO_UPGRADE:
+                _, unit, stats = entry
+                unit.stats = stats
+                unit.upgraded = False
+                game_map._refresh_tile(unit.x, unit.y)
+
+    def commit(self):
+        """Keeps every change made since the first open savepoint and stops logging them.
+        Savepoints taken before the commit can no longer be rolled back to.
+        """
+        self._undo_log = None
+
+    def fork(self):
+        """Gets a hypothetical copy of this GameState to try placements on.
+
+        The fork's game_map is a copy-on-write overlay of this one (see GameMap.overlay), and its resources
+        and build and deploy stacks are copies, so attempt_spawn, attempt_upgrade and attempt_remove on the
+        fork leave this GameState untouched. Pathing, get_attackers, get_target and threat maps on the fork
+        see its changes. Only the changes are stored, so forking is cheap. Leaving a with block discards
+        every change made on the fork, to its map, resources and stacks, so the same fork can be used for
+        the next try. Forks should not be submitted.
+
+        Example:
+            with game_state.fork() as what_if:
+                what_if.attempt_spawn(TURRET, [13, 10])
+                path = what_if.find_path_to_edge([13, 0])
+
+        Returns:
+            A GameState sharing everything that did not change with this one
+
+        """
+        fork = self.__class__.__new__(self.__class__)
+        fork.__dict__.update(self.__dict__)
+        fork.game_map = self.game_map.overlay()
+        fork._shortest_path_finder = FastShortestPathFinder()
+        fork._build_stack = list(self._build_stack)
+        fork._deploy_stack = list(self._deploy_stack)
+        fork._player_resources = [dict(resources) for resources in self._player_resources]
+        fork._undo_log = None
+        # What leaving a with block restores
+        fork._fork_start = (tuple(self._build_stack), tuple(self._deploy_stack), [dict(resources) for resources in self._player_resources])
+        return fork
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if isinstance(self.game_map, MapOverlay):
+            self.game_map.discard()
+        if self._fork_start is not None:
+            build_stack, deploy_stack, player_resources = self._fork_start
+            self._build_stack = list(build_stack)
+            self._deploy_stack = list(deploy_stack)
+            self._player_resources = [dict(resources) for resources in player_resources]
+            self._undo_log = None
+        return False
+
+    @property
+    def board_hash(self):
+        """A 64-bit Zobrist hash of the structures on the map, see GameMap.board_hash
+        """
+        return self.game_map.board_hash()
+
     def get_target_edge(self, start_location):
         """Gets the target edge given a starting location
 
@@ -462,6 +731,10 @@ class GameState:
             The edge this unit would attempt to reach if it was spawned at this location (int)
         """
 
+        x, y = start_location
+        if type(x) == int and type(y) == int and 0 <= x < self.ARENA_SIZE and 0 <= y < self.ARENA_SIZE:
+            return TARGET_EDGE[x * self.ARENA_SIZE + y]
+
         left = start_location[0] < self.HALF_ARENA
         bottom = start_location[1] < self.HALF_ARENA
         right = not(left)
@@ -487,6 +760,9 @@ class GameState:
             A list of locations corresponding to the path the unit would take 
             to get from it's starting location to the best available end location
 
+        Paths are cached in path_cache under the current structure fingerprint, so asking again
+        before any structure is added or removed from the map is a dictionary lookup.
+
         """
         if self.contains_stationary_unit(start_location):
             self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
@@ -495,8 +771,69 @@ class GameState:
         if target_edge is None:
             target_edge = self.get_target_edge(start_location)
 
+        key = (self.game_map.structure_fingerprint(), int(start_location[0]), int(start_location[1]), target_edge)
+        path = self.path_cache.get(key)
+        if path is not None:
+            return path
+
         end_points = self.game_map.get_edge_locations(target_edge)
-        return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+        path = self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+        if path is not None:
+            self.path_cache.put(key, path)
+        return path
+
+    def find_paths_to_edge_batch(self, start_locations, target_edge=None):
+        """Gets the paths units at several locations would take.
+        Equivalent to calling find_path_to_edge for each location, but the distance field for each
+        target edge is computed once and shared by every start location that can reach that edge.
+
+        Args:
+            start_locations: A list of locations of hypothetical units
+            target_edge: The edge the units want to reach. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc. Induced from each start location if None.
+
+        Returns:
+            A list with the path for each start location, in the same order. Blocked start locations get None.
+
+        """
+        fingerprint = self.game_map.structure_fingerprint()
+        paths = [None] * len(start_locations)
+        missing = {}
+        for i, start_location in enumerate(start_locations):
+            if self.contains_stationary_unit(start_location):
+                self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
+                continue
+            edge = self.get_target_edge(start_location) if target_edge is None else target_edge
+            key = (fingerprint, int(start_location[0]), int(start_location[1]), edge)
+            paths[i] = self.path_cache.get(key)
+            if paths[i] is None:
+                missing.setdefault(edge, []).append((i, key))
+
+        for edge, requests in missing.items():
+            end_points = self.game_map.get_edge_locations(edge)
+            found = self._shortest_path_finder.navigate_batch([start_locations[i] for i, _ in requests], end_points, self)
+            for (i, key), path in zip(requests, found):
+                paths[i] = path
+                if path is not None:
+                    self.path_cache.put(key, path)
+        return paths
+
+    def path_field(self, start_location, target_edge=None):
+        """Gets a distance field that can answer what-if questions about a unit's path.
+        Useful for evaluating candidate structure placements, see DynamicPathField.what_if_block and
+        DynamicPathField.what_if_unblock. The field is a snapshot, later changes to game_map are not seen by it.
+
+        Args:
+            start_location: The location of a hypothetical unit
+            target_edge: The edge the unit wants to reach. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc. Induced from start_location if None.
+
+        Returns:
+            A DynamicPathField tracking the path from start_location
+
+        """
+        if target_edge is None:
+            target_edge = self.get_target_edge(start_location)
+        end_points = self.game_map.get_edge_locations(target_edge)
+        return DynamicPathField(self, start_location, end_points)
 
     def contains_stationary_unit(self, location):
         """Check if a location is blocked, return structures unit if it is
@@ -512,6 +849,7 @@ class GameState:
             self.warn('Checked for stationary unit outside of arena bounds')
             return False
         x, y = map(int, location)
+        # The units are scanned rather than trusting is_blocked, which misses units appended to a location's list directly
         for unit in self.game_map[x,y]:
             if unit.stationary:
                 return unit
@@ -565,7 +903,7 @@ class GameState:
 
         for location in possible_locations:
             for unit in self.game_map[location]:
-                if unit.player_index == attacking_unit.player_index or (attacking_unit.damage_f == 0 and is_stationary(unit.unit_type)) or (attacking_unit.damage_i == 0 and not(is_stationary(unit.unit_type))):
+                if unit.player_index == attacking_unit.player_index or (attacking_unit.damage_f == 0 and unit.stationary) or (attacking_unit.damage_i == 0 and not unit.stationary):
                     continue
 
                 new_target = False
@@ -614,6 +952,21 @@ class GameState:
                     target_x_distance = unit_x_distance
         return target
 
+    def get_threat_map(self, player_index=0):
+        """Gets the threat map for a player's mobile units, see GameMap.get_threat_map
+
+        Args:
+            player_index: The index corresponding to the defending player, 0 for you 1 for the enemy
+
+        Returns:
+            A ThreatMap holding the damage per frame and number of attacking structures at every location
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+        return self.game_map.get_threat_map(player_index)
+
     def get_attackers(self, location, player_index):
         """Gets the stationary units threatening a given location
 
@@ -635,11 +988,7 @@ class GameState:
         """
         Get locations in the range of TURRET units
         """
-        max_range = 0
-        for unit in self.config["unitInformation"]:
-            if unit.get('attackRange', 0) >= max_range:
-                max_range = unit.get('attackRange', 0)
-        possible_locations= self.game_map.get_locations_in_range(location, max_range)
+        possible_locations= self.game_map.get_locations_in_range(location, self.config.max_attack_range)
         for location_unit in possible_locations:
             for unit in self.game_map[location_unit]:
                 if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and self.game_map.distance_between_locations(location, location_unit) <= unit.attackRange:
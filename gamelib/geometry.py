@@ -0,0 +1,137 @@
+"""
+Static board geometry, computed once at import.
+
+Tiles are addressed either as (x, y) locations or as flat indices x * ARENA_SIZE + y.
+Every table here is immutable and shared by GameMap, GameState and the path-finders.
+"""
+import math
+import random
+import functools
+from array import array
+
+ARENA_SIZE = 28
+HALF_ARENA = 14
+NUM_TILES = ARENA_SIZE * ARENA_SIZE
+
+TOP_RIGHT = 0
+TOP_LEFT = 1
+BOTTOM_LEFT = 2
+BOTTOM_RIGHT = 3
+
+
+def _build_in_bounds():
+    in_bounds = bytearray(NUM_TILES)
+    for y in range(ARENA_SIZE):
+        row_size = y + 1 if y < HALF_ARENA else ARENA_SIZE - y
+        startx = HALF_ARENA - row_size
+        for x in range(startx, startx + 2 * row_size):
+            in_bounds[x * ARENA_SIZE + y] = 1
+    return bytes(in_bounds)
+
+
+def _build_edges():
+    top_right = tuple((HALF_ARENA + num, ARENA_SIZE - 1 - num) for num in range(HALF_ARENA))
+    top_left = tuple((HALF_ARENA - 1 - num, ARENA_SIZE - 1 - num) for num in range(HALF_ARENA))
+    bottom_left = tuple((HALF_ARENA - 1 - num, num) for num in range(HALF_ARENA))
+    bottom_right = tuple((HALF_ARENA + num, num) for num in range(HALF_ARENA))
+    return (top_right, top_left, bottom_left, bottom_right)
+
+
+def _build_neighbors():
+    # Same order as ShortestPathFinder._get_neighbors, with out of bounds tiles left out
+    neighbors = []
+    for index in range(NUM_TILES):
+        x, y = divmod(index, ARENA_SIZE)
+        adjacent = []
+        for nx, ny in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+            if 0 <= nx < ARENA_SIZE and 0 <= ny < ARENA_SIZE and IN_BOUNDS[nx * ARENA_SIZE + ny]:
+                adjacent.append(nx * ARENA_SIZE + ny)
+        neighbors.append(tuple(adjacent))
+    return tuple(neighbors)
+
+
+def _target_edge(x, y):
+    left = x < HALF_ARENA
+    bottom = y < HALF_ARENA
+    if left and bottom:
+        return TOP_RIGHT
+    elif left:
+        return BOTTOM_RIGHT
+    elif bottom:
+        return TOP_LEFT
+    return BOTTOM_LEFT
+
+
+#: 1 for every tile on the diamond shaped board, indexed by x * ARENA_SIZE + y
+IN_BOUNDS = _build_in_bounds()
+#: Flat indices of every tile on the board, in index order
+VALID_INDICES = tuple(index for index in range(NUM_TILES) if IN_BOUNDS[index])
+#: Every (x, y) location on the board, bottom row first, in the order GameMap iterates them
+VALID_LOCATIONS = tuple((x, y) for y in range(ARENA_SIZE) for x in range(ARENA_SIZE) if IN_BOUNDS[x * ARENA_SIZE + y])
+#: The (x, y) locations of each edge, indexed by TOP_RIGHT, TOP_LEFT, BOTTOM_LEFT and BOTTOM_RIGHT
+EDGES = _build_edges()
+#: The locations of each edge as frozensets, for membership tests
+EDGE_SETS = tuple(frozenset(edge) for edge in EDGES)
+#: The edges a player spawns mobile units on, for you (0) and the enemy (1)
+FRIENDLY_EDGE_SETS = (EDGE_SETS[BOTTOM_LEFT] | EDGE_SETS[BOTTOM_RIGHT], EDGE_SETS[TOP_LEFT] | EDGE_SETS[TOP_RIGHT])
+#: For each edge, 1 for every tile on it, indexed by x * ARENA_SIZE + y
+ON_EDGE = tuple(bytes(1 if (index // ARENA_SIZE, index % ARENA_SIZE) in edge else 0 for index in range(NUM_TILES)) for edge in EDGE_SETS)
+#: The in bounds neighbors of every tile as flat indices
+NEIGHBORS = _build_neighbors()
+#: The edge a unit starting on each tile paths towards, indexed by x * ARENA_SIZE + y
+TARGET_EDGE = bytes(_target_edge(*divmod(index, ARENA_SIZE)) for index in range(NUM_TILES))
+#: Bitboards covering each row and each column
+ROW_MASKS = tuple(sum(1 << (x * ARENA_SIZE + y) for x in range(ARENA_SIZE)) for y in range(ARENA_SIZE))
+COLUMN_MASKS = tuple(sum(1 << (x * ARENA_SIZE + y) for y in range(ARENA_SIZE)) for x in range(ARENA_SIZE))
+
+
+#: The most structure types the Zobrist keys below cover
+ZOBRIST_TYPES = 8
+
+
+def _build_zobrist(count, seed):
+    rng = random.Random(seed)
+    return array('Q', (rng.getrandbits(64) for _ in range(count)))
+
+# Random 64-bit keys for Zobrist hashing of the structures on a board, see GameMap.board_hash.
+# STRUCTURE_KEYS is indexed by (x * ARENA_SIZE + y) * 2 * ZOBRIST_TYPES + player_index * ZOBRIST_TYPES + structure type index,
+# the others by x * ARENA_SIZE + y. The seeds are fixed so hashes are the same in every process
+STRUCTURE_KEYS = _build_zobrist(NUM_TILES * 2 * ZOBRIST_TYPES, 0x2F5A)
+UPGRADED_KEYS = _build_zobrist(NUM_TILES, 0x2F5B)
+REMOVAL_KEYS = _build_zobrist(NUM_TILES, 0x2F5C)
+
+
+def in_bounds(x, y):
+    """Checks if integer coordinates are on the board
+    """
+    return 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and IN_BOUNDS[x * ARENA_SIZE + y] == 1
+
+
+# Range stencils by (squared distance bound, largest offset). Both are integers no larger than the board
+# allows, so the cache stays small whatever radii are asked for
+_stencils = {}
+
+
+@functools.lru_cache(maxsize=256)
+def range_stencil(radius, hit_radius):
+    """Offsets (dx, dy) of the locations in range of a location, shared by every map
+
+    Args:
+        radius: An attack or shield range
+        hit_radius: How far past its range a unit reaches a location's center, getHitRadius in the config
+
+    """
+    # A unit with a given range affects all locations whose centers are within that range + get hit radius
+    limit = radius + hit_radius
+    span = min(max(math.ceil(radius), -1), ARENA_SIZE - 1)
+    bound = -1
+    if limit > 0:
+        bound = min(int(limit * limit) + 1, 2 * span * span)
+        while bound >= 0 and math.sqrt(bound) >= limit:
+            bound -= 1
+    key = (bound, span)
+    stencil = _stencils.get(key)
+    if stencil is None:
+        stencil = _stencils[key] = tuple(
+            (dx, dy) for dx in range(-span, span + 1) for dy in range(-span, span + 1) if dx * dx + dy * dy <= bound)
+    return stencil
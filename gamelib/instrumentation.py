@@ -0,0 +1,199 @@
+"""
+Per turn timing of gamelib's hot paths.
+
+Call gamelib.instrumentation.enable() in your AlgoStrategy.__init__ and every turn one json line is
+written with the number of calls, total and longest time of each timed section, and counters such as
+the number of tiles the path-finders searched:
+
+    {"turn": 3, "turn_ms": 41.2, "sections": {"GameState.can_spawn": {"calls": 58, "total_ms": 1.9, "max_ms": 0.1}, ...}, "counters": {"bfs_nodes": 4120}}
+
+Timing is added by wrapping the methods when enable is called and removed by disable, so it costs
+nothing while disabled. Use section and count to time your own code the same way.
+"""
+import sys
+import json
+import time
+import functools
+import threading
+
+from .game_state import GameState
+from .navigation import ShortestPathFinder, FastShortestPathFinder
+
+#: True while instrumentation is enabled
+enabled = False
+
+_output = None
+_close_output = False
+_sections = {}
+_counters = {}
+_turn_start = None
+_originals = []
+# Timed code can run on the speculation thread, or threads of your own, while on_turn runs
+_lock = threading.Lock()
+
+
+def _record(name, elapsed):
+    with _lock:
+        stats = _sections.get(name)
+        if stats is None:
+            stats = _sections[name] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += elapsed
+        if elapsed > stats[2]:
+            stats[2] = elapsed
+
+
+def count(name, amount=1):
+    """Adds amount to a counter reported with this turn's line
+    """
+    if enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + amount
+
+
+class _Section:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        _record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoSection:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_no_section = _NoSection()
+
+
+def section(name):
+    """A context manager timing the code inside it as a section, if instrumentation is enabled
+
+    Example:
+        with gamelib.instrumentation.section("plan_attack"):
+            ...
+
+    """
+    return _Section(name) if enabled else _no_section
+
+
+def _timed(name, method, nodes=None):
+    """Wraps method so every call is recorded under name. nodes, if given, counts the tiles a search visited
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        finally:
+            _record(name, time.perf_counter() - start)
+        if nodes is not None:
+            count("bfs_nodes", nodes(args[0], result))
+        return result
+    return wrapper
+
+
+def _fast_nodes(finder, pathlength):
+    return len(pathlength) - pathlength.count(-1)
+
+
+def _reference_nodes(finder, _):
+    return sum(1 for column in finder.game_map for node in column if node.visited_validate)
+
+
+# (class, attribute, section name, node counter)
+_TARGETS = [
+    (ShortestPathFinder, "navigate_multiple_endpoints", "ShortestPathFinder.navigate_multiple_endpoints", None),
+    (ShortestPathFinder, "_validate", "ShortestPathFinder._validate", _reference_nodes),
+    (FastShortestPathFinder, "navigate_multiple_endpoints", "FastShortestPathFinder.navigate_multiple_endpoints", None),
+    (FastShortestPathFinder, "navigate_batch", "FastShortestPathFinder.navigate_batch", None),
+    (FastShortestPathFinder, "_validate", "FastShortestPathFinder._validate", _fast_nodes),
+    (GameState, "_GameState__parse_state", "GameState.parse_state", None),
+    (GameState, "get_attackers", "GameState.get_attackers", None),
+    (GameState, "get_target", "GameState.get_target", None),
+    (GameState, "can_spawn", "GameState.can_spawn", None),
+    (GameState, "attempt_spawn", "GameState.attempt_spawn", None),
+]
+
+
+def enable(output=None):
+    """Starts timing gamelib's hot paths
+
+    Args:
+        output: A file name to append the json lines to, or an open file. Defaults to standard error,
+            which the game shows as your algo's debug output
+
+    """
+    global enabled, _output, _close_output
+    if enabled:
+        disable()
+    if isinstance(output, str):
+        _output = open(output, "a")
+        _close_output = True
+    else:
+        _output = output
+        _close_output = False
+    for cls, attribute, name, nodes in _TARGETS:
+        method = cls.__dict__[attribute]
+        _originals.append((cls, attribute, method))
+        setattr(cls, attribute, _timed(name, method, nodes))
+    _sections.clear()
+    _counters.clear()
+    enabled = True
+
+
+def disable():
+    """Stops timing and restores the original methods
+    """
+    global enabled, _output, _close_output
+    while _originals:
+        cls, attribute, method = _originals.pop()
+        setattr(cls, attribute, method)
+    if _close_output:
+        _output.close()
+    _output = None
+    _close_output = False
+    enabled = False
+
+
+def begin_turn():
+    """Marks the start of a turn. Called by AlgoCore before on_turn
+    """
+    global _turn_start
+    _turn_start = time.perf_counter()
+
+
+def report():
+    """Gets what was recorded since the last end_turn, in the form written for each turn
+    """
+    with _lock:
+        return {
+            "turn_ms": round(1000 * (time.perf_counter() - _turn_start), 3) if _turn_start is not None else None,
+            "sections": {name: {"calls": calls, "total_ms": round(1000 * total, 3), "max_ms": round(1000 * longest, 3)}
+                         for name, (calls, total, longest) in sorted(_sections.items())},
+            "counters": dict(_counters),
+        }
+
+
+def end_turn(turn_number):
+    """Writes the line for a turn and starts recording the next one. Called by AlgoCore after on_turn
+    """
+    global _turn_start
+    line = dict(turn=turn_number, **report())
+    output = sys.stderr if _output is None else _output
+    output.write(json.dumps(line) + "\n")
+    output.flush()
+    with _lock:
+        _sections.clear()
+        _counters.clear()
+    _turn_start = None
@@ -0,0 +1,473 @@
+"""
+A stand-in for the game engine, for running matches between algos offline.
+
+It speaks the same stdin/stdout protocol as the real engine: each algo is sent the config, a turn
+message every turn, and answers each turn with a build stack and a deploy stack. Its rules are a close
+approximation of the real engine, not a copy, so use it to compare strategies quickly and confirm
+important results against the real engine.
+
+The action phase is played out with gamelib.simulator, which only reports its outcome, so each algo is
+sent a single action frame per turn instead of one per frame. That frame holds the board after the
+action phase, every breach and every structure destroyed during it, and no move, spawn, attack or
+damage events. Frame handlers and on_action_frame therefore run once per turn, and speculation starts
+from the board the next turn will have.
+
+Run a tournament between algos from the command line with
+
+    python -m gamelib.local_engine game-configs.json path/to/algo1/run.sh path/to/algo2/run.sh --games 20
+"""
+import os
+import sys
+import json
+import time
+import queue
+import shlex
+import argparse
+import itertools
+import threading
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+from .game_state import GameState
+from .config import compile_config
+from .geometry import ARENA_SIZE, VALID_LOCATIONS
+from .simulator import Simulator
+
+
+def _flip(x, y):
+    """The same location as seen by the other player
+    """
+    return ARENA_SIZE - 1 - x, ARENA_SIZE - 1 - y
+
+
+def algo_command(path):
+    """Gets the command that starts an algo
+
+    Args:
+        path: A run.sh script, a python file or a full command line
+
+    Returns:
+        A list of arguments for subprocess
+
+    """
+    if path.endswith(".sh"):
+        return ["bash", path]
+    if path.endswith(".py"):
+        return [sys.executable, "-u", path]
+    return shlex.split(path)
+
+
+class AlgoProcess:
+    """An algo running in a subprocess, talking over its stdin and stdout
+
+    Lines the algo prints are collected by a background thread, so reads can time out.
+
+    """
+    def __init__(self, path, stderr=None):
+        """Starts the algo
+
+        Args:
+            path: See algo_command
+            stderr: A file for the algo's debug output, discarded if None
+        """
+        self.path = path
+        self._process = subprocess.Popen(algo_command(path), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         stderr=subprocess.DEVNULL if stderr is None else stderr,
+                                         universal_newlines=True, bufsize=1)
+        self._lines = queue.Queue()
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        for line in self._process.stdout:
+            self._lines.put(line)
+        self._lines.put(None)
+
+    def send(self, line):
+        """Sends one message. Returns False if the algo has exited
+        """
+        try:
+            self._process.stdin.write(line + "\n")
+            self._process.stdin.flush()
+            return True
+        except (BrokenPipeError, OSError, ValueError):
+            return False
+
+    def receive(self, timeout):
+        """Gets the next line the algo printed, or None if it exited or took longer than timeout seconds
+        """
+        try:
+            line = self._lines.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return None if line is None else line.strip()
+
+    def close(self):
+        """Stops the algo
+        """
+        try:
+            self._process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        try:
+            self._process.wait(timeout=3)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+
+
+class MatchResult:
+    """The outcome of one match
+
+    Attributes :
+        * winner (int): 0 if the first algo won, 1 if the second did, None for a draw
+        * turns (int): The number of turns played
+        * health ([float, float]): Each algo's health at the end
+        * reason (str): Why the match ended: "health", "turns" or "timeout" if an algo crashed or did not answer in time
+        * seconds (float): How long the match took
+
+    """
+    def __init__(self, winner, turns, health, reason, seconds):
+        self.winner = winner
+        self.turns = turns
+        self.health = health
+        self.reason = reason
+        self.seconds = seconds
+
+    def __repr__(self):
+        return "MatchResult(winner={}, turns={}, health={}, reason={})".format(self.winner, self.turns, self.health, self.reason)
+
+
+class LocalEngine:
+    """Referees a match between two algos
+
+    The board is kept as a GameState from the first algo's point of view. The second algo's messages are
+    flipped so that, like with the real engine, every algo sees itself as player 1 at the bottom of the board.
+
+    Attributes :
+        * config (dict): The game config sent to both algos
+        * max_turns (int): The match is a draw on health after this many turns
+        * turn_timeout (float): Seconds an algo has to answer a turn before it forfeits
+        * board (:obj: GameState): The current board, from the first algo's point of view
+
+    """
+    def __init__(self, config, max_turns=100, turn_timeout=5.0):
+        self.config = config
+        self.max_turns = max_turns
+        self.turn_timeout = turn_timeout
+        type_index = compile_config(config).type_index
+        self._types = [unit_info.get("shorthand") for unit_info in config["unitInformation"]]
+        self._remove_index = type_index["RM"]
+        self._upgrade_index = type_index["UP"]
+        resources = config["resources"]
+        stats = [resources["startingHP"], resources["startingCores"], resources["startingBits"], 0]
+        self.board = GameState(config, {"turnInfo": [0, 0, -1], "p1Stats": stats, "p2Stats": stats,
+                                        "p1Units": [[] for _ in self._types], "p2Units": [[] for _ in self._types]})
+        self.board.suppress_warnings(True)
+
+    def _units(self, player_index, view):
+        """The unit lists of one player, as seen by the algo playing view
+        """
+        units = [[] for _ in self._types]
+        game_map = self.board.game_map
+        for x, y in VALID_LOCATIONS:
+            if not game_map.is_blocked(x, y):
+                continue
+            for unit in game_map[x, y]:
+                if unit.player_index != player_index:
+                    continue
+                ux, uy = (x, y) if view == 0 else _flip(x, y)
+                tag = str(x * ARENA_SIZE + y)
+                units[self._types.index(unit.unit_type)].append([ux, uy, unit.health, tag])
+                if unit.pending_removal:
+                    units[self._remove_index].append([ux, uy, 0, tag])
+                if unit.upgraded:
+                    units[self._upgrade_index].append([ux, uy, 0, tag])
+        return units
+
+    def _stats(self, player_index):
+        board = self.board
+        health = board.my_health if player_index == 0 else board.enemy_health
+        sp, mp = board.get_resources(player_index)
+        return [health, sp, mp, 0]
+
+    def message(self, view, turn_type, frame=-1, events=None):
+        """A turn, frame or end message as seen by one algo
+
+        Args:
+            view: 0 for the first algo, 1 for the second
+            turn_type: 0 for a turn, 1 for an action frame, 2 for the end of the game
+            frame: The frame number, -1 for turns
+            events: The events of an action frame, in the first algo's point of view
+
+        """
+        me, enemy = view, 1 - view
+        state = {
+            "turnInfo": [turn_type, self.board.turn_number, frame],
+            "p1Stats": self._stats(me),
+            "p2Stats": self._stats(enemy),
+            "p1Units": self._units(me, view),
+            "p2Units": self._units(enemy, view),
+        }
+        if events is not None:
+            state["events"] = events if view == 0 else self._flip_events(events)
+        return json.dumps(state)
+
+    def _flip_events(self, events):
+        flipped = dict(events)
+        flipped["breach"] = [[list(_flip(*location))] + rest[:-1] + [3 - rest[-1]] for location, *rest in events["breach"]]
+        flipped["death"] = [[list(_flip(*location))] + rest[:-2] + [3 - rest[-2], rest[-1]] for location, *rest in events["death"]]
+        return flipped
+
+    def _apply_turn(self, view, build_line, deploy_line):
+        """Checks one algo's turn against the rules and applies what is allowed to the board
+
+        Returns:
+            The accepted deploy stack, on the first algo's board
+
+        """
+        player = GameState(self.config, self.message(view, 0))
+        player.suppress_warnings(True)
+        for line, structures in ((build_line, True), (deploy_line, False)):
+            try:
+                orders = json.loads(line)
+            except (TypeError, ValueError):
+                orders = []
+            if not isinstance(orders, list):
+                continue
+            for order in orders:
+                try:
+                    unit_type, x, y = order[0], int(order[1]), int(order[2])
+                except (TypeError, ValueError, IndexError):
+                    continue
+                if unit_type not in self._types:
+                    continue
+                index = self._types.index(unit_type)
+                if index == self._upgrade_index:
+                    player.attempt_upgrade([x, y])
+                elif index == self._remove_index:
+                    player.attempt_remove([x, y])
+                elif (self.config["unitInformation"][index].get("unitCategory") == 0) == structures:
+                    player.attempt_spawn(unit_type, [x, y])
+
+        game_map = self.board.game_map
+        for unit_type, x, y in player._build_stack:
+            bx, by = (x, y) if view == 0 else _flip(x, y)
+            index = self._types.index(unit_type)
+            if index == self._upgrade_index:
+                unit = game_map[bx, by][0]
+                old_max = unit.max_health
+                unit.upgrade()
+                unit.health += unit.max_health - old_max
+                game_map._refresh_tile(bx, by)
+            elif index == self._remove_index:
+                game_map[bx, by][0].pending_removal = True
+                game_map._refresh_tile(bx, by)
+            else:
+                game_map.add_unit(unit_type, [bx, by], view)
+        sp, mp = player.get_resources(0)
+        self.board._player_resources[view] = {'SP': sp, 'MP': mp}
+        return [(unit_type,) + ((x, y) if view == 0 else _flip(x, y)) for unit_type, x, y in player._deploy_stack]
+
+    def _action_phase(self, deploys):
+        """Plays out the action phase and applies its outcome to the board
+
+        Returns:
+            The events of the last frame
+        """
+        result = Simulator(self.board).simulate(deploys[0], deploys[1])
+        board = self.board
+        board.my_health, board.enemy_health = result.health
+        for player_index in (0, 1):
+            board._player_resources[player_index]['SP'] += result.resources_gained[player_index]
+        game_map = board.game_map
+        events = {"selfDestruct": [], "breach": [], "damage": [], "shield": [], "move": [], "spawn": [], "death": [], "attack": [], "melee": []}
+        for location, health in result.structure_health.items():
+            game_map[location][0].health = health
+        for unit_type, x, y, player_index in result.destroyed_structures:
+            game_map.remove_unit([x, y])
+            events["death"].append([[x, y], self._types.index(unit_type), str(x * ARENA_SIZE + y), player_index + 1, False])
+        for player_index in (0, 1):
+            for location in result.breach_locations[player_index]:
+                events["breach"].append([location, 1, 0, "", player_index + 1])
+        return events
+
+    def _end_of_turn(self):
+        """Removes structures flagged for removal with a refund, then starts the next turn's resources
+        """
+        board = self.board
+        game_map = board.game_map
+        for x, y in VALID_LOCATIONS:
+            if game_map.is_blocked(x, y):
+                unit = game_map[x, y][0]
+                if unit.pending_removal:
+                    refund_percentage = self.config["unitInformation"][self._types.index(unit.unit_type)].get("refundPercentage", 0)
+                    board._player_resources[unit.player_index]['SP'] += round(unit.cost[0] * refund_percentage * unit.health / unit.max_health, 1)
+                    game_map.remove_unit([x, y])
+        for player_index in (0, 1):
+            player_resources = board._player_resources[player_index]
+            player_resources['MP'] = board.project_future_MP(1, player_index)
+            player_resources['SP'] += self.config["resources"]["coresPerRound"]
+        board.turn_number += 1
+
+    def play(self, algos):
+        """Plays a match to the end
+
+        Args:
+            algos: Two AlgoProcess, or anything with the same send and receive methods
+
+        Returns:
+            A MatchResult
+
+        """
+        start = time.monotonic()
+        config = json.dumps(self.config)
+        for algo in algos:
+            algo.send(config)
+        reason = None
+        while reason is None:
+            replies = []
+            for view, algo in enumerate(algos):
+                if not algo.send(self.message(view, 0)):
+                    replies.append(None)
+                    continue
+                build_line = algo.receive(self.turn_timeout)
+                deploy_line = algo.receive(self.turn_timeout) if build_line is not None else None
+                replies.append(None if deploy_line is None else (build_line, deploy_line))
+            failed = [view for view, reply in enumerate(replies) if reply is None]
+            if failed:
+                reason = "timeout"
+                winner = None if len(failed) == 2 else 1 - failed[0]
+                break
+            deploys = [self._apply_turn(view, *replies[view]) for view in (0, 1)]
+            events = self._action_phase(deploys)
+            # The simulator has no intermediate frames, so the whole action phase is sent as its last frame
+            for view, algo in enumerate(algos):
+                algo.send(self.message(view, 1, 0, events))
+            health = [self.board.my_health, self.board.enemy_health]
+            if min(health) <= 0:
+                reason = "health"
+            elif self.board.turn_number + 1 >= self.max_turns:
+                reason = "turns"
+            else:
+                self._end_of_turn()
+        health = [self.board.my_health, self.board.enemy_health]
+        if reason != "timeout":
+            winner = None if health[0] == health[1] else (0 if health[0] > health[1] else 1)
+        for view, algo in enumerate(algos):
+            algo.send(self.message(view, 2))
+        return MatchResult(winner, self.board.turn_number + 1, health, reason, time.monotonic() - start)
+
+
+def play_match(config, algo_paths, max_turns=100, turn_timeout=5.0, log_dir=None):
+    """Starts two algos and plays one match between them
+
+    Args:
+        config: The game config
+        algo_paths: The two algos, see algo_command
+        max_turns: See LocalEngine
+        turn_timeout: See LocalEngine
+        log_dir: A folder for the algos' debug output, discarded if None
+
+    Returns:
+        A MatchResult
+
+    """
+    logs = []
+    algos = []
+    try:
+        for index, path in enumerate(algo_paths):
+            log = None
+            if log_dir is not None:
+                log = open(os.path.join(log_dir, "{}_{}_{}.log".format(os.getpid(), time.monotonic_ns(), index)), "w")
+                logs.append(log)
+            algos.append(AlgoProcess(path, log))
+        return LocalEngine(config, max_turns, turn_timeout).play(algos)
+    finally:
+        for algo in algos:
+            algo.close()
+        for log in logs:
+            log.close()
+
+
+class TournamentResult:
+    """The outcome of a tournament
+
+    Attributes :
+        * algos (list): The algos that played
+        * matches (list): ((first, second), MatchResult) for every match, with first and second indices into algos
+        * seconds (float): How long the tournament took
+
+    """
+    def __init__(self, algos, matches, seconds):
+        self.algos = algos
+        self.matches = matches
+        self.seconds = seconds
+
+    def wins(self, algo_index):
+        """The number of matches an algo won
+        """
+        return sum(1 for players, match in self.matches if match.winner is not None and players[match.winner] == algo_index)
+
+    def summary(self):
+        """A table of wins, losses and draws per algo, for printing
+        """
+        lines = []
+        for index, algo in enumerate(self.algos):
+            played = [(players, match) for players, match in self.matches if index in players]
+            draws = sum(1 for _, match in played if match.winner is None)
+            wins = self.wins(index)
+            lines.append("{}: {} wins, {} losses, {} draws".format(algo, wins, len(played) - wins - draws, draws))
+        if self.matches:
+            turns = sum(match.turns for _, match in self.matches) / len(self.matches)
+            rate = len(self.matches) * 3600.0 / self.seconds if self.seconds > 0 else 0.0
+            lines.append("{} matches, {:.1f} turns on average, {:.0f} matches per hour".format(len(self.matches), turns, rate))
+        return "\n".join(lines)
+
+
+def run_tournament(config, algo_paths, games=2, workers=None, max_turns=100, turn_timeout=5.0, log_dir=None):
+    """Plays every pair of algos against each other, running matches in parallel
+
+    Args:
+        config: The game config
+        algo_paths: Two or more algos, see algo_command
+        games: The number of matches per pair. Algos swap sides every match
+        workers: The number of matches played at once, defaults to the number of cores
+        max_turns, turn_timeout, log_dir: See play_match
+
+    Returns:
+        A TournamentResult
+
+    """
+    start = time.monotonic()
+    pairings = []
+    for first, second in itertools.combinations(range(len(algo_paths)), 2):
+        for game in range(games):
+            pairings.append((first, second) if game % 2 == 0 else (second, first))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(play_match, config, [algo_paths[first], algo_paths[second]], max_turns, turn_timeout, log_dir)
+                   for first, second in pairings]
+        matches = [(players, future.result()) for players, future in zip(pairings, futures)]
+    return TournamentResult(list(algo_paths), matches, time.monotonic() - start)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Play algos against each other with a local stand-in for the game engine")
+    parser.add_argument("config", help="The game config json file")
+    parser.add_argument("algos", nargs="+", help="run.sh scripts or python files of the algos")
+    parser.add_argument("--games", type=int, default=2, help="Matches per pair of algos")
+    parser.add_argument("--workers", type=int, default=None, help="Matches played at once, defaults to the number of cores")
+    parser.add_argument("--max-turns", type=int, default=100)
+    parser.add_argument("--turn-timeout", type=float, default=5.0, help="Seconds an algo has to answer each turn")
+    parser.add_argument("--log-dir", default=None, help="Keep the algos' debug output in this folder")
+    options = parser.parse_args(args)
+
+    with open(options.config) as config_file:
+        config = json.load(config_file)
+    algos = options.algos if len(options.algos) > 1 else options.algos * 2
+    result = run_tournament(config, algos, options.games, options.workers, options.max_turns, options.turn_timeout, options.log_dir)
+    print(result.summary())
+
+
+if __name__ == "__main__":
+    main()
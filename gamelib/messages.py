@@ -0,0 +1,100 @@
+import re
+import json
+
+_decoder = json.JSONDecoder()
+_TURN_TYPE = re.compile(r'"turnInfo"\s*:\s*\[\s*(-?\d+)')
+# A list of units, each of which is a list without nested lists
+_UNIT_LIST = r'\[\s*(?:\[[^\[\]]*\]\s*,?\s*)*\]'
+# The scout, demolisher and interceptor lists of one player, which come after the three structure lists
+_MOBILE_UNITS = r'"{}"\s*:\s*\[\s*(?:%s\s*,\s*){{3}}(%s)\s*,\s*(%s)\s*,\s*(%s)' % ((_UNIT_LIST,) * 4)
+_MOBILE_UNIT_PATTERNS = [re.compile(_MOBILE_UNITS.format(key)) for key in ("p1Units", "p2Units")]
+
+
+class EngineMessage(str):
+    """A line received from the game engine, parsed at most once.
+
+    It is still a str, so handlers written for the raw json strings keep working, but the parsed
+    object is kept on the message and shared by AlgoCore, GameState and your own handlers.
+
+    Attributes :
+        * data (dict): The parsed json, loaded the first time it is read
+
+    """
+    @property
+    def data(self):
+        try:
+            return self._data
+        except AttributeError:
+            self._data = json.loads(self)
+            return self._data
+
+    def section(self, key):
+        """Gets one top level value without decoding the rest of the message, unless it was already decoded
+
+        Args:
+            key: The top level key, such as "events" or "turnInfo"
+
+        Returns:
+            The decoded value, or None if the message does not contain the key
+
+        """
+        if "_data" in self.__dict__:
+            return self._data.get(key)
+        match = re.search(r'"{}"\s*:\s*'.format(re.escape(key)), self)
+        if match is None:
+            return None
+        return _decoder.raw_decode(self, match.end())[0]
+
+
+def parse_message(message):
+    """Gets the parsed json for an engine message
+
+    Args:
+        message: An EngineMessage, an already parsed dict, or a raw json string
+
+    Returns:
+        The parsed message. Raw strings are loaded every call, EngineMessages only the first time.
+
+    """
+    if isinstance(message, EngineMessage):
+        return message.data
+    if isinstance(message, dict):
+        return message
+    return json.loads(message)
+
+
+def message_type(message):
+    """Gets the first turnInfo value of a message without decoding the rest of it
+
+    Returns:
+        0 for a turn, 1 for an action frame and 2 for the end of the game
+
+    """
+    match = _TURN_TYPE.search(message)
+    if match is None:
+        return int(parse_message(message)["turnInfo"][0])
+    return int(match.group(1))
+
+
+def mobile_units_remaining(frame):
+    """Checks if an action frame still has mobile units on the board, without decoding its unit lists
+
+    The last frame of an action phase has none, so its structures are the board the next turn starts from.
+
+    Args:
+        frame: An action frame, as an EngineMessage or a raw json string
+
+    Returns:
+        True if either player has a scout, demolisher or interceptor in the frame
+
+    """
+    for pattern in _MOBILE_UNIT_PATTERNS:
+        match = pattern.search(frame)
+        if match is None:
+            # Not in the usual format, fall back to decoding it
+            state = parse_message(frame)
+            return any(units[3:6] != [[], [], []] for units in (state.get("p1Units", []), state.get("p2Units", [])) if units)
+        for units in match.groups():
+            if units.strip("[] \t\r\n"):
+                return True
+    return False
@@ -2,7 +2,11 @@ import heapq
 import math
 import sys
 import queue
+import threading
+from array import array
+from collections import OrderedDict, deque
 from .util import debug_write
+from .geometry import ARENA_SIZE, HALF_ARENA, NUM_TILES, IN_BOUNDS, NEIGHBORS, VALID_LOCATIONS
 
 class Node:
     """A path-finding node
@@ -71,9 +75,9 @@ class ShortestPathFinder:
         #Initialize map 
         self.initialize_map(game_state)
         #Fill in walls
-        for location in self.game_state.game_map:
-            if self.game_state.contains_stationary_unit(location):
-                self.game_map[location[0]][location[1]].blocked = True
+        for x, y in VALID_LOCATIONS:
+            if self.game_state.game_map.is_blocked(x, y):
+                self.game_map[x][y].blocked = True
         #Do pathfinding
         ideal_endpoints = self._idealness_search(start_point, end_points)
         self._validate(ideal_endpoints, end_points)
@@ -93,7 +97,7 @@ class ShortestPathFinder:
         while not current.empty():
             search_location = current.get()
             for neighbor in self._get_neighbors(search_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+                if not self._in_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
                     continue
 
                 x, y = neighbor
@@ -109,6 +113,12 @@ class ShortestPathFinder:
 
         return most_ideal
 
+    def _in_bounds(self, location):
+        """Checks a location against the precomputed board table
+        """
+        x, y = location
+        return 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and IN_BOUNDS[x * ARENA_SIZE + y] == 1
+
     def _get_neighbors(self, location):
         """Get the locations adjacent to a location
         """
@@ -181,7 +191,7 @@ class ShortestPathFinder:
             current_location = current.get()
             current_node = self.game_map[current_location[0]][current_location[1]]
             for neighbor in self._get_neighbors(current_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+                if not self._in_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
                     continue
 
                 neighbor_node = self.game_map[neighbor[0]][neighbor[1]]
@@ -228,7 +238,7 @@ class ShortestPathFinder:
         best_pathlength = self.game_map[current_point[0]][current_point[1]].pathlength
         for neighbor in neighbors:
             #debug_write("Comparing champ {} and contender {}".format(ideal_neighbor, neighbor))
-            if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+            if not self._in_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
                 continue
 
             new_best = False
@@ -314,3 +324,552 @@ class ShortestPathFinder:
             sys.stderr.write(" ")
         sys.stderr.write(str(number))
         sys.stderr.write(" ")
+
+
+_BIT_CHARACTERS = bytes.maketrans(b"01", b"\x00\x01")
+
+
+def blocked_from_board(board):
+    """Expands a structure bitboard into a bytearray with one entry per tile, indexed by x * 28 + y
+    """
+    return bytearray(format(board, "0{}b".format(NUM_TILES))[::-1].encode().translate(_BIT_CHARACTERS))
+
+
+class FastShortestPathFinder:
+    """Array backed path-finding engine
+
+    Produces exactly the same paths as ShortestPathFinder, but keeps its grids in flat preallocated
+    arrays indexed by x * 28 + y, uses a precomputed neighbor table and an index queue instead of
+    Node objects, [x, y] lists and queue.Queue.
+
+    Attributes :
+        * HORIZONTAL (int): A constant representing a horizontal movement
+        * VERTICAL (int): A constant representing a vertical movement
+        * blocked (bytearray): 1 for every tile holding a structure, filled by the last search
+        * pathlength (array): The distance of every tile to the target found by the last search, -1 if unreached
+
+    """
+    def __init__(self):
+        self.HORIZONTAL = 1
+        self.VERTICAL = 2
+        self.blocked = bytearray(NUM_TILES)
+        self.pathlength = array('h', [-1]) * NUM_TILES
+        self._unreached = array('h', [-1]) * NUM_TILES
+        self._visited = bytearray(NUM_TILES)
+        self._queue = array('h', [0]) * NUM_TILES
+
+    def navigate_multiple_endpoints(self, start_point, end_points, game_state):
+        """Finds the path a unit would take to reach a set of endpoints
+
+        Args:
+            * start_point: The starting location of the unit
+            * end_points: The end points of the unit, should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            The path a unit at start_point would take when trying to reach end_points given the current game state.
+            Note that this path can change if a tower is destroyed during pathing, or if you or your enemy places structures.
+
+        """
+        if game_state.contains_stationary_unit(start_point):
+            return
+        if not game_state.game_map.in_arena_bounds(start_point):
+            return
+
+        self.load_walls(game_state)
+        return self.navigate_on_grid(start_point, end_points, self.blocked)
+
+    def navigate_on_grid(self, start_point, end_points, blocked):
+        """Finds the path a unit would take on an arbitrary board
+
+        Args:
+            * start_point: The starting location of the unit, it must be in bounds and not blocked
+            * end_points: The end points of the unit, should be a list of edge locations
+            * blocked (bytearray): 1 for every blocked tile, indexed by x * 28 + y
+
+        Returns:
+            The path a unit at start_point would take when trying to reach end_points
+
+        """
+        self.blocked = blocked
+        start = int(start_point[0]) * ARENA_SIZE + int(start_point[1])
+        end_indices = [location[0] * ARENA_SIZE + location[1] for location in end_points]
+        ideal_tile = self._idealness_search(start, end_indices, end_points)
+        self._validate(ideal_tile, end_indices)
+        return self._get_path(start_point, start, end_points)
+
+    def navigate_batch(self, start_points, end_points, game_state):
+        """Finds the paths units at several start points would take to reach the same set of endpoints
+
+        The distance field from the endpoints does not depend on where a unit starts, so it is
+        computed once and every start that can reach the edge walks it. Starts trapped in a pocket
+        get a field from their self destruct location, shared by every start in the same pocket.
+
+        Args:
+            * start_points: The starting locations of the units
+            * end_points: The end points of the units, should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            A list with the path for each start point, in the same order, as navigate_multiple_endpoints
+            would return it. Blocked or out of bounds start points get None.
+
+        """
+        self.load_walls(game_state)
+        blocked = self.blocked
+        end_indices = [location[0] * ARENA_SIZE + location[1] for location in end_points]
+        edge_field = None
+        pocket_fields = {}
+
+        paths = []
+        for start_point in start_points:
+            x, y = int(start_point[0]), int(start_point[1])
+            if not (0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE) or not IN_BOUNDS[x * ARENA_SIZE + y] \
+                    or blocked[x * ARENA_SIZE + y]:
+                paths.append(None)
+                continue
+            start = x * ARENA_SIZE + y
+            if edge_field is None:
+                edge_field = self._validate(end_indices[0], end_indices)
+            field = edge_field
+            if field[start] == -1:
+                ideal_tile = self._idealness_search(start, end_indices, end_points)
+                field = pocket_fields.get(ideal_tile)
+                if field is None:
+                    field = pocket_fields[ideal_tile] = self._validate(ideal_tile, end_indices)
+            self.pathlength = field
+            paths.append(self._get_path(start_point, start, end_points))
+        return paths
+
+    def load_walls(self, game_state):
+        """Marks every tile holding a structure as blocked
+
+        Args:
+            game_state: The GameState whose map should be loaded
+        """
+        self.blocked = blocked_from_board(game_state.game_map.get_structure_board())
+
+    def _idealness_search(self, start, end_indices, end_points):
+        """
+        Finds the most ideal tile in our 'pocket' of pathable space.
+        The edge if it is available, or the best self destruct location otherwise
+        """
+        if start in end_indices:
+            return start
+
+        x_direction, y_direction = self._get_direction_from_endpoints(end_points)
+        is_end = bytearray(NUM_TILES)
+        for index in end_indices:
+            is_end[index] = 1
+
+        blocked = self.blocked
+        visited = bytearray(NUM_TILES)
+        queue = self._queue
+        visited[start] = 1
+        queue[0] = start
+        head, tail = 0, 1
+        best_idealness = self._get_idealness(start, x_direction, y_direction)
+        most_ideal = start
+
+        while head < tail:
+            search_location = queue[head]
+            head += 1
+            for neighbor in NEIGHBORS[search_location]:
+                if blocked[neighbor] or visited[neighbor]:
+                    continue
+                # Endpoints are perfectly ideal, so the first one we reach can not be beaten
+                if is_end[neighbor]:
+                    return neighbor
+                current_idealness = self._get_idealness(neighbor, x_direction, y_direction)
+                if current_idealness > best_idealness:
+                    best_idealness = current_idealness
+                    most_ideal = neighbor
+                visited[neighbor] = 1
+                queue[tail] = neighbor
+                tail += 1
+
+        return most_ideal
+
+    def _get_direction_from_endpoints(self, end_points):
+        """Gets the direction of an edge
+
+        Returns:
+            A direction (x, y) representing the edge. For example, (1, 1) for the top right and (-1, 1) for the top left
+        """
+        x, y = end_points[0]
+        return (-1 if x < HALF_ARENA else 1), (-1 if y < HALF_ARENA else 1)
+
+    def _get_idealness(self, index, x_direction, y_direction):
+        """Get the idealness of a non endpoint tile, better self destruct locations are more ideal
+        """
+        x, y = divmod(index, ARENA_SIZE)
+        idealness = 28 * y if y_direction == 1 else 28 * (27 - y)
+        idealness += x if x_direction == 1 else 27 - x
+        return idealness
+
+    def _validate(self, ideal_tile, end_indices):
+        """Breadth first search of the grid, setting the pathlengths of each tile
+
+        Returns:
+            The new pathlength array, which is also stored in self.pathlength
+        """
+        pathlength = self._unreached[:]
+        visited = bytearray(NUM_TILES)
+        blocked = self.blocked
+        queue = self._queue
+        seeds = end_indices if ideal_tile in end_indices else (ideal_tile,)
+
+        tail = 0
+        for index in seeds:
+            if visited[index]:
+                continue
+            pathlength[index] = 0
+            visited[index] = 1
+            queue[tail] = index
+            tail += 1
+
+        head = 0
+        while head < tail:
+            current = queue[head]
+            head += 1
+            if blocked[current]:
+                continue
+            distance = pathlength[current] + 1
+            for neighbor in NEIGHBORS[current]:
+                if blocked[neighbor] or visited[neighbor]:
+                    continue
+                pathlength[neighbor] = distance
+                visited[neighbor] = 1
+                queue[tail] = neighbor
+                tail += 1
+
+        self.pathlength = pathlength
+        return pathlength
+
+    def _get_path(self, start_point, start, end_points):
+        """Once all tiles are validated, and a target is found, the unit can path to its target
+        """
+        x_direction, y_direction = self._get_direction_from_endpoints(end_points)
+        pathlength = self.pathlength
+        path = [start_point]
+        current = start
+        move_direction = 0
+
+        while pathlength[current] != 0:
+            next_move = self._choose_next_move(current, move_direction, x_direction, y_direction)
+            if current // ARENA_SIZE == next_move // ARENA_SIZE:
+                move_direction = self.VERTICAL
+            else:
+                move_direction = self.HORIZONTAL
+            path.append(list(divmod(next_move, ARENA_SIZE)))
+            current = next_move
+
+        return path
+
+    def _choose_next_move(self, current_point, previous_move_direction, x_direction, y_direction):
+        """Given the current location and adjacent locations, return the best 'next step' for a given unit to take
+        """
+        blocked = self.blocked
+        pathlength = self.pathlength
+        ideal_neighbor = current_point
+        best_pathlength = pathlength[current_point]
+        for neighbor in NEIGHBORS[current_point]:
+            if blocked[neighbor]:
+                continue
+            current_pathlength = pathlength[neighbor]
+            if current_pathlength > best_pathlength:
+                continue
+            if current_pathlength == best_pathlength and not self._better_direction(
+                    current_point, neighbor, ideal_neighbor, previous_move_direction, x_direction, y_direction):
+                continue
+            ideal_neighbor = neighbor
+            best_pathlength = current_pathlength
+        return ideal_neighbor
+
+    def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, x_direction, y_direction):
+        """Compare two tiles and return True if the unit would rather move to the new one
+        """
+        prev_x, prev_y = divmod(prev_tile, ARENA_SIZE)
+        new_x, new_y = divmod(new_tile, ARENA_SIZE)
+        best_x, best_y = divmod(prev_best, ARENA_SIZE)
+        if previous_move_direction == self.HORIZONTAL and new_x != best_x:
+            return prev_y != new_y
+        if previous_move_direction == self.VERTICAL and new_y != best_y:
+            return prev_x != new_x
+        if previous_move_direction == 0:
+            return prev_y != new_y
+
+        #To make it here, both moves are on the same axis
+        if new_y == best_y:
+            return (x_direction == 1 and new_x > best_x) or (x_direction == -1 and new_x < best_x)
+        if new_x == best_x:
+            return (y_direction == 1 and new_y > best_y) or (y_direction == -1 and new_y < best_y)
+        return True
+
+
+class DynamicPathField:
+    """A distance field to an edge that is kept alive and repaired as single tiles change
+
+    Built once from a game state, then block and unblock update only the region of the field whose
+    distance to the edge actually changes, so trying a structure placement costs time proportional
+    to its effect on the field instead of a full search. The game map itself is never modified.
+
+    Attributes :
+        * start_point: The location whose path is tracked
+        * end_points: The edge locations units are pathing to
+        * blocked (bytearray): 1 for every blocked tile, indexed by x * 28 + y
+        * field (array): The distance of every reachable tile to the edge, -1 if unreachable
+        * nodes_updated (int): The number of tiles the last block or unblock had to revisit
+
+    """
+    def __init__(self, game_state, start_point, end_points):
+        self._finder = FastShortestPathFinder()
+        self._finder.load_walls(game_state)
+        self.blocked = self._finder.blocked
+        self.start_point = start_point
+        self.end_points = end_points
+        self._end_indices = [location[0] * ARENA_SIZE + location[1] for location in end_points]
+        self._is_end = bytearray(NUM_TILES)
+        for index in self._end_indices:
+            self._is_end[index] = 1
+        self.field = self._finder._validate(self._end_indices[0], self._end_indices)
+        self.nodes_updated = 0
+
+    @property
+    def path(self):
+        """The path a unit at start_point would take on the current field
+        """
+        return self.path_from(self.start_point)
+
+    def path_from(self, start_point):
+        """Gets the path a unit at a location would take on the current field
+
+        Args:
+            start_point: The location of a hypothetical unit
+
+        Returns:
+            The same path navigate_multiple_endpoints would return, or None if start_point is blocked.
+            A start that can not reach the edge is searched from scratch, since its self destruct
+            target depends on the shape of its whole pocket.
+
+        """
+        x, y = int(start_point[0]), int(start_point[1])
+        if not (0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE) or not IN_BOUNDS[x * ARENA_SIZE + y]:
+            return
+        start = x * ARENA_SIZE + y
+        if self.blocked[start]:
+            return
+        finder = self._finder
+        finder.blocked = self.blocked
+        if self.field[start] == -1:
+            ideal_tile = finder._idealness_search(start, self._end_indices, self.end_points)
+            finder._validate(ideal_tile, self._end_indices)
+        else:
+            finder.pathlength = self.field
+        return finder._get_path(start_point, start, self.end_points)
+
+    def block(self, location):
+        """Marks a location as blocked and repairs the distances that depended on it
+
+        Args:
+            location: The location a structure is placed at
+        """
+        index = location[0] * ARENA_SIZE + location[1]
+        if self.blocked[index]:
+            self.nodes_updated = 0
+            return
+        self.blocked[index] = 1
+        if self.field[index] == -1:
+            self.nodes_updated = 0
+            return
+
+        field = self.field
+        blocked = self.blocked
+        is_end = self._is_end
+        # Collect, in order of distance, every tile that lost all of its neighbors one step closer to the edge
+        affected = {index}
+        candidates = deque(neighbor for neighbor in NEIGHBORS[index] if field[neighbor] == field[index] + 1)
+        while candidates:
+            current = candidates.popleft()
+            if current in affected or blocked[current] or is_end[current]:
+                continue
+            closer = field[current] - 1
+            supported = False
+            for neighbor in NEIGHBORS[current]:
+                if field[neighbor] == closer and not blocked[neighbor] and neighbor not in affected:
+                    supported = True
+                    break
+            if supported:
+                continue
+            affected.add(current)
+            for neighbor in NEIGHBORS[current]:
+                if field[neighbor] == closer + 2:
+                    candidates.append(neighbor)
+
+        affected.discard(index)
+        field[index] = 0 if is_end[index] else -1
+        for current in affected:
+            field[current] = -1
+        # Rebuild the affected region from its unaffected border
+        frontier = []
+        for current in affected:
+            best = -1
+            for neighbor in NEIGHBORS[current]:
+                distance = field[neighbor]
+                if distance != -1 and not blocked[neighbor] and neighbor not in affected and (best == -1 or distance + 1 < best):
+                    best = distance + 1
+            if best != -1:
+                heapq.heappush(frontier, (best, current))
+        while frontier:
+            distance, current = heapq.heappop(frontier)
+            if field[current] != -1:
+                continue
+            field[current] = distance
+            for neighbor in NEIGHBORS[current]:
+                if neighbor in affected and field[neighbor] == -1:
+                    heapq.heappush(frontier, (distance + 1, neighbor))
+        self.nodes_updated = len(affected) + 1
+
+    def unblock(self, location):
+        """Marks a location as open and lowers the distances that can now path through it
+
+        Args:
+            location: The location a structure is removed from
+        """
+        index = location[0] * ARENA_SIZE + location[1]
+        if not self.blocked[index]:
+            self.nodes_updated = 0
+            return
+        self.blocked[index] = 0
+
+        field = self.field
+        blocked = self.blocked
+        if self._is_end[index]:
+            field[index] = 0
+        else:
+            best = -1
+            for neighbor in NEIGHBORS[index]:
+                distance = field[neighbor]
+                if distance != -1 and not blocked[neighbor] and (best == -1 or distance + 1 < best):
+                    best = distance + 1
+            field[index] = best
+            if best == -1:
+                self.nodes_updated = 1
+                return
+
+        updated = 1
+        queue = deque([index])
+        while queue:
+            current = queue.popleft()
+            distance = field[current] + 1
+            for neighbor in NEIGHBORS[current]:
+                if blocked[neighbor]:
+                    continue
+                if field[neighbor] == -1 or field[neighbor] > distance:
+                    field[neighbor] = distance
+                    queue.append(neighbor)
+                    updated += 1
+        self.nodes_updated = updated
+
+    def what_if_block(self, location):
+        """Gets the path start_point would take if a structure was placed at location.
+        The field is left unchanged.
+
+        Args:
+            location: The location of a hypothetical structure
+
+        Returns:
+            The new path, or None if location is start_point itself
+
+        """
+        if self.blocked[location[0] * ARENA_SIZE + location[1]]:
+            return self.path
+        self.block(location)
+        path = self.path
+        self.unblock(location)
+        return path
+
+    def what_if_unblock(self, location):
+        """Gets the path start_point would take if the structure at location was removed.
+        The field is left unchanged.
+
+        Args:
+            location: The location of a structure
+
+        Returns:
+            The new path
+
+        """
+        if not self.blocked[location[0] * ARENA_SIZE + location[1]]:
+            return self.path
+        self.unblock(location)
+        path = self.path
+        self.block(location)
+        return path
+
+
+class PathCache:
+    """A bounded least-recently-used cache of computed paths
+
+    Keys should identify everything a path depends on, GameState.find_path_to_edge uses
+    (structure fingerprint, start x, start y, target edge). Because the structure fingerprint
+    is part of the key, placing or removing a structure makes later lookups miss instead of
+    returning a stale path, and old boards simply age out. It can be used from several threads,
+    such as on_speculate's and the main one.
+
+    Attributes :
+        * maxsize (int): The number of paths kept before the least recently used one is evicted
+        * hits (int): The number of lookups that found a path
+        * misses (int): The number of lookups that did not
+
+    """
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._paths = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._paths)
+
+    def get(self, key):
+        """Gets a cached path
+
+        Args:
+            key: The key the path was stored under
+
+        Returns:
+            A fresh copy of the path as a list of [x, y] locations, or None if it is not cached
+
+        """
+        with self._lock:
+            path = self._paths.get(key)
+            if path is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._paths.move_to_end(key)
+        return [list(location) for location in path]
+
+    def put(self, key, path):
+        """Stores a path, evicting the least recently used one if the cache is full
+
+        Args:
+            key: The key to store the path under
+            path: A list of locations
+        """
+        path = tuple((int(location[0]), int(location[1])) for location in path)
+        with self._lock:
+            self._paths[key] = path
+            self._paths.move_to_end(key)
+            while len(self._paths) > self.maxsize:
+                self._paths.popitem(last=False)
+
+    def clear(self):
+        """Empties the cache and resets the hit and miss counters
+        """
+        with self._lock:
+            self._paths.clear()
+            self.hits = 0
+            self.misses = 0
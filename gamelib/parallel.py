@@ -0,0 +1,189 @@
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from .game_state import GameState
+from .game_map import UnitColumns
+from .simulator import Simulator
+from .util import debug_write
+
+_worker_config = None
+
+
+def _init_worker(config):
+    """Runs once in every worker process, so the config is only sent when the pool starts
+    """
+    global _worker_config
+    _worker_config = config
+
+
+def _ping(_):
+    return True
+
+
+def serialize_board(game_state):
+    """Packs the parts of a GameState needed to simulate an attack into a small picklable tuple
+
+    Only structures are kept, including ones placed this turn with attempt_spawn.
+
+    Args:
+        game_state: The GameState to pack
+
+    Returns:
+        (turn_number, my_stats, enemy_stats, structures) where the stats are (health, SP, MP) and each
+        structure is (unit_type, x, y, player_index, health, upgraded)
+
+    """
+    structures = []
+    config = game_state.config
+    columns = game_state.game_map.unit_columns()
+    for type_id, owner, x, y, health, flags in zip(columns.type_ids, columns.owners, columns.xs, columns.ys, columns.health, columns.flags):
+        unit_type = config.shorthands[type_id]
+        if config.stats[unit_type, False].stationary:
+            structures.append((unit_type, x, y, owner, health, bool(flags & UnitColumns.UPGRADED)))
+    return (game_state.turn_number,
+            (game_state.my_health,) + tuple(game_state.get_resources(0)),
+            (game_state.enemy_health,) + tuple(game_state.get_resources(1)),
+            tuple(structures))
+
+
+def deserialize_board(board, config):
+    """Rebuilds a GameState from a tuple made by serialize_board
+    """
+    turn_number, my_stats, enemy_stats, structures = board
+    type_index = {unit_info.get("shorthand"): i for i, unit_info in enumerate(config["unitInformation"])}
+    upgrade_index = len(config["unitInformation"]) - 1
+    units = [[[] for _ in config["unitInformation"]], [[] for _ in config["unitInformation"]]]
+    for unit_type, x, y, player_index, health, upgraded in structures:
+        units[player_index][type_index[unit_type]].append([x, y, health, ""])
+        if upgraded:
+            units[player_index][upgrade_index].append([x, y, 0, ""])
+    health, sp, mp = my_stats
+    enemy_health, enemy_sp, enemy_mp = enemy_stats
+    state = {
+        "turnInfo": [0, turn_number, -1],
+        "p1Stats": [health, sp, mp, 0],
+        "p2Stats": [enemy_health, enemy_sp, enemy_mp, 0],
+        "p1Units": units[0],
+        "p2Units": units[1],
+    }
+    game_state = GameState(config, state)
+    game_state.suppress_warnings(True)
+    return game_state
+
+
+def _evaluate(board, plan):
+    """Simulates one plan in a worker process
+
+    Returns:
+        (score, plan, breaches, structure_damage)
+    """
+    game_state = deserialize_board(board, _worker_config)
+    unit_type, location, count = plan
+    x, y = location
+    result = Simulator(game_state).simulate([(unit_type, x, y)] * count)
+    return result.score(0), plan, result.breaches[0], result.structure_damage[0]
+
+
+class PlanEvaluator:
+    """Scores candidate attacks on a pool of worker processes
+
+    The pool is started once, usually from AlgoCore.on_game_start, and reused every turn. Each plan
+    is a (unit_type, location, count) tuple, simulated with gamelib.simulator on a compact copy of
+    the board. Results that are not ready by the deadline are dropped. A simulation that is already
+    running cannot be cancelled, so if any are still running at the deadline their workers are stopped
+    and a new pool is started, which keeps them from delaying the next call.
+
+    Attributes :
+        * workers (int): The number of worker processes
+        * time_limit (float): The default number of seconds evaluate waits for results
+
+    """
+    def __init__(self, config, workers=None, time_limit=1.0):
+        """Starts the worker processes
+
+        Args:
+            config: The game config, sent to every worker once
+            workers: The number of worker processes, defaults to the number of cores
+            time_limit: The default number of seconds evaluate waits for results
+        """
+        self.time_limit = time_limit
+        self._config = config
+        self._pool = None
+        self.workers = workers
+        self._start_pool()
+
+    def _start_pool(self):
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self._config,))
+        self.workers = self._pool._max_workers
+        # Start every worker now rather than during the first turn
+        list(self._pool.map(_ping, range(self.workers)))
+
+    def _stop_pool(self, terminate=False):
+        pool = self._pool
+        processes = list((getattr(pool, "_processes", None) or {}).values()) if terminate else []
+        try:
+            pool.shutdown(wait=False, cancel_futures=True)
+        except TypeError:
+            # cancel_futures needs Python 3.9, evaluate has already cancelled what it could
+            pool.shutdown(wait=False)
+        for process in processes:
+            process.terminate()
+
+    @staticmethod
+    def candidate_plans(unit_types, locations, counts):
+        """Every combination of unit type, spawn location and count
+
+        Returns:
+            A list of (unit_type, location, count) plans
+
+        """
+        return [(unit_type, tuple(location), count) for unit_type, location, count in itertools.product(unit_types, locations, counts)]
+
+    def evaluate(self, game_state, plans, time_limit=None):
+        """Scores plans in parallel
+
+        Args:
+            game_state: The GameState the attacks start from
+            plans: A list of (unit_type, location, count) tuples
+            time_limit: Seconds to wait for results, defaults to self.time_limit
+
+        Returns:
+            A list of (score, plan, breaches, structure_damage) for every plan finished before the deadline,
+            best score first. Empty if nothing finished in time.
+
+        """
+        if time_limit is None:
+            time_limit = self.time_limit
+        deadline = time.monotonic() + time_limit
+        board = serialize_board(game_state)
+        pending = set(self._pool.submit(_evaluate, board, plan) for plan in plans)
+        results = []
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    results.append(future.result())
+                except Exception as error:
+                    debug_write("Plan evaluation failed: {}".format(error))
+        running = [future for future in pending if not future.cancel()]
+        if running:
+            debug_write("{} plan evaluations still running at the deadline, restarting the workers".format(len(running)))
+            self._stop_pool(terminate=True)
+            self._start_pool()
+        results.sort(key=lambda result: result[0], reverse=True)
+        return results
+
+    def best(self, game_state, plans, time_limit=None):
+        """The best plan found before the deadline, or None if none finished
+        """
+        results = self.evaluate(game_state, plans, time_limit)
+        return results[0][1] if results else None
+
+    def shutdown(self):
+        """Stops the worker processes
+        """
+        self._stop_pool()
@@ -0,0 +1,178 @@
+"""
+Records the messages an algo exchanges with the game engine and plays them back offline.
+
+Set record_path on your AlgoStrategy to record a match, then replay it with
+
+    python -m gamelib.replay match.log
+
+from the folder containing algo_strategy.py. Each turn is timed and its replies are compared with
+the recorded ones, which makes a recording a repeatable workload for profiling and for checking that
+a performance change did not change what the algo does.
+"""
+import io
+import sys
+import time
+import random
+import argparse
+import importlib
+
+from .messages import EngineMessage, message_type
+from .util import debug_write, add_command_listener, remove_command_listener, set_command_output
+
+INPUT = "i"
+OUTPUT = "o"
+
+
+class MessageRecorder:
+    """Appends messages and replies to a log file, one per line.
+
+    Each line is the direction (i for engine messages, o for replies), the seconds since recording
+    started and the message itself, separated by spaces.
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "a")
+        self._start = time.monotonic()
+
+    def _write(self, direction, line):
+        self._file.write("{} {:.6f} {}\n".format(direction, time.monotonic() - self._start, line.strip()))
+
+    def record_input(self, line):
+        """Records a message from the engine
+        """
+        self._write(INPUT, line)
+
+    def record_output(self, line):
+        """Records a reply to the engine. Replies end a turn, so the log is flushed
+        """
+        self._write(OUTPUT, line)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_log(path):
+    """Reads a log written by MessageRecorder
+
+    Returns:
+        A list of (direction, seconds, line) tuples in the order they were recorded
+
+    """
+    records = []
+    with open(path) as log:
+        for entry in log:
+            entry = entry.rstrip("\n")
+            if not entry:
+                continue
+            direction, seconds, line = entry.split(" ", 2)
+            records.append((direction, float(seconds), line))
+    return records
+
+
+class ReplayReport:
+    """The result of replaying a log
+
+    Attributes :
+        * turns (list): (turn_number, seconds, diverged) for every turn, where seconds is the time on_turn took
+          and diverged is True if the replies differed from the recorded ones
+        * frames (int): The number of action frames replayed
+        * frame_seconds (float): The total time spent handling action frames
+        * speculation_seconds (float): The total time spent waiting for on_speculate to finish before turns,
+          which is not counted in the turns' seconds
+
+    """
+    def __init__(self):
+        self.turns = []
+        self.frames = 0
+        self.frame_seconds = 0.0
+        self.speculation_seconds = 0.0
+
+    @property
+    def diverged_turns(self):
+        """The turn numbers whose replies differ from the recording
+        """
+        return [turn for turn, _, diverged in self.turns if diverged]
+
+    def summary(self):
+        """A short description of the replay, for printing
+        """
+        if not self.turns:
+            return "No turns replayed"
+        seconds = [turn_seconds for _, turn_seconds, _ in self.turns]
+        return "Replayed {} turns, mean {:.1f}ms, max {:.1f}ms, {} frames in {:.1f}ms, {:.1f}ms waiting for speculation, {} diverged {}".format(
+            len(seconds), 1000 * sum(seconds) / len(seconds), 1000 * max(seconds),
+            self.frames, 1000 * self.frame_seconds, 1000 * self.speculation_seconds, len(self.diverged_turns), self.diverged_turns)
+
+
+def replay(algo, records):
+    """Feeds recorded engine messages through an algo in this process, as fast as it handles them
+
+    Replies are compared with the ones recorded after the same message instead of being written
+    to standard output.
+
+    Args:
+        algo: An AlgoCore, usually a fresh AlgoStrategy
+        records: Records from read_log
+
+    Returns:
+        A ReplayReport
+
+    """
+    report = ReplayReport()
+    replies = []
+    add_command_listener(replies.append)
+    set_command_output(io.StringIO())
+    try:
+        for index, (direction, _, line) in enumerate(records):
+            if direction != INPUT:
+                continue
+            message = EngineMessage(line)
+            kind = message_type(message) if "turnInfo" in message else None
+            del replies[:]
+            if kind == 0 and getattr(algo, "_speculation", None) is not None:
+                # Waiting for on_speculate is reported on its own rather than as part of the turn
+                start = time.perf_counter()
+                algo._finish_speculation()
+                report.speculation_seconds += time.perf_counter() - start
+            start = time.perf_counter()
+            running = algo.handle_message(message)
+            elapsed = time.perf_counter() - start
+            if kind == 0:
+                expected = []
+                next_index = index + 1
+                while next_index < len(records) and records[next_index][0] == OUTPUT:
+                    expected.append(records[next_index][2])
+                    next_index += 1
+                diverged = [reply.strip() for reply in replies] != expected
+                report.turns.append((int(message.data["turnInfo"][1]), elapsed, diverged))
+            elif kind == 1:
+                report.frames += 1
+                report.frame_seconds += elapsed
+            if not running:
+                break
+    finally:
+        remove_command_listener(replies.append)
+        set_command_output(None)
+    return report
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded match through an algo")
+    parser.add_argument("log", help="A log written with AlgoCore.record_path")
+    parser.add_argument("--strategy", default="algo_strategy", help="The module containing the AlgoStrategy class")
+    parser.add_argument("--seed", type=int, default=None, help="Seed the random module with this after creating the algo")
+    options = parser.parse_args(args)
+
+    sys.path.insert(0, ".")
+    algo = importlib.import_module(options.strategy).AlgoStrategy()
+    if options.seed is not None:
+        random.seed(options.seed)
+    report = replay(algo, read_log(options.log))
+    debug_write(report.summary())
+    return 1 if report.diverged_turns else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,384 @@
+import math
+from array import array
+
+from .navigation import FastShortestPathFinder
+from .geometry import ARENA_SIZE, NUM_TILES, IN_BOUNDS, EDGES, ON_EDGE, VALID_LOCATIONS
+from .unit import GameUnit
+
+
+class SimulationResult:
+    """The outcome of a simulated action phase
+
+    Attributes :
+        * frames (int): The number of frames simulated
+        * breaches ([int, int]): The number of units each player scored with
+        * breach_locations ([list, list]): The locations each player scored from
+        * health ([float, float]): Each player's health at the end of the action phase
+        * resources_gained ([float, float]): The SP each player earned by scoring
+        * structure_damage ([float, float]): The damage each player dealt to enemy structures
+        * destroyed_structures (list): (unit_type, x, y, player_index) for every structure destroyed
+        * structure_health (dict): The remaining health of every surviving structure that was damaged, by (x, y)
+        * units_lost ([int, int]): The number of mobile units each player lost without scoring
+        * self_destructs ([int, int]): The number of each player's units that self destructed
+
+    """
+    def __init__(self, health):
+        self.frames = 0
+        self.breaches = [0, 0]
+        self.breach_locations = [[], []]
+        self.health = list(health)
+        self.resources_gained = [0.0, 0.0]
+        self.structure_damage = [0.0, 0.0]
+        self.destroyed_structures = []
+        self.structure_health = {}
+        self.units_lost = [0, 0]
+        self.self_destructs = [0, 0]
+
+    def score(self, player_index=0):
+        """A simple figure of merit for an attack by player_index, higher is better.
+        Each breach is worth one point, and every 100 damage dealt to enemy structures is worth another.
+        """
+        enemy_index = 1 - player_index
+        return (self.breaches[player_index] - self.breaches[enemy_index]
+                + (self.structure_damage[player_index] - self.structure_damage[enemy_index]) / 100.0)
+
+    def __repr__(self):
+        return "SimulationResult(frames={}, breaches={}, health={}, structure_damage={}, destroyed={})".format(
+            self.frames, self.breaches, self.health, self.structure_damage, len(self.destroyed_structures))
+
+
+class _MobileKind:
+    """Stats shared by every mobile unit of one type
+    """
+    def __init__(self, unit_type, config, type_config):
+        unit = GameUnit(unit_type, config)
+        self.unit_type = unit_type
+        self.speed = unit.speed
+        self.damage_f = unit.damage_f
+        self.damage_i = unit.damage_i
+        self.attack_range = unit.attackRange
+        self.max_health = unit.max_health
+        self.breach_damage = type_config.get("playerBreachDamage", 1)
+        self.self_destruct_f = type_config.get("selfDestructDamageTower", 0)
+        self.self_destruct_i = type_config.get("selfDestructDamageWalker", 0)
+        self.self_destruct_range = type_config.get("selfDestructRange", 0)
+        self.self_destruct_steps = type_config.get("selfDestructStepsRequired", 0)
+
+
+class Simulator:
+    """Steps a planned action phase frame by frame on a copy of a GameState's board
+
+    Each frame follows the order of the real engine: supports shield new mobile units in range,
+    mobile units move once every 1/speed frames, every unit attacks the target GameState.get_target
+    would choose, then dead units are removed. Units that reach their target edge score, units that
+    are stuck self destruct, and when a structure dies every mobile unit re-paths.
+
+    Units are kept in flat arrays rather than GameUnit objects, so the GameState itself is never
+    modified and one simulator can run many plans. Known simplifications: units re-path from their
+    current tile without remembering their last move direction, units attack in a fixed order
+    (mobile units in deploy order, then structures), and removals queued this turn are ignored.
+
+    Attributes :
+        * game_state (:obj: GameState): The state the simulations start from
+        * max_frames (int): Simulations stop after this many frames even if units are still alive
+
+    """
+    def __init__(self, game_state, max_frames=400):
+        self.game_state = game_state
+        self.max_frames = max_frames
+        config = game_state.config
+        self._hit_radius = config.hit_radius
+        self._resources_per_breach = config.cores_for_player_damage
+        self._pathfinder = FastShortestPathFinder()
+        self._kinds = {}
+        self._type_index = config.type_index
+
+        # Snapshot of the structures on the board
+        self._structures = []
+        game_map = game_state.game_map
+        for x, y in VALID_LOCATIONS:
+            if game_map.is_blocked(x, y):
+                for unit in game_map[x, y]:
+                    if unit.stationary:
+                        self._structures.append(unit)
+
+    def _kind(self, unit_type):
+        kind = self._kinds.get(unit_type)
+        if kind is None:
+            config = self.game_state.config
+            kind = self._kinds[unit_type] = _MobileKind(unit_type, config, config["unitInformation"][self._type_index[unit_type]])
+        return kind
+
+    def simulate(self, deploy_stack=None, enemy_deploy_stack=None, max_frames=None):
+        """Simulates an action phase
+
+        Args:
+            deploy_stack: A list of (unit_type, x, y) mobile units spawned by you. Defaults to the GameState's deploy stack
+            enemy_deploy_stack: A list of (unit_type, x, y) mobile units spawned by your opponent, in their own coordinates as seen on your board
+            max_frames: Overrides the simulator's max_frames
+
+        Returns:
+            A SimulationResult
+
+        """
+        game_state = self.game_state
+        if deploy_stack is None:
+            deploy_stack = game_state._deploy_stack
+        if enemy_deploy_stack is None:
+            enemy_deploy_stack = []
+        if max_frames is None:
+            max_frames = self.max_frames
+        result = SimulationResult([game_state.my_health, game_state.enemy_health])
+        hit_radius = self._hit_radius
+
+        # Structure columns, indexed by tile
+        s_owner = array('b', [-1]) * NUM_TILES
+        s_hp = array('d', [0.0]) * NUM_TILES
+        s_unit = [None] * NUM_TILES
+        blocked = bytearray(NUM_TILES)
+        supports = []
+        turrets = []
+        for unit in self._structures:
+            index = unit.x * ARENA_SIZE + unit.y
+            s_owner[index] = unit.player_index
+            s_hp[index] = unit.health
+            s_unit[index] = unit
+            blocked[index] = 1
+            if unit.shieldPerUnit > 0 and unit.shieldRange > 0:
+                supports.append(index)
+            if unit.damage_i > 0 or unit.damage_f > 0:
+                turrets.append(index)
+
+        # Mobile unit columns
+        m_tile = array('h')
+        m_hp = array('d')
+        m_owner = array('b')
+        m_progress = array('d')
+        m_steps = array('h')
+        m_kind = []
+        m_edge = []
+        m_path = []
+        m_shields = []
+        alive = []
+
+        for player_index, stack in ((0, deploy_stack), (1, enemy_deploy_stack)):
+            for unit_type, x, y in stack:
+                kind = self._kind(unit_type)
+                index = x * ARENA_SIZE + y
+                if not IN_BOUNDS[index] or blocked[index]:
+                    continue
+                m_tile.append(index)
+                m_hp.append(kind.max_health)
+                m_owner.append(player_index)
+                m_progress.append(0.0)
+                m_steps.append(0)
+                m_kind.append(kind)
+                m_edge.append(game_state.get_target_edge([x, y]))
+                m_path.append(None)
+                m_shields.append(set())
+                alive.append(len(alive))
+
+        paths = {}
+        reroute = True
+        frame = 0
+        while alive and frame < max_frames:
+            frame += 1
+            if reroute:
+                paths.clear()
+                for i in alive:
+                    m_path[i] = self._path(paths, m_tile[i], m_edge[i], blocked)
+                reroute = False
+
+            # Shielding
+            for support in supports:
+                owner = s_owner[support]
+                if owner == -1:
+                    continue
+                unit = s_unit[support]
+                sx, sy = divmod(support, ARENA_SIZE)
+                amount = unit.shieldPerUnit + unit.shieldBonusPerY * (sy if owner == 0 else ARENA_SIZE - 1 - sy)
+                limit = (unit.shieldRange + hit_radius) ** 2
+                for i in alive:
+                    if m_owner[i] != owner or support in m_shields[i]:
+                        continue
+                    mx, my = divmod(m_tile[i], ARENA_SIZE)
+                    if (mx - sx) ** 2 + (my - sy) ** 2 < limit:
+                        m_hp[i] += amount
+                        m_shields[i].add(support)
+
+            # Movement
+            finished = []
+            for i in alive:
+                kind = m_kind[i]
+                m_progress[i] += kind.speed
+                if m_progress[i] < 1 - 1e-9:
+                    continue
+                m_progress[i] -= 1
+                path = m_path[i]
+                if len(path) > 1:
+                    path.pop(0)
+                    m_tile[i] = path[0]
+                    m_steps[i] += 1
+                    if ON_EDGE[m_edge[i]][m_tile[i]]:
+                        finished.append((i, True))
+                else:
+                    finished.append((i, False))
+
+            for i, breached in finished:
+                owner = m_owner[i]
+                kind = m_kind[i]
+                if breached:
+                    result.breaches[owner] += 1
+                    result.breach_locations[owner].append(list(divmod(m_tile[i], ARENA_SIZE)))
+                    result.health[1 - owner] -= kind.breach_damage
+                    result.resources_gained[owner] += self._resources_per_breach
+                else:
+                    result.self_destructs[owner] += 1
+                    result.units_lost[owner] += 1
+                    if m_steps[i] >= kind.self_destruct_steps:
+                        self._self_destruct(i, kind, m_tile, m_hp, m_owner, alive, s_owner, s_hp, result)
+                m_hp[i] = 0
+            if finished:
+                gone = set(i for i, _ in finished)
+                alive = [i for i in alive if i not in gone]
+
+            # Attacks
+            occupied = {}
+            for i in alive:
+                occupied.setdefault(m_tile[i], []).append(i)
+            groups = {}
+            for i in alive:
+                if m_hp[i] <= 0:
+                    continue
+                kind = m_kind[i]
+                key = (m_tile[i], m_owner[i], kind.unit_type)
+                candidates = groups.get(key)
+                if candidates is None:
+                    candidates = groups[key] = self._candidates(
+                        m_tile[i], m_owner[i], kind.attack_range, kind.damage_f > 0, kind.damage_i > 0, occupied, m_owner, s_owner)
+                self._attack(candidates, kind.damage_f, kind.damage_i, m_owner[i], m_hp, s_hp, result)
+            for turret in turrets:
+                owner = s_owner[turret]
+                if owner == -1 or s_hp[turret] <= 0:
+                    continue
+                unit = s_unit[turret]
+                candidates = self._candidates(turret, owner, unit.attackRange, unit.damage_f > 0, unit.damage_i > 0, occupied, m_owner, s_owner)
+                self._attack(candidates, unit.damage_f, unit.damage_i, owner, m_hp, s_hp, result)
+
+            # Remove the dead
+            reroute |= self._remove_dead_structures(s_owner, s_hp, s_unit, blocked, result)
+            survivors = []
+            for i in alive:
+                if m_hp[i] > 0:
+                    survivors.append(i)
+                else:
+                    result.units_lost[m_owner[i]] += 1
+            alive = survivors
+
+        result.frames = frame
+        for unit in self._structures:
+            index = unit.x * ARENA_SIZE + unit.y
+            if s_owner[index] != -1 and s_hp[index] != unit.health:
+                result.structure_health[unit.x, unit.y] = s_hp[index]
+        return result
+
+    def _path(self, paths, tile, edge, blocked):
+        """The remaining path of a unit as a list of tile indices, shared by units on the same tile
+        """
+        key = (tile, edge)
+        path = paths.get(key)
+        if path is None:
+            locations = self._pathfinder.navigate_on_grid(divmod(tile, ARENA_SIZE), EDGES[edge], blocked)
+            path = paths[key] = [x * ARENA_SIZE + y for x, y in locations]
+        return list(path)
+
+    def _candidates(self, tile, owner, attack_range, hits_structures, hits_mobile, occupied, m_owner, s_owner):
+        """Everything a unit could attack from tile, ordered the way get_target visits it.
+        Each entry is (stationary, distance, tile, mobile unit id or -1)
+        """
+        candidates = []
+        x, y = divmod(tile, ARENA_SIZE)
+        for dx, dy in self.game_state.game_map._range_stencil(attack_range):
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < ARENA_SIZE and 0 <= ny < ARENA_SIZE):
+                continue
+            index = nx * ARENA_SIZE + ny
+            if not IN_BOUNDS[index]:
+                continue
+            distance = None
+            if hits_structures and s_owner[index] != -1 and s_owner[index] != owner:
+                distance = math.sqrt(dx * dx + dy * dy)
+                candidates.append((True, distance, index, -1))
+            if hits_mobile and index in occupied:
+                for i in occupied[index]:
+                    if m_owner[i] != owner:
+                        if distance is None:
+                            distance = math.sqrt(dx * dx + dy * dy)
+                        candidates.append((False, distance, index, i))
+        return candidates
+
+    def _attack(self, candidates, damage_f, damage_i, owner, m_hp, s_hp, result):
+        """Picks a target with the priorities of GameState.get_target and damages it
+        """
+        best = None
+        best_key = None
+        for stationary, distance, index, i in candidates:
+            health = s_hp[index] if i == -1 else m_hp[i]
+            if health <= 0:
+                continue
+            x, y = divmod(index, ARENA_SIZE)
+            key = (stationary, distance, health, y if owner == 0 else -y, -abs(13.5 - x))
+            if best_key is None or key < best_key:
+                best_key = key
+                best = (index, i)
+        if best is None:
+            return
+        index, i = best
+        if i == -1:
+            dealt = min(damage_f, s_hp[index])
+            s_hp[index] -= damage_f
+            result.structure_damage[owner] += dealt
+        else:
+            m_hp[i] -= damage_i
+
+    def _self_destruct(self, i, kind, m_tile, m_hp, m_owner, alive, s_owner, s_hp, result):
+        """Damages every enemy unit near a self destructing unit
+        """
+        owner = m_owner[i]
+        x, y = divmod(m_tile[i], ARENA_SIZE)
+        limit = (kind.self_destruct_range + self._hit_radius) ** 2
+        for dx, dy in self.game_state.game_map._range_stencil(kind.self_destruct_range):
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < ARENA_SIZE and 0 <= ny < ARENA_SIZE:
+                index = nx * ARENA_SIZE + ny
+                if s_owner[index] != -1 and s_owner[index] != owner and s_hp[index] > 0:
+                    result.structure_damage[owner] += min(kind.self_destruct_f, s_hp[index])
+                    s_hp[index] -= kind.self_destruct_f
+        for j in alive:
+            if m_owner[j] != owner and m_hp[j] > 0:
+                mx, my = divmod(m_tile[j], ARENA_SIZE)
+                if (mx - x) ** 2 + (my - y) ** 2 < limit:
+                    m_hp[j] -= kind.self_destruct_i
+
+    def _remove_dead_structures(self, s_owner, s_hp, s_unit, blocked, result):
+        """Clears destroyed structures from the board. Returns True if any were destroyed
+        """
+        destroyed = False
+        for unit in self._structures:
+            index = unit.x * ARENA_SIZE + unit.y
+            if s_owner[index] != -1 and s_hp[index] <= 0:
+                result.destroyed_structures.append((unit.unit_type, unit.x, unit.y, unit.player_index))
+                s_owner[index] = -1
+                blocked[index] = 0
+                destroyed = True
+        return destroyed
+
+
+def simulate(game_state, deploy_stack=None, enemy_deploy_stack=None, max_frames=400):
+    """Simulates the action phase that would follow game_state, see Simulator.simulate
+
+    Returns:
+        A SimulationResult
+
+    """
+    return Simulator(game_state, max_frames).simulate(deploy_stack, enemy_deploy_stack)
@@ -1,7 +1,25 @@
 import unittest
 import json
+import io
+import sys
+import random
+import os
+import tempfile
 from .game_state import GameState
-from .unit import GameUnit
+from .game_map import popcount
+from .algocore import AlgoCore
+from .replay import MessageRecorder, read_log, replay
+from .local_engine import LocalEngine
+from . import instrumentation
+from .benchmark import generate_state, build_corpus, run_benchmarks, compare
+from .util import CommandReader, send_command, set_command_buffering, flush_commands
+from .unit import GameUnit, unit_stats
+from .config import CompiledConfig, compile_config
+from .navigation import ShortestPathFinder, FastShortestPathFinder, PathCache
+from .simulator import Simulator
+from .messages import EngineMessage, parse_message, mobile_units_remaining
+from .geometry import VALID_LOCATIONS, EDGE_SETS, FRIENDLY_EDGE_SETS
+from .parallel import PlanEvaluator, serialize_board, deserialize_board
 
 class BasicTests(unittest.TestCase):
 
@@ -239,6 +257,13 @@ class BasicTests(unittest.TestCase):
         game = self.make_turn_0_map()
         self.assertEqual(1, len(game.game_map.get_locations_in_range([13,13], 0)), "We should be in 0 range of ourself")
         self.assertEqual(37, len(game.game_map.get_locations_in_range([13,13], 3.5)), "Wrong number of tiles in range")
+        self.assertEqual(len(game.game_map.get_locations_in_range([13.0, 13.0], 3.5)), len(game.game_map.get_locations_in_range([13, 13], 3.5)), "Stencils should match the search loop")
+        coverage = game.game_map.get_locations_in_range_many([[13, 13], [14, 13], [0, 13]], 3.5)
+        self.assertEqual(2, coverage[13, 12], "Both nearby centers cover this location")
+        self.assertEqual(1, coverage[0, 13])
+        self.assertEqual(sorted(map(tuple, game.game_map.get_locations_in_range([0, 13], 3.5))), sorted(location for location, count in coverage.items() if location[0] < 5))
+        self.assertIs(game.config.stencils[3.5], game.game_map._range_stencil(3.5), "The config's ranges should be built when it is compiled")
+        self.assertIs(game.game_map._range_stencil(3.5), self.make_turn_0_map().game_map._range_stencil(3.5), "Stencils should be shared by every map")
 
     def _test_get_attackers(self):
         game = self.make_turn_0_map()
@@ -256,6 +281,613 @@ class BasicTests(unittest.TestCase):
         game.game_map.add_unit("DF", [14,14], 1)
         self.assertEqual(3, len(game.get_attackers([13,13], 0)), "We should be in danger from 3 places")
 
+    def add_random_walls(self, game, seed, count):
+        rng = random.Random(seed)
+        locations = [location for location in game.game_map]
+        for location in rng.sample(locations, count):
+            game.game_map.add_unit("FF", location, rng.randint(0, 1))
+
+    def test_fast_pathfinder_matches_reference(self):
+        for seed in range(12):
+            game = self.make_turn_0_map()
+            self.add_random_walls(game, seed, 40 * (seed % 6))
+            for edge in range(4):
+                end_points = game.game_map.get_edge_locations(edge)
+                for location in game.game_map:
+                    if game.contains_stationary_unit(location):
+                        continue
+                    expected = ShortestPathFinder().navigate_multiple_endpoints(location, end_points, game)
+                    actual = FastShortestPathFinder().navigate_multiple_endpoints(location, end_points, game)
+                    self.assertEqual(expected, actual, "Paths from {} to edge {} differ (seed {})".format(location, edge, seed))
+
+    def test_path_cache(self):
+        game = self.make_turn_0_map()
+        game.path_cache = PathCache(maxsize=2)
+        first = game.find_path_to_edge([13, 0])
+        self.assertEqual((0, 1), (game.path_cache.hits, game.path_cache.misses))
+        self.assertEqual(first, game.find_path_to_edge([13, 0]), "Cached path should match the computed one")
+        self.assertEqual((1, 1), (game.path_cache.hits, game.path_cache.misses))
+
+        game.game_map.add_unit("FF", first[3], 0)
+        blocked = game.find_path_to_edge([13, 0])
+        self.assertNotIn(first[3], blocked, "Placing a structure should invalidate the cached path")
+        self.assertEqual(2, game.path_cache.misses)
+        game.game_map.remove_unit(first[3])
+        self.assertEqual(first, game.find_path_to_edge([13, 0]), "Removing the structure should restore the old path")
+        self.assertEqual(2, game.path_cache.hits)
+
+        game.find_path_to_edge([14, 0])
+        game.find_path_to_edge([15, 1])
+        self.assertEqual(2, len(game.path_cache), "The cache should never hold more than maxsize paths")
+
+    def test_batch_paths_match_single_paths(self):
+        for seed in range(6):
+            game = self.make_turn_0_map()
+            self.add_random_walls(game, seed, 60 * seed)
+            starts = [location for location in game.game_map if not game.contains_stationary_unit(location)][::5]
+            for edge in range(4):
+                game.path_cache = PathCache()
+                batch = game.find_paths_to_edge_batch(starts, edge)
+                game.path_cache = PathCache()
+                single = [game.find_path_to_edge(start, edge) for start in starts]
+                self.assertEqual(single, batch, "Batch paths to edge {} differ (seed {})".format(edge, seed))
+
+    def test_path_field_repair(self):
+        rng = random.Random(7)
+        game = self.make_turn_0_map()
+        self.add_random_walls(game, 7, 150)
+        start = [13, 0]
+        if game.contains_stationary_unit(start):
+            game.game_map.remove_unit(start)
+        field = game.path_field(start)
+        locations = [location for location in game.game_map]
+        for _ in range(150):
+            location = rng.choice(locations)
+            if location == start:
+                continue
+            if game.contains_stationary_unit(location):
+                self.assertEqual(field.what_if_unblock(location), self.path_without(game, location, start))
+                game.game_map.remove_unit(location)
+                field.unblock(location)
+            else:
+                self.assertEqual(field.what_if_block(location), self.path_with(game, location, start))
+                game.game_map.add_unit("FF", location, 1)
+                field.block(location)
+            fresh = game.path_field(start)
+            self.assertEqual(list(fresh.field), list(field.field), "Repaired field differs from a fresh one")
+            self.assertEqual(game.find_path_to_edge(start), field.path)
+
+    def path_with(self, game, location, start):
+        game.game_map.add_unit("FF", location, 1)
+        path = game.find_path_to_edge(start)
+        game.game_map.remove_unit(location)
+        return path
+
+    def path_without(self, game, location, start):
+        units = game.game_map[location]
+        game.game_map.remove_unit(location)
+        path = game.find_path_to_edge(start)
+        game.game_map[tuple(location)] = units
+        return path
+
+    def test_threat_map(self):
+        game = self.make_turn_0_map()
+        rng = random.Random(3)
+        locations = [location for location in game.game_map]
+        for location in rng.sample(locations, 30):
+            game.game_map.add_unit(rng.choice(["FF", "EF", "DF"]), location, rng.randint(0, 1))
+        threat = game.get_threat_map(0)
+        for location in rng.sample(locations, 20):
+            game.game_map.remove_unit(location)
+            game.game_map.add_unit(rng.choice(["FF", "DF"]), rng.choice(locations), 1)
+        for location in locations:
+            if game.contains_stationary_unit(location) and game.game_map[location][0].unit_type == "DF" and rng.random() < 0.5:
+                game.game_map[location][0].upgrade()
+                game.game_map._refresh_tile(location[0], location[1])
+
+        for location in locations:
+            attackers = game.get_attackers(location, 0)
+            self.assertEqual(len(attackers), threat.attackers_at(location), "Wrong attacker count at {}".format(location))
+            self.assertAlmostEqual(sum(unit.damage_i for unit in attackers), threat.damage_at(location))
+
+        state = generate_state(game.config, 7, "late")
+        lazy = GameState(game.config, state)
+        threat = lazy.get_threat_map(0)
+        self.assertEqual(0, sum(len(units) for column in lazy.game_map._GameMap__map for units in column), "Building a threat map should not create GameUnits")
+        eager = GameState(game.config, state)
+        for location in eager.game_map:
+            eager.game_map[location]
+        self.assertEqual(list(eager.get_threat_map(0).damage), list(threat.damage))
+        self.assertEqual(list(eager.get_threat_map(0).attackers), list(threat.attackers))
+
+    def test_simulator(self):
+        game = self.make_turn_0_map()
+        game._player_resources[0]['MP'] = 10
+        game.attempt_spawn("PI", [13, 0], 5)
+        result = Simulator(game).simulate()
+        self.assertEqual([5, 0], result.breaches, "Every scout should score on an empty board")
+        self.assertEqual(25, result.health[1], "The enemy should lose one health per scout")
+        self.assertEqual(len(game.find_path_to_edge([13, 0])) - 1, result.frames, "Scouts move one tile per frame")
+
+        for location in [[19, 9], [21, 11], [23, 13], [24, 14]]:
+            game.game_map.add_unit("DF", location, 1)
+        result = Simulator(game).simulate()
+        self.assertLess(result.breaches[0], 5, "Turrets along the path should kill some scouts")
+        self.assertEqual(5, result.breaches[0] + result.units_lost[0], "Every scout should either score or die")
+        self.assertGreater(result.structure_damage[0], 0, "Scouts should damage the turrets")
+        self.assertEqual(90, game.game_map[19, 9][0].health, "Simulating should not modify the game state")
+
+    def test_board_serialization(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [19, 9], 1)
+        game.game_map.add_unit("FF", [3, 12], 0)
+        game.game_map[3, 12][0].upgrade()
+        copy = deserialize_board(serialize_board(game), game.config)
+        self.assertEqual(str(game.game_map[19, 9]), str(copy.game_map[19, 9]))
+        self.assertEqual(str(game.game_map[3, 12]), str(copy.game_map[3, 12]))
+        self.assertEqual(game.get_resources(0), copy.get_resources(0))
+
+    def test_plan_evaluator(self):
+        game = self.make_turn_0_map()
+        for location in [[19, 9], [21, 11], [23, 13], [24, 14]]:
+            game.game_map.add_unit("DF", location, 1)
+        evaluator = PlanEvaluator(game.config, workers=2, time_limit=30)
+        try:
+            plans = PlanEvaluator.candidate_plans(["PI"], [[13, 0], [14, 0]], [5])
+            results = evaluator.evaluate(game, plans)
+            self.assertEqual(2, len(results))
+            self.assertEqual(("PI", (14, 0), 5), results[0][1], "Scouts heading away from the turrets should score best")
+            self.assertEqual([], evaluator.evaluate(game, plans, time_limit=0), "Nothing should finish before a passed deadline")
+            self.assertEqual(2, len(evaluator.evaluate(game, plans)), "The workers should be usable after a deadline passed")
+        finally:
+            evaluator.shutdown()
+
+    def test_structure_bitboards(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        game_map.add_unit("FF", [13, 14], 1)
+        game_map.add_unit("FF", [10, 15], 1)
+        game_map.add_unit("DF", [14, 16], 1)
+        game_map.add_unit("FF", [3, 12], 0)
+        game_map.add_unit("PI", [13, 0], 0)
+        self.assertTrue(game_map.is_blocked(13, 14))
+        self.assertFalse(game_map.is_blocked(13, 0), "Mobile units do not block")
+        self.assertEqual(4, game_map.count_structures())
+        self.assertEqual(3, game_map.count_structures(1))
+        self.assertEqual(2, game_map.count_structures(1, "FF"))
+        self.assertEqual(1, game_map.count_structures(1, "FF", rows=[14]))
+        self.assertEqual(1, game_map.count_structures(None, "FF", rows=range(14)))
+        self.assertEqual(1, game_map.count_structures(1, columns=[10, 11]))
+        self.assertEqual(0, game_map.count_structures(1, "EF"))
+        game_map.add_unit("DF", [13, 14], 0)
+        self.assertEqual(1, game_map.count_structures(1, "FF"), "Replacing a structure should clear its old bit")
+        game_map.remove_unit([14, 16])
+        self.assertFalse(game_map.is_blocked(14, 16))
+        self.assertEqual(2, game_map.count_structures(0))
+        game_map[14, 16].append(GameUnit("FF", game.config, 1, None, 14, 16))
+        self.assertTrue(game.contains_stationary_unit([14, 16]), "Units added without _refresh_tile should still be found")
+
+    def test_geometry_tables(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        self.assertEqual(420, len(VALID_LOCATIONS))
+        self.assertEqual([[x, y] for x, y in VALID_LOCATIONS], list(game_map))
+        for x in range(-1, 29):
+            for y in range(-1, 29):
+                self.assertEqual((x, y) in VALID_LOCATIONS, game_map.in_arena_bounds([x, y]))
+        self.assertTrue(game_map.in_arena_bounds([13.5, 0.5]), "Non integer locations use the arithmetic check")
+        for edge in range(4):
+            self.assertEqual(14, len(EDGE_SETS[edge]))
+        self.assertTrue(game.can_spawn("PI", [13, 0]))
+        self.assertFalse(game.can_spawn("PI", [13, 1]), "Only edge locations can spawn mobile units")
+        self.assertIn((0, 14), FRIENDLY_EDGE_SETS[1])
+        self.assertEqual(game_map.TOP_RIGHT, game.get_target_edge([13, 0]))
+        self.assertEqual(game_map.TOP_LEFT, game.get_target_edge([14, 0]))
+        self.assertEqual(game_map.BOTTOM_RIGHT, game.get_target_edge([0, 14]))
+        self.assertEqual(game_map.BOTTOM_LEFT, game.get_target_edge([27, 14]))
+
+    def test_engine_message(self):
+        game = self.make_turn_0_map()
+        message = EngineMessage(game.serialized_string)
+        self.assertEqual(game.serialized_string, message, "An EngineMessage should still be the raw string")
+        self.assertIs(message.data, parse_message(message), "The message should only be parsed once")
+        from_message = GameState(game.config, message)
+        from_dict = GameState(game.config, message.data)
+        self.assertEqual(game.turn_number, from_message.turn_number)
+        self.assertEqual(game.get_resources(0), from_dict.get_resources(0))
+        self.assertEqual([0, 0, -1], message.data["turnInfo"], "Parsing a GameState should not change the message")
+
+    def test_frame_handlers(self):
+        algo = AlgoCore()
+        breaches = []
+        algo.register_frame_handler("breach", lambda entries, frame: breaches.extend(entries))
+        quiet = EngineMessage('{"turnInfo": [1, 3, 10], "events": {"breach": [], "death": [[[1, 2], 3, "5", 1, false]]}}')
+        scored = EngineMessage('{"turnInfo":[1,3,11],"p1Units":[[[13,0,15.0,"7"]]],"events":{"breach":[[[13,0],1,3,"9",2]],"death":[]}}')
+        algo._dispatch_frame(quiet)
+        self.assertEqual([], breaches)
+        algo._dispatch_frame(scored)
+        self.assertEqual([[[13, 0], 1, 3, "9", 2]], breaches)
+        self.assertNotIn("_data", scored.__dict__, "Only the events should be decoded")
+        self.assertEqual([1, 3, 11], scored.section("turnInfo"))
+        self.assertIsNone(scored.section("p2Units"))
+
+        frames = []
+        algo.on_action_frame = frames.append
+        self.assertTrue(algo.handle_message('{"turnInfo":[1,3,11],"p1Units":[[[13,0,15.0,"7"]]],"events":{"breach":[[[13,0],1,3,"9",2]],"death":[]}}'))
+        self.assertEqual(2, len(breaches), "Plain strings should be handled like EngineMessages")
+        self.assertIsInstance(frames[0], EngineMessage)
+
+    def test_command_reader(self):
+        stream = io.StringIO('{"turnInfo": [0, 1, -1]}\n{"turnInfo": [1, 1, 0]}\n')
+        reader = CommandReader(stream, max_queue=1).start()
+        turn = reader.get()
+        frame = reader.get()
+        self.assertIn("_data", turn.__dict__, "Turns should be parsed on the reader thread")
+        self.assertNotIn("_data", frame.__dict__, "Frames should be left for the algo")
+        self.assertEqual([1, 1, 0], frame.data["turnInfo"])
+        self.assertEqual(2, reader.messages)
+        with self.assertRaises(SystemExit):
+            reader.get()
+
+    def test_command_buffering(self):
+        stdout = sys.stdout
+        sys.stdout = output = io.StringIO()
+        try:
+            set_command_buffering(True)
+            send_command("[]")
+            send_command('[["FF", 13, 13]]')
+            self.assertEqual("", output.getvalue(), "Commands should wait for flush_commands")
+            flush_commands()
+            self.assertEqual('[]\n[["FF", 13, 13]]\n', output.getvalue())
+        finally:
+            set_command_buffering(False)
+            sys.stdout = stdout
+
+    def test_speculation(self):
+        game = self.make_turn_0_map()
+        algo = AlgoCore()
+        algo.config = game.config
+        state = {"turnInfo": [1, 2, 40], "p1Stats": [30.0, 5.0, 2.0, 0], "p2Stats": [30.0, 5.0, 2.0, 0],
+                 "p1Units": [[[3, 12, 60.0, "1"]], [], [[13, 10, 75.0, "2"]], [], [], [], []],
+                 "p2Units": [[], [], [[19, 16, 75.0, "3"]], [], [], [], []],
+                 "events": {"breach": [], "death": []}}
+        running = dict(state, p2Units=[[], [], [[19, 16, 75.0, "3"]], [[14, 20, 15.0, "4"]], [], [], []])
+        self.assertTrue(mobile_units_remaining(EngineMessage(json.dumps(running))))
+        self.assertFalse(mobile_units_remaining(EngineMessage(json.dumps(state))))
+        algo._start_speculation(EngineMessage(json.dumps(state)))
+        algo._finish_speculation()
+
+        changed = GameState(game.config, json.dumps(state))
+        changed.game_map.add_unit("DF", [20, 16], 1)
+        self.assertFalse(algo.reuse_speculation(changed), "Threat maps are only reused for the same structures")
+
+        turn = GameState(game.config, json.dumps(dict(state, turnInfo=[0, 3, -1])))
+        threat_map = algo._speculated_threat_maps[1]
+        self.assertTrue(algo.reuse_speculation(turn))
+        self.assertIs(threat_map, turn.game_map.get_threat_map(1))
+        self.assertEqual(list(turn.game_map.get_threat_map(0).damage), list(GameState(game.config, json.dumps(state)).game_map.get_threat_map(0).damage))
+        hits = GameState.path_cache.hits
+        turn.find_path_to_edge([13, 0])
+        self.assertEqual(hits + 1, GameState.path_cache.hits, "Paths from spawn locations should already be cached")
+
+    def test_replay(self):
+        game = self.make_turn_0_map()
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            recorder = MessageRecorder(path)
+            recorder.record_input(json.dumps(dict(game.config, replaySave=1)))
+            recorder.record_input(game.serialized_string)
+            recorder.record_output("[]")
+            recorder.record_output("[]")
+            recorder.record_input('{"turnInfo": [1, 0, 0], "events": {}}')
+            recorder.record_input(game.serialized_string.replace('"turnInfo":[0,0,-1]', '"turnInfo":[0,1,-1]'))
+            recorder.record_output("[]")
+            recorder.record_output('[["PI", 13, 0]]')
+            recorder.record_input('{"turnInfo": [2, 1, 0]}')
+            recorder.record_input(game.serialized_string)
+            recorder.close()
+
+            records = read_log(path)
+            self.assertEqual(10, len(records))
+            report = replay(AlgoCore(), records)
+            self.assertEqual([0, 1], [turn for turn, _, _ in report.turns])
+            self.assertEqual(1, report.frames)
+            self.assertEqual([1], report.diverged_turns, "The second turn was recorded with different replies")
+        finally:
+            os.remove(path)
+
+    def test_local_engine(self):
+        class ScriptedAlgo:
+            def __init__(self, build, deploy):
+                self.replies = []
+                self.received = []
+                self.build = build
+                self.deploy = deploy
+
+            def send(self, line):
+                self.received.append(line)
+                if '"turnInfo": [0,' in line:
+                    self.replies += [self.build, self.deploy]
+                return True
+
+            def receive(self, timeout):
+                return self.replies.pop(0)
+
+        game = self.make_turn_0_map()
+        engine = LocalEngine(game.config, max_turns=3)
+        builder = ScriptedAlgo('[["FF", 3, 12], ["DF", 3, 12]]', '[]')
+        attacker = ScriptedAlgo('[]', '[["PI", 13, 0], ["PI", 13, 0], ["PI", 13, 3], ["FF", 13, 0]]')
+        result = engine.play([builder, attacker])
+        self.assertEqual(3, result.turns)
+        self.assertEqual("turns", result.reason)
+        self.assertEqual(1, result.winner, "Only the second algo attacked")
+        self.assertEqual(["FF"], [unit.unit_type for unit in engine.board.game_map[3, 12]], "Occupied locations can not be built on")
+        self.assertEqual(game.config, json.loads(attacker.received[0]))
+        seen_by_attacker = GameState(game.config, engine.message(1, 0))
+        self.assertEqual(1, len(seen_by_attacker.game_map[24, 15]), "The second algo should see the board flipped")
+        self.assertEqual(1, seen_by_attacker.game_map[24, 15][0].player_index)
+        self.assertLess(result.health[0], game.config["resources"]["startingHP"])
+        self.assertIn('"turnInfo": [2,', builder.received[-1])
+
+    def test_instrumentation(self):
+        can_spawn = GameState.can_spawn
+        output = io.StringIO()
+        instrumentation.enable(output)
+        try:
+            game = self.make_turn_0_map()
+            instrumentation.begin_turn()
+            game.can_spawn("FF", [13, 13])
+            game.attempt_spawn("FF", [[13, 12], [14, 12]])
+            game._shortest_path_finder.navigate_multiple_endpoints([13, 0], game.game_map.get_edge_locations(game.game_map.TOP_RIGHT), game)
+            with instrumentation.section("custom"):
+                instrumentation.count("custom_count", 2)
+            instrumentation.end_turn(4)
+        finally:
+            instrumentation.disable()
+        self.assertIs(can_spawn, GameState.can_spawn, "Disabling should restore the original methods")
+        line = json.loads(output.getvalue())
+        self.assertEqual(4, line["turn"])
+        self.assertEqual(1, line["sections"]["GameState.parse_state"]["calls"])
+        self.assertEqual(3, line["sections"]["GameState.can_spawn"]["calls"])
+        self.assertEqual(1, line["sections"]["GameState.attempt_spawn"]["calls"])
+        self.assertEqual(1, line["sections"]["custom"]["calls"])
+        self.assertEqual(2, line["counters"]["custom_count"])
+        self.assertGreater(line["counters"]["bfs_nodes"], 100)
+        instrumentation.count("ignored")
+        self.assertNotIn("ignored", instrumentation.report()["counters"], "Nothing is recorded while disabled")
+
+    def test_benchmark(self):
+        game = self.make_turn_0_map()
+        self.assertEqual(generate_state(game.config, 3, "late"), generate_state(game.config, 3, "late"), "Boards should be reproducible")
+        late = GameState(game.config, generate_state(game.config, 3, "late"))
+        self.assertEqual(120, late.game_map.count_structures())
+        corpus = build_corpus(game.config, per_phase=1, recorded=[game.serialized_string])
+        self.assertEqual(4, len(corpus))
+        results = run_benchmarks(game.config, corpus, repeat=2, names=["parse", "targets"])
+        self.assertEqual(8, results["parse"]["samples"])
+        self.assertLessEqual(results["parse"]["p50"], results["parse"]["max"])
+        slower = dict(results, parse=dict(results["parse"], p50=results["parse"]["p50"] / 2))
+        regressions = [name for name, _, _, _, regressed in compare(results, slower) if regressed]
+        self.assertEqual(["parse"], regressions)
+
+    def test_compiled_config(self):
+        game = self.make_turn_0_map()
+        config = game.config
+        self.assertIsInstance(config, CompiledConfig)
+        self.assertIs(config, compile_config(config))
+        self.assertIs(config, GameState(config, game.serialized_string).config, "A compiled config should be used as it is")
+        self.assertEqual(config["unitInformation"][2]["shorthand"], config.TURRET, "It should still be the config dict")
+        first, second = dict(config), dict(config)
+        compiled = compile_config(first), compile_config(second)
+        self.assertIs(compiled[0], compile_config(first), "Alternating between raw configs should not compile them again")
+        self.assertIs(compiled[1], compile_config(second))
+        self.assertEqual(2, config.type_index["DF"])
+        self.assertEqual(("FF", "EF", "DF"), config.structure_types)
+        self.assertEqual(game.type_cost("DF"), list(config.costs["DF"]))
+        self.assertEqual([4.0, 0], game.type_cost("DF", True))
+        self.assertEqual({"FF", "EF", "DF"}, set(config.upgrades))
+        self.assertEqual(4.5, config.max_attack_range)
+        self.assertEqual(json.loads(json.dumps(config)), dict(config))
+
+    def test_fork(self):
+        game = self.make_turn_0_map()
+        game.suppress_warnings(True)
+        game.attempt_spawn("DF", [13, 6])
+        path = game.find_path_to_edge([13, 0])
+        threat = list(game.get_threat_map(1).damage)
+        resources = game.get_resources()
+        with game.fork() as what_if:
+            self.assertIs(what_if.game_map[13, 6], game.game_map[13, 6], "Unchanged locations should be shared")
+            what_if.attempt_upgrade([13, 6])
+            what_if.attempt_spawn("FF", [[x, 2] for x in range(11, 17)])
+            self.assertTrue(what_if.game_map[13, 6][0].upgraded)
+            self.assertFalse(game.game_map[13, 6][0].upgraded, "Upgrading on a fork should not change the parent")
+            self.assertNotEqual(path, what_if.find_path_to_edge([13, 0]))
+            self.assertNotEqual(threat, list(what_if.get_threat_map(1).damage))
+            self.assertIn([11, 2], what_if.game_map.changed_locations())
+            self.assertLess(what_if.get_resource(game.SP), resources[game.SP])
+            fresh = GameState(game.config, game.serialized_string)
+            fresh.attempt_spawn("DF", [13, 6])
+            fresh.attempt_upgrade([13, 6])
+            fresh.attempt_spawn("FF", [[x, 2] for x in range(11, 17)])
+            self.assertEqual(fresh.game_map.structure_key(), what_if.game_map.structure_key())
+            self.assertEqual(len(fresh.get_attackers([13, 9], 1)), len(what_if.get_attackers([13, 9], 1)))
+        self.assertEqual([], what_if.game_map.changed_locations(), "Leaving the with block should discard the changes")
+        self.assertEqual(game.game_map.structure_key(), what_if.game_map.structure_key())
+        self.assertEqual(path, game.find_path_to_edge([13, 0]))
+        self.assertEqual(threat, list(game.get_threat_map(1).damage))
+        self.assertEqual(resources, game.get_resources())
+
+        fork = game.fork()
+        stacks = (list(fork._build_stack), list(fork._deploy_stack))
+        for _ in range(2):
+            with fork as what_if:
+                self.assertEqual(1, what_if.attempt_spawn("DF", [13, 7]))
+                what_if.attempt_spawn("PI", [13, 0], 2)
+            self.assertEqual(resources, fork.get_resources(), "Leaving the with block should refund the fork")
+            self.assertEqual(stacks, (fork._build_stack, fork._deploy_stack))
+            self.assertFalse(fork.contains_stationary_unit([13, 7]))
+
+    def test_savepoint_rollback(self):
+        game = self.make_turn_0_map()
+        game.suppress_warnings(True)
+        game.attempt_spawn("DF", [13, 6])
+        key = game.game_map.structure_key()
+        path = game.find_path_to_edge([13, 0])
+        threat = list(game.get_threat_map(1).damage)
+        resources = game.get_resources()
+        stacks = (list(game._build_stack), list(game._deploy_stack))
+
+        start = game.savepoint()
+        game.attempt_spawn("FF", [[x, 2] for x in range(11, 17)])
+        middle = game.savepoint()
+        game.attempt_upgrade([13, 6])
+        game.attempt_remove([11, 2])
+        game.attempt_spawn("PI", [13, 0], 2)
+        self.assertTrue(game.game_map[13, 6][0].upgraded)
+        game.rollback(middle)
+        self.assertFalse(game.game_map[13, 6][0].upgraded)
+        self.assertEqual(0, len(game.game_map[13, 0]))
+        self.assertEqual(6, game.game_map.count_structures(0, "FF"))
+        game.rollback(start)
+        self.assertEqual(key, game.game_map.structure_key())
+        self.assertEqual(path, game.find_path_to_edge([13, 0]))
+        self.assertEqual(threat, list(game.get_threat_map(1).damage))
+        self.assertEqual(resources, game.get_resources())
+        self.assertEqual(stacks, (game._build_stack, game._deploy_stack))
+
+        game.attempt_spawn("FF", [11, 2])
+        game.commit()
+        game.rollback(start)
+        self.assertTrue(game.contains_stationary_unit([11, 2]), "Committed changes should be kept")
+
+        fork = game.fork()
+        start = fork.savepoint()
+        fork.attempt_spawn("FF", [12, 2])
+        fork.attempt_upgrade([13, 6])
+        self.assertEqual(2, len(fork.game_map.changed_locations()))
+        fork.rollback(start)
+        self.assertEqual([], fork.game_map.changed_locations(), "Locations rolled back should read from the parent again")
+
+    def test_board_hash(self):
+        game = self.make_turn_0_map()
+        game.suppress_warnings(True)
+        empty = game.board_hash
+        game.attempt_spawn("DF", [13, 6])
+        game.attempt_spawn("FF", [[12, 5], [14, 5]])
+        game.game_map.add_unit("FF", [13, 20], 1)
+        enemy = game.game_map.board_hash(1)
+        self.assertNotEqual(empty, game.board_hash)
+        self.assertEqual(game.board_hash, game.game_map.board_hash(0) ^ enemy)
+
+        start = game.savepoint()
+        friendly = game.game_map.board_hash(0)
+        game.attempt_upgrade([13, 6])
+        upgraded = game.game_map.board_hash(0)
+        self.assertNotEqual(friendly, upgraded)
+        self.assertEqual(enemy, game.game_map.board_hash(1), "Only the changed player's hash should change")
+        game.rollback(start)
+        self.assertEqual(friendly, game.game_map.board_hash(0))
+
+        other = GameState(game.config, game.serialized_string)
+        other.game_map.add_unit("FF", [13, 20], 1)
+        other.game_map.add_unit("FF", [14, 5], 0)
+        other.game_map.add_unit("FF", [12, 5], 0)
+        other.game_map.add_unit("DF", [13, 6], 0)
+        self.assertEqual(game.board_hash, other.board_hash, "The order structures are added in should not matter")
+        other.game_map[13, 6][0].pending_removal = True
+        other.game_map._refresh_tile(13, 6)
+        self.assertNotEqual(game.board_hash, other.board_hash)
+        other.game_map.remove_unit([13, 6])
+        other.game_map.remove_unit([13, 20])
+        self.assertEqual(0, other.game_map.board_hash(1))
+
+    def test_from_previous(self):
+        game = self.make_turn_0_map()
+        first = json.loads(generate_state(game.config, 5, "mid"))
+        second = json.loads(generate_state(game.config, 5, "mid"))
+        second["turnInfo"][1] += 1
+        second["p1Units"][0].pop()
+        second["p2Units"][2][0][2] = 1.0
+        second["p2Units"][1].append([13, 27, 30.0, "new"])
+        second["p1Units"][6].append(second["p1Units"][2][0][:2] + [0, ""])
+        second["p1Units"][3].append([13, 0, 15.0, "scout"])
+
+        def describe(game_state):
+            return [[(unit.unit_type, unit.player_index, unit.health, unit.upgraded, unit.pending_removal) for unit in game_state.game_map[location]]
+                    for location in game_state.game_map]
+
+        previous = GameState(game.config, json.dumps(first))
+        previous.suppress_warnings(True)
+        threat = previous.get_threat_map(1)
+        previous.attempt_spawn("PI", [14, 0], 3)
+        unchanged = previous.game_map[second["p1Units"][1][0][:2]][0]
+        updated = GameState.from_previous(previous, json.dumps(second))
+        expected = GameState(game.config, json.dumps(second))
+
+        self.assertEqual(describe(expected), describe(updated))
+        self.assertEqual(expected.board_hash, updated.board_hash)
+        self.assertEqual(expected.turn_number, updated.turn_number)
+        self.assertEqual(expected.get_resources(1), updated.get_resources(1))
+        self.assertEqual([], updated._deploy_stack)
+        self.assertIs(threat, updated.get_threat_map(1), "The threat map should be updated, not rebuilt")
+        self.assertEqual(list(expected.get_threat_map(1).damage), list(threat.damage))
+        self.assertIs(unchanged, updated.game_map[second["p1Units"][1][0][:2]][0], "Unchanged units should be reused")
+        # The removed wall, the new support, the removal flag, the new scout and the scouts spawned last turn
+        self.assertEqual(5, len(updated.changes.changed_locations))
+        self.assertEqual([0, 1], updated.changes.changed_players)
+        self.assertEqual(updated.game_map.count_structures() - 2, updated.changes.reused_units)
+
+        # Unchanged locations of a map as parsed keep their units as rows
+        lazy = GameState.from_previous(GameState(game.config, json.dumps(first)), json.dumps(second))
+        self.assertEqual(lazy.changes.created_units, sum(len(units) for column in lazy.game_map._GameMap__map for units in column))
+        self.assertEqual(describe(expected), describe(lazy))
+        self.assertEqual(expected.board_hash, lazy.board_hash)
+
+    def test_unit_columns(self):
+        game = self.make_turn_0_map()
+        state = json.loads(generate_state(game.config, 7, "late"))
+        lazy = GameState(game.config, state)
+        columns = lazy.game_map.unit_columns()
+        self.assertEqual(0, sum(len(units) for column in lazy.game_map._GameMap__map for units in column), "Parsing should not create GameUnits")
+        self.assertEqual(lazy.game_map.count_structures(), len(columns))
+        self.assertEqual(sum(1 for flags in columns.flags if flags & columns.UPGRADED), popcount(lazy.game_map.get_structure_board() & lazy.game_map._upgraded_mask))
+
+        x, y = columns.xs[0], columns.ys[0]
+        unit = lazy.game_map[x, y][0]
+        self.assertEqual((game.config.shorthands[columns.type_ids[0]], columns.owners[0], columns.health[0]), (unit.unit_type, unit.player_index, unit.health))
+        self.assertIs(unit, lazy.game_map[x, y][0], "A location's units should only be created once")
+        lazy.game_map.add_unit("PI", [13, 0], 0)
+        touched = lazy.game_map.unit_columns()
+        self.assertEqual(len(columns) + 1, len(touched))
+        self.assertEqual(sorted(zip(columns.xs, columns.ys, columns.health, columns.flags)),
+                         sorted((x, y, health, flags) for x, y, health, flags, type_id in zip(touched.xs, touched.ys, touched.health, touched.flags, touched.type_ids) if type_id != 3))
+
+        eager = GameState(game.config, state)
+        for location in eager.game_map:
+            eager.game_map[location]
+        self.assertEqual(lazy.board_hash, GameState(game.config, state).board_hash)
+        self.assertEqual(eager.game_map.structure_key(), GameState(game.config, state).game_map.structure_key())
+        self.assertEqual(sorted(serialize_board(eager)[3]), sorted(serialize_board(GameState(game.config, state))[3]))
+
+    def test_unit_stats(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("FF", [13, 13], 0)
+        game.game_map.add_unit("FF", [14, 13], 1)
+        first, second = game.game_map[13, 13][0], game.game_map[14, 13][0]
+        self.assertIs(first.stats, second.stats, "Units of one type should share their stats")
+        self.assertIs(unit_stats(game.config, "FF"), first.stats)
+        self.assertFalse(hasattr(first, "__dict__"), "Units should only have their slots")
+        first.upgrade()
+        self.assertTrue(first.upgraded)
+        self.assertEqual(150.0, first.max_health)
+        self.assertEqual(75.0, second.max_health, "Upgrading a unit should not change the others")
+        self.assertIs(unit_stats(game.config, "FF", True), first.stats)
+        self.assertEqual(second.cost, first.cost, "This upgrade has no cost of its own")
+        with self.assertRaises(TypeError):
+            first.cost[0] -= 1
+
     def test_print_unit(self):
         game = self.make_turn_0_map()
 
@@ -0,0 +1,126 @@
+from array import array
+
+from .geometry import ARENA_SIZE, NUM_TILES, IN_BOUNDS
+
+
+def _attack_offsets(attack_range):
+    """Relative offsets of every location within attack_range of a location
+    """
+    reach = int(attack_range) + 1
+    offsets = []
+    for dx in range(-reach, reach + 1):
+        for dy in range(-reach, reach + 1):
+            if dx * dx + dy * dy <= attack_range * attack_range:
+                offsets.append((dx, dy))
+    return tuple(offsets)
+
+
+class ThreatMap:
+    """Holds how dangerous each location is for one player's mobile units.
+
+    Built once from the structures on a GameMap, then kept up to date by the map as structures are
+    added, removed or upgraded, so the danger along a path is a sum of array lookups instead of a
+    get_attackers call per location. Like get_attackers, a structure threatens the locations whose
+    distance to it is at most its attackRange. Only structures are counted, mobile units are not.
+
+    Attributes :
+        * player_index (int): The player whose mobile units are threatened, 0 for you 1 for the enemy
+        * damage (array): Damage per frame dealt to a mobile unit at each location, indexed by x * 28 + y
+        * attackers (array): The number of structures that can attack each location, indexed by x * 28 + y
+
+    """
+    def __init__(self, game_map, player_index):
+        """Builds the threat map from the structures currently on game_map
+
+        Args:
+            game_map: The GameMap to read structures from
+            player_index: The player whose mobile units are threatened
+        """
+        self.player_index = player_index
+        self.damage = array('d', [0.0]) * NUM_TILES
+        self.attackers = array('h', [0]) * NUM_TILES
+        self._offsets = {}
+        self._sources = {}
+
+        # Read from the map's columns, so building it creates no GameUnits
+        config = game_map.config
+        columns = game_map.unit_columns()
+        for type_id, owner, x, y, flags in zip(columns.type_ids, columns.owners, columns.xs, columns.ys, columns.flags):
+            if owner == player_index:
+                continue
+            stats = config.stats[config.shorthands[type_id], bool(flags & columns.UPGRADED)]
+            index = x * ARENA_SIZE + y
+            if stats.stationary and stats.damage_i + stats.damage_f > 0 and index not in self._sources:
+                self._sources[index] = (stats.attackRange, stats.damage_i)
+                self.__apply(x, y, stats.attackRange, stats.damage_i, 1)
+
+    def refresh(self, x, y, units):
+        """Replaces the threat coming from a location with the threat of the units now on it
+
+        Args:
+            x, y: The location that changed
+            units: The list of GameUnits now at the location
+        """
+        index = x * ARENA_SIZE + y
+        old = self._sources.pop(index, None)
+        if old is not None:
+            self.__apply(x, y, old[0], old[1], -1)
+
+        for unit in units:
+            if unit.stationary and unit.player_index != self.player_index and unit.damage_i + unit.damage_f > 0:
+                self._sources[index] = (unit.attackRange, unit.damage_i)
+                self.__apply(x, y, unit.attackRange, unit.damage_i, 1)
+                return
+
+    def __apply(self, x, y, attack_range, damage, sign):
+        offsets = self._offsets.get(attack_range)
+        if offsets is None:
+            offsets = self._offsets[attack_range] = _attack_offsets(attack_range)
+        damage_map = self.damage
+        attackers = self.attackers
+        for dx, dy in offsets:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < ARENA_SIZE and 0 <= ny < ARENA_SIZE and IN_BOUNDS[nx * ARENA_SIZE + ny]:
+                index = nx * ARENA_SIZE + ny
+                damage_map[index] += sign * damage
+                attackers[index] += sign
+
+    def copy(self):
+        """Gets an independent copy of this threat map, without rebuilding it
+        """
+        threat_map = ThreatMap.__new__(ThreatMap)
+        threat_map.player_index = self.player_index
+        threat_map.damage = array('d', self.damage)
+        threat_map.attackers = array('h', self.attackers)
+        threat_map._offsets = self._offsets
+        threat_map._sources = dict(self._sources)
+        return threat_map
+
+    def damage_at(self, location):
+        """The damage per frame a mobile unit at location would take
+        """
+        return self.damage[location[0] * ARENA_SIZE + location[1]]
+
+    def attackers_at(self, location):
+        """The number of structures that can attack a mobile unit at location
+        """
+        return self.attackers[location[0] * ARENA_SIZE + location[1]]
+
+    def path_damage(self, path):
+        """The total damage per frame summed over every location of a path
+
+        Args:
+            path: A list of locations, such as one returned by find_path_to_edge
+
+        Returns:
+            The summed damage, an estimate of the damage a unit following the path takes
+
+        """
+        damage = self.damage
+        return sum(damage[x * ARENA_SIZE + y] for x, y in path)
+
+    def path_attackers(self, path):
+        """The number of attackers summed over every location of a path
+        """
+        attackers = self.attackers
+        return sum(attackers[x * ARENA_SIZE + y] for x, y in path)
@@ -1,3 +1,6 @@
+from .config import compile_config, unit_stats
+
+
 def is_stationary(unit_type, structure_types):
     """
         Args:
@@ -12,9 +15,12 @@ def is_stationary(unit_type, structure_types):
 class GameUnit:
     """Holds information about a Unit. 
 
+    The stats of a unit are read from a UnitStats record shared with every other unit of its type,
+    only the position, owner, health and flags belong to the unit itself.
+
     Attributes :
         * unit_type (string): This unit's type
-        * config (JSON): Contains information about the game
+        * config (CompiledConfig): Contains information about the game
         * player_index (integer): The player that controls this unit. 0 for you, 1 for your opponent.
         * x (integer): The x coordinate of the unit
         * y (integer): The y coordinate of the unit
@@ -26,53 +32,72 @@ class GameUnit:
         * shieldRange (float): The effective range of this unit for shielding
         * max_health (float): The starting health of this unit. Note than 'health' can be increased beyond this value by shielding in some game configurations.
         * health (float): The current health of this unit
-        * cost ([int, int]): The resource costs of this unit first is SP second is MP
+        * cost ((int, int)): The resource costs of this unit first is SP second is MP. It is the shared stats' tuple,
+          so it cannot be changed
         * shieldPerUnit (float): how much shield is given per unit
         * pending_removal (boolean): If this unit is marked for removal by its owner
         * upgraded (boolean): If this unit is upgraded
+        * stats (UnitStats): The shared record the stats above are read from
 
     """
+    __slots__ = ("unit_type", "config", "player_index", "pending_removal", "upgraded", "x", "y", "health", "stats")
+
     def __init__(self, unit_type, config, player_index=None, health=None, x=-1, y=-1):
         """ Initialize unit variables using args passed
 
         """
         self.unit_type = unit_type
-        self.config = config
+        self.config = compile_config(config)
         self.player_index = player_index
         self.pending_removal = False
         self.upgraded = False
         self.x = x
         self.y = y
-        self.__serialize_type()
-        self.health = self.max_health if not health else health
-
-    def __serialize_type(self):
-        from .game_state import STRUCTURE_TYPES, UNIT_TYPE_TO_INDEX, SUPPORT
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]]
-        self.stationary = type_config["unitCategory"] == 0
-        self.speed = type_config.get("speed", 0)
-        self.damage_f = type_config.get("attackDamageTower", 0)
-        self.damage_i = type_config.get("attackDamageWalker", 0)
-        self.attackRange = type_config.get("attackRange", 0)
-        self.shieldRange = type_config.get("shieldRange", 0)
-        self.max_health = type_config.get("startHealth", 0)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", 0)
-        self.shieldBonusPerY = type_config.get("shieldBonusPerY", 0)
-        self.cost = [type_config.get("cost1", 0), type_config.get("cost2", 0)]
+        self.stats = self.config.stats[unit_type, False]
+        self.health = self.stats.max_health if not health else health
+
+    @property
+    def stationary(self):
+        return self.stats.stationary
+
+    @property
+    def speed(self):
+        return self.stats.speed
+
+    @property
+    def damage_f(self):
+        return self.stats.damage_f
+
+    @property
+    def damage_i(self):
+        return self.stats.damage_i
+
+    @property
+    def attackRange(self):
+        return self.stats.attackRange
+
+    @property
+    def shieldRange(self):
+        return self.stats.shieldRange
+
+    @property
+    def max_health(self):
+        return self.stats.max_health
+
+    @property
+    def shieldPerUnit(self):
+        return self.stats.shieldPerUnit
+
+    @property
+    def shieldBonusPerY(self):
+        return self.stats.shieldBonusPerY
 
+    @property
+    def cost(self):
+        return self.stats.cost
 
     def upgrade(self):
-        from .game_state import UNIT_TYPE_TO_INDEX
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]].get("upgrade", {})
-        self.speed = type_config.get("speed", self.speed)
-        self.damage_f = type_config.get("attackDamageTower", self.damage_f)
-        self.damage_i = type_config.get("attackDamageWalker", self.damage_i)
-        self.attackRange = type_config.get("attackRange", self.attackRange)
-        self.shieldRange = type_config.get("shieldRange", self.shieldRange)
-        self.max_health = type_config.get("startHealth", self.max_health)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", self.shieldPerUnit)
-        self.shieldBonusPerY = type_config.get("shieldBonusPerY", self.shieldBonusPerY)
-        self.cost = [type_config.get("cost1", 0) + self.cost[0], type_config.get("cost2", 0) + self.cost[1]]
+        self.stats = self.config.stats[self.unit_type, True]
         self.upgraded = True
 
 
@@ -1,4 +1,9 @@
 import sys
+import time
+import queue
+import threading
+
+from .messages import EngineMessage, message_type
 
 
 BANNER_TEXT = "---------------- Starting Your Algo --------------------"
@@ -26,8 +31,59 @@ def send_command(cmd):
     Should usually only be called by 'GameState.submit_turn()'
 
     """
-    sys.stdout.write(cmd.strip() + "\n")
-    sys.stdout.flush()
+    for listener in _command_listeners:
+        listener(cmd)
+    if _command_buffer is not None:
+        _command_buffer.append(cmd.strip() + "\n")
+        return
+    output = sys.stdout if _command_output is None else _command_output
+    output.write(cmd.strip() + "\n")
+    output.flush()
+
+_command_buffer = None
+_command_output = None
+_command_listeners = []
+
+def add_command_listener(listener):
+    """Calls listener(cmd) for every command passed to send_command, such as to record them
+
+    """
+    _command_listeners.append(listener)
+
+def remove_command_listener(listener):
+    """Stops calling a listener added with add_command_listener
+
+    """
+    _command_listeners.remove(listener)
+
+def set_command_output(stream):
+    """Makes send_command write to stream instead of standard output, or to standard output again if stream is None
+
+    """
+    global _command_output
+    _command_output = stream
+
+def set_command_buffering(enabled):
+    """Makes send_command hold commands until flush_commands is called, instead of writing each one immediately.
+    Any commands held when buffering is turned off are written.
+
+    """
+    global _command_buffer
+    if not enabled:
+        flush_commands()
+        _command_buffer = None
+    elif _command_buffer is None:
+        _command_buffer = []
+
+def flush_commands():
+    """Writes every command held by send_command in a single write
+
+    """
+    if _command_buffer:
+        output = sys.stdout if _command_output is None else _command_output
+        output.write("".join(_command_buffer))
+        output.flush()
+        del _command_buffer[:]
 
 def debug_write(*msg):
     """Prints a message to the games debug output
@@ -39,3 +95,80 @@ def debug_write(*msg):
     #Printing to STDERR is okay and printed out by the game but doesn't effect turns.
     sys.stderr.write(", ".join(map(str, msg)).strip() + "\n")
     sys.stderr.flush()
+
+
+class CommandReader:
+    """Reads engine messages on a background thread so reading and parsing overlap with your turn.
+
+    Lines are wrapped in EngineMessages and queued in order. Turn and config messages are parsed on
+    the reader thread, action frames are left for whoever reads them. When the queue is full the
+    reader waits, so a slow algo holds messages in the pipe rather than in memory.
+
+    Attributes :
+        * max_queue (int): The most messages held at once
+        * messages (int): The number of messages handed to the algo so far
+        * max_depth (int): The most messages that were waiting at once
+        * last_lag (float): Seconds the last message waited between being read and being handed to the algo
+        * max_lag (float): The longest any message waited
+        * total_lag (float): The summed wait of every message
+
+    """
+    def __init__(self, stream=None, max_queue=1024):
+        self.max_queue = max_queue
+        self.messages = 0
+        self.max_depth = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self._stream = sys.stdin if stream is None else stream
+        self._queue = queue.Queue(max_queue)
+        self._thread = threading.Thread(target=self._read, name="CommandReader", daemon=True)
+
+    def start(self):
+        """Starts the reader thread
+
+        """
+        self._thread.start()
+        return self
+
+    def _read(self):
+        while True:
+            try:
+                line = self._stream.readline()
+            except (EOFError, ValueError):
+                line = ""
+            if line == "":
+                self._queue.put((None, time.monotonic()))
+                return
+            message = EngineMessage(line)
+            if "replaySave" in message or ("turnInfo" in message and message_type(message) != 1):
+                # These are always parsed, so do it here rather than on the main thread
+                message.data
+            self._queue.put((message, time.monotonic()))
+
+    def get(self):
+        """Gets the next message, waiting for one if none has been read yet. Exits like get_command if the game ended
+
+        """
+        depth = self._queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        message, read_time = self._queue.get()
+        if message is None:
+            debug_write("Got EOF, parent game process must have died, exiting for cleanup")
+            exit()
+        lag = time.monotonic() - read_time
+        self.messages += 1
+        self.last_lag = lag
+        self.total_lag += lag
+        if lag > self.max_lag:
+            self.max_lag = lag
+        return message
+
+    def summary(self):
+        """A one line description of the queue metrics, for debug_write
+
+        """
+        average = self.total_lag / self.messages if self.messages else 0.0
+        return "Read {} messages, max queue depth {}, average lag {:.2f}ms, max lag {:.2f}ms".format(
+            self.messages, self.max_depth, average * 1000, self.max_lag * 1000)